@@ -14,3 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
+
+# Expire flash deals on time and buffer view counts in web processes
+# (see ecommerce.flash_deals and ecommerce.view_counter)
+from ecommerce.flash_deals import flash_deal_scheduler  # noqa: E402
+from ecommerce.view_counter import view_counter  # noqa: E402
+
+flash_deal_scheduler.start()
+view_counter.start()
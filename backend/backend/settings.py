@@ -131,6 +131,67 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20,
 }
 
+# ─── Reviews ──────────────────────────────────────────────────────────────────
+REVIEWS_PAGE_SIZE = config('REVIEWS_PAGE_SIZE', default=10, cast=int)   # also the number embedded in product detail
+
+# ─── Cache ────────────────────────────────────────────────────────────────────
+# Local memory by default. With several worker processes use a shared backend,
+# e.g. CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+#      CACHE_LOCATION=/var/tmp/kilimall_cache
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='kilimall'),
+    }
+}
+RESPONSE_CACHE_TTL = config('RESPONSE_CACHE_TTL', default=60 * 60, cast=int)   # tagged viewset responses
+
+# ─── Search ───────────────────────────────────────────────────────────────────
+# 'ecommerce.search.SQLiteFTSBackend' (FTS5) or 'ecommerce.search.DatabaseBackend' (icontains)
+SEARCH_BACKEND = config('SEARCH_BACKEND', default='ecommerce.search.SQLiteFTSBackend')
+SEARCH_MAX_RESULTS = config('SEARCH_MAX_RESULTS', default=1000, cast=int)
+
+# Autocomplete (/products/suggest/) — in-memory, per process
+SUGGEST_MEMORY_BUDGET_MB = config('SUGGEST_MEMORY_BUDGET_MB', default=64, cast=int)
+SUGGEST_MAX_AGE = config('SUGGEST_MAX_AGE', default=300, cast=int)          # seconds before a full rebuild
+SUGGEST_LIMIT = 8
+SUGGEST_MAX_LIMIT = 20
+
+# ─── Catalog facets ───────────────────────────────────────────────────────────
+PRODUCT_PRICE_BUCKETS = [0, 1000, 5000, 10000, 25000, 50000, 100000]              # KES bucket edges
+PRODUCT_FACETS_CACHE_TTL = config('PRODUCT_FACETS_CACHE_TTL', default=60, cast=int)  # seconds, 0 = off
+
+# ─── Category menu ────────────────────────────────────────────────────────────
+CATEGORY_TREE_CACHE_TTL = 60 * 60     # safety net; writes invalidate it immediately
+
+# ─── Homepage ─────────────────────────────────────────────────────────────────
+HOME_CACHE_TTL = config('HOME_CACHE_TTL', default=300, cast=int)   # seconds; writes invalidate sooner
+
+# ─── Image variants ───────────────────────────────────────────────────────────
+IMAGE_VARIANT_WIDTHS = [160, 320, 640, 1280]     # WebP derivatives per upload, see ecommerce.images
+IMAGE_VARIANT_QUALITY = config('IMAGE_VARIANT_QUALITY', default=80, cast=int)
+IMAGE_JOB_WORKERS = config('IMAGE_JOB_WORKERS', default=0, cast=int)        # bulk image processes; 0 = one per core
+
+# ─── Flash deals ──────────────────────────────────────────────────────────────
+FLASH_DEAL_MAX_SLEEP = config('FLASH_DEAL_MAX_SLEEP', default=60, cast=int)   # seconds; 0 = expire via cron only
+
+# ─── Product feed ─────────────────────────────────────────────────────────────
+PRODUCT_FEED_TOKEN = config('PRODUCT_FEED_TOKEN', default='')      # partners pass ?token=; staff need none
+PRODUCT_FEED_CHUNK_SIZE = config('PRODUCT_FEED_CHUNK_SIZE', default=2000, cast=int)
+
+# ─── Recommendations ──────────────────────────────────────────────────────────
+RECOMMENDATIONS_DIR = config('RECOMMENDATIONS_DIR', default=str(BASE_DIR / 'var'))   # offline job state
+BOUGHT_TOGETHER_TOP_K = 12
+BOUGHT_TOGETHER_MIN_SUPPORT = config('BOUGHT_TOGETHER_MIN_SUPPORT', default=2, cast=int)   # orders with both
+BOUGHT_TOGETHER_MAX_BASKET = 50            # larger orders are counted per item but not per pair
+BOUGHT_TOGETHER_LAG_MINUTES = 60           # orders younger than this wait for the next run
+SIMILAR_TOP_K = 12
+SIMILAR_DIMENSIONS = 256                   # projected TF-IDF vector size; changing it forces a rebuild
+SIMILAR_MIN_SCORE = config('SIMILAR_MIN_SCORE', default=0.2, cast=float)   # cosine similarity
+
+# ─── Product view counter ─────────────────────────────────────────────────────
+VIEW_COUNTER_FLUSH_INTERVAL = config('VIEW_COUNTER_FLUSH_INTERVAL', default=10, cast=int)  # seconds, 0 = write-through
+
 # ─── JWT ──────────────────────────────────────────────────────────────────────
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
@@ -141,13 +202,15 @@ SIMPLE_JWT = {
 }
 
 # ─── CORS ─────────────────────────────────────────────────────────────────────
+FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:5173')
+
 CORS_ALLOWED_ORIGINS = [
     'https://fc73-2c0f-6300-d09-fd00-e8d7-8af6-2376-b01c.ngrok-free.app',
     'http://localhost:3000',
     'http://127.0.0.1:3000',
     'http://localhost:5173',       # ← add this
     'http://127.0.0.1:5173',       # ← add this
-    config('FRONTEND_URL', default='http://localhost:5173'),
+    FRONTEND_URL,
 ]
 CORS_ALLOW_CREDENTIALS = True
 
@@ -2,12 +2,14 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.html import format_html
 from django.utils import timezone
-from django.db.models import Sum, Count
+from django.db.models import Sum, Count, Q
 from .models import (
     User, Category, Brand, Product, ProductImage, ProductVariant,
     Review, County, PickupStation, Cart, CartItem,
     Order, OrderItem, MpesaTransaction, Wishlist, Banner
 )
+from .category_tree import get_category_tree
+from .images import srcset_map
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -69,7 +71,7 @@ class CategoryAdmin(admin.ModelAdmin):
     icon_preview.short_description = "Icon"
 
     def product_count(self, obj):
-        count = obj.products.filter(is_active=True).count()
+        count = get_category_tree()['counts'].get(obj.pk, 0)
         return format_html('<b style="color:#f85606">{}</b>', count)
     product_count.short_description = "Products"
 
@@ -92,9 +94,15 @@ class BrandAdmin(admin.ModelAdmin):
         return "—"
     logo_preview.short_description = "Logo"
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            active_product_count=Count('products', filter=Q(products__is_active=True))
+        )
+
     def product_count(self, obj):
-        return obj.products.filter(is_active=True).count()
+        return obj.active_product_count
     product_count.short_description = "Products"
+    product_count.admin_order_field = "active_product_count"
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -109,7 +117,9 @@ class ProductImageInline(admin.TabularInline):
 
     def image_preview(self, obj):
         if obj.image:
-            return format_html('<img src="{}" style="height:60px;object-fit:contain;" />', obj.image.url)
+            # Smallest WebP variant when there is one, not the full upload
+            url = next(iter(srcset_map(obj.image_variants, obj.image.storage).values()), obj.image.url)
+            return format_html('<img src="{}" style="height:60px;object-fit:contain;" />', url)
         return "—"
     image_preview.short_description = "Preview"
 
@@ -161,10 +171,16 @@ class ProductAdmin(admin.ModelAdmin):
         }),
     )
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Inline image edits may change which image is primary
+        Product.objects.filter(pk=form.instance.pk).refresh_primary_images()
+
     def thumbnail(self, obj):
-        img = obj.images.filter(is_primary=True).first() or obj.images.first()
-        if img:
-            return format_html('<img src="{}" style="height:48px;width:48px;object-fit:contain;border:1px solid #eee;border-radius:3px;" />', img.image.url)
+        if obj.primary_image_url:
+            storage = ProductImage._meta.get_field('image').storage
+            url = next(iter(srcset_map(obj.primary_image_variants, storage).values()), obj.primary_image_url)
+            return format_html('<img src="{}" style="height:48px;width:48px;object-fit:contain;border:1px solid #eee;border-radius:3px;" />', url)
         return format_html('<div style="height:48px;width:48px;background:#f5f5f5;border-radius:3px;display:flex;align-items:center;justify-content:center;color:#ccc;">N/A</div>')
     thumbnail.short_description = ""
 
@@ -545,9 +561,10 @@ class BannerAdmin(admin.ModelAdmin):
 
     def image_preview(self, obj):
         if obj.image:
+            url = next(iter(srcset_map(obj.image_variants, obj.image.storage).values()), obj.image.url)
             return format_html(
                 '<img src="{}" style="height:50px;width:120px;object-fit:cover;border-radius:3px;" />',
-                obj.image.url
+                url
             )
         return "—"
     image_preview.short_description = "Preview"
\ No newline at end of file
@@ -0,0 +1,232 @@
+"""
+"Frequently bought together", precomputed from order history.
+
+``OrderItem`` rows are streamed grouped by order, and every basket adds one
+to the count of each product pair in it. The counts live in a sparse,
+array-backed co-occurrence matrix (sorted ``int64`` pair codes plus their
+counts, NumPy only) that is persisted between runs in
+``RECOMMENDATIONS_DIR/bought_together.npz`` together with the per-product
+order counts, the number of orders and a ``created_at`` watermark.
+
+Pairs are scored by lift, ``n(a, b) · N / (n(a) · n(b))``: how much more
+often they are bought together than chance would predict. Pairs seen in
+fewer than ``BOUGHT_TOGETHER_MIN_SUPPORT`` orders are ignored. The best
+``BOUGHT_TOGETHER_TOP_K`` per product go to ``RelatedProduct``, which is
+all the ``/products/<slug>/bought_together/`` endpoint reads.
+
+Runs are incremental: only orders created since the watermark (and at
+least ``BOUGHT_TOGETHER_LAG_MINUTES`` ago, so fresh cancellations settle)
+are read, and only the products whose ranking can have changed — those in
+the new baskets and their co-purchased neighbours — are rewritten. Lift
+ranks a product's neighbours by ``n(a, b) / n(b)``; the order total does
+not change that order, so untouched lists keep the right ranking. Their
+stored lift scores were computed with an older ``N`` and drift further
+from the true value as orders accumulate, until ``--rebuild`` recomputes
+every list. An order cancelled after it was counted stays counted until
+``--rebuild`` as well.
+"""
+
+import itertools
+import os
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+PAIR_SHIFT = 32         # pair code = a << 32 | b, with a < b
+EXCLUDED_STATUSES = ('cancelled', 'refunded')
+MERGE_EVERY = 2_000_000  # pair codes buffered before folding them into the matrix
+
+
+def state_path():
+    return os.path.join(settings.RECOMMENDATIONS_DIR, 'bought_together.npz')
+
+
+class CoOccurrence:
+    """Order counts per product and per product pair, indexed by position in ``ids``."""
+
+    def __init__(self):
+        self.ids = []               # product pk (hex) per index
+        self.index = {}
+        self.item_counts = np.zeros(0, dtype=np.int64)
+        self.pair_codes = np.zeros(0, dtype=np.int64)
+        self.pair_counts = np.zeros(0, dtype=np.int64)
+        self.orders = 0
+        self.watermark = None
+
+    # ── Persistence ──────────────────────────────────────────────────────────
+    @classmethod
+    def load(cls, path=None):
+        state = cls()
+        path = path or state_path()
+        if not os.path.exists(path):
+            return state
+        with np.load(path) as data:
+            state.ids = data['ids'].tolist()
+            state.item_counts = data['item_counts']
+            state.pair_codes = data['pair_codes']
+            state.pair_counts = data['pair_counts']
+            state.orders = int(data['orders'])
+            watermark = str(data['watermark'])
+        state.index = {pk: i for i, pk in enumerate(state.ids)}
+        state.watermark = parse_datetime(watermark) if watermark else None
+        return state
+
+    def save(self, path=None):
+        path = path or state_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp.npz'
+        np.savez(
+            tmp,
+            ids=np.array(self.ids, dtype='U32'),
+            item_counts=self.item_counts,
+            pair_codes=self.pair_codes,
+            pair_counts=self.pair_counts,
+            orders=np.int64(self.orders),
+            watermark=np.array(self.watermark.isoformat() if self.watermark else ''),
+        )
+        os.replace(tmp, path)
+
+    # ── Counting ─────────────────────────────────────────────────────────────
+    def product_index(self, pk):
+        i = self.index.get(pk)
+        if i is None:
+            i = self.index[pk] = len(self.ids)
+            self.ids.append(pk)
+        return i
+
+    def add_baskets(self, baskets, max_basket=None):
+        """
+        Count ``baskets`` (iterables of product pks, one per order). Returns
+        the indices of the products they contain.
+        """
+        max_basket = max_basket or settings.BOUGHT_TOGETHER_MAX_BASKET
+        touched = np.zeros(0, dtype=np.int64)
+        items, codes, pending = [], [], 0
+        for basket in baskets:
+            basket = np.unique(np.fromiter((self.product_index(pk) for pk in basket), dtype=np.int64))
+            self.orders += 1
+            items.append(basket)
+            # Huge baskets (bulk buyers) say little about affinity and cost k² pairs
+            if 1 < len(basket) <= max_basket:
+                a, b = triu(len(basket))
+                codes.append((basket[a] << PAIR_SHIFT) | basket[b])
+                pending += len(a)
+            if pending >= MERGE_EVERY:
+                touched = np.union1d(touched, self.merge(items, codes))
+                items, codes, pending = [], [], 0
+        if items:
+            touched = np.union1d(touched, self.merge(items, codes))
+        return touched
+
+    def merge(self, items, codes):
+        items = np.concatenate(items)
+        self.item_counts = np.concatenate([
+            self.item_counts, np.zeros(len(self.ids) - len(self.item_counts), dtype=np.int64),
+        ])
+        np.add.at(self.item_counts, items, 1)
+        if codes:
+            self.merge_pairs(np.concatenate(codes))
+        return np.unique(items)
+
+    def merge_pairs(self, codes):
+        codes, counts = np.unique(codes, return_counts=True)
+        merged, inverse = np.unique(np.concatenate([self.pair_codes, codes]), return_inverse=True)
+        self.pair_counts = np.bincount(
+            inverse, weights=np.concatenate([self.pair_counts, counts]), minlength=len(merged),
+        ).astype(np.int64)
+        self.pair_codes = merged
+
+    # ── Scoring ──────────────────────────────────────────────────────────────
+    def pairs(self, min_support):
+        """Both directions of every pair with enough support: (rows, cols, counts)."""
+        keep = self.pair_counts >= min_support
+        codes, counts = self.pair_codes[keep], self.pair_counts[keep]
+        a, b = codes >> PAIR_SHIFT, codes & ((1 << PAIR_SHIFT) - 1)
+        return np.concatenate([a, b]), np.concatenate([b, a]), np.concatenate([counts, counts])
+
+    def affected(self, touched, min_support):
+        """Products whose neighbour ranking may change when ``touched`` products' counts do."""
+        rows, cols, _ = self.pairs(min_support)
+        return np.union1d(touched, rows[np.isin(cols, touched)])
+
+    def top_k(self, products, k, min_support):
+        """Top ``k`` neighbours by lift for ``products``, best first: (rows, cols, lift, support)."""
+        rows, cols, counts = self.pairs(min_support)
+        keep = np.isin(rows, products)
+        rows, cols, counts = rows[keep], cols[keep], counts[keep]
+        lift = counts * float(self.orders) / (self.item_counts[rows] * self.item_counts[cols])
+        order = np.lexsort((cols, -counts, -lift, rows))
+        rows, cols, counts, lift = rows[order], cols[order], counts[order], lift[order]
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        rank = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+        keep = rank < k
+        return rows[keep], cols[keep], lift[keep], counts[keep]
+
+
+_triu_cache = {}
+
+
+def triu(n):
+    if n not in _triu_cache:
+        _triu_cache[n] = np.triu_indices(n, 1)
+    return _triu_cache[n]
+
+
+# ─── Job ─────────────────────────────────────────────────────────────────────
+
+def iter_baskets(since, until, chunk_size=2000):
+    """Yield the product pks of each countable order created in ``[since, until)``."""
+    from .models import OrderItem
+
+    items = (
+        OrderItem.objects
+        .filter(product__isnull=False, order__created_at__lt=until)
+        .exclude(order__status__in=EXCLUDED_STATUSES)
+        .exclude(order__payment_status='failed')
+    )
+    if since is not None:
+        items = items.filter(order__created_at__gte=since)
+    rows = items.order_by('order_id').values_list('order_id', 'product_id').iterator(chunk_size=chunk_size)
+    for _, group in itertools.groupby(rows, key=lambda row: row[0]):
+        yield [product_id.hex for _, product_id in group]
+
+
+def write_related(state, products, replace_all=False):
+    """Replace the stored lists of ``products`` (state indices). Returns rows written."""
+    from .models import RelatedProduct
+
+    rows, cols, lift, support = state.top_k(
+        products, settings.BOUGHT_TOGETHER_TOP_K, settings.BOUGHT_TOGETHER_MIN_SUPPORT,
+    )
+    ids = state.ids
+    lists = {ids[i]: [] for i in products.tolist()}
+    for r, c, s, o in zip(rows.tolist(), cols.tolist(), lift.tolist(), support.tolist()):
+        lists[ids[r]].append((ids[c], s, o))
+    return RelatedProduct.objects.replace_lists(RelatedProduct.BOUGHT_TOGETHER, lists, replace_all)
+
+
+def update_bought_together(rebuild=False, now=None):
+    """
+    Count the orders created since the last run and rewrite the lists that
+    changed. Returns ``(orders counted, products rewritten, rows written)``.
+    """
+    now = now or timezone.now()
+    until = now - timedelta(minutes=settings.BOUGHT_TOGETHER_LAG_MINUTES)
+    state = CoOccurrence() if rebuild else CoOccurrence.load()
+    if state.watermark is not None and state.watermark >= until:
+        return 0, 0, 0
+
+    orders_before = state.orders
+    touched = state.add_baskets(iter_baskets(state.watermark, until))
+    if rebuild:
+        products = np.arange(len(state.ids))
+    else:
+        products = state.affected(touched, settings.BOUGHT_TOGETHER_MIN_SUPPORT)
+    written = write_related(state, products, replace_all=rebuild) if rebuild or len(products) else 0
+    # Saved only once the lists are written: a failed run is simply repeated
+    state.watermark = until
+    state.save()
+    return state.orders - orders_before, len(products), written
@@ -0,0 +1,100 @@
+"""
+Version-keyed caching.
+
+Instead of deleting cached entries, writers bump a version number and
+readers include it in their cache keys; stale entries simply stop being
+read and age out on their own TTL. Only get/set/add/incr are used, so any
+Django cache backend works — use a shared one (file, memcached, redis)
+when running several worker processes.
+"""
+
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+
+def _new_version():
+    # Time-based so a lost version key can never resurrect an old entry.
+    return int(time.time() * 1000)
+
+
+def get_version(name):
+    return cache.get_or_set(f'version:{name}', _new_version, None)
+
+
+def bump_version(name):
+    try:
+        cache.incr(f'version:{name}')
+    except ValueError:
+        cache.set(f'version:{name}', _new_version(), None)
+
+
+def get_versions(names):
+    """Current versions for several names in one cache round trip."""
+    keys = {f'version:{name}': name for name in names}
+    found = cache.get_many(list(keys))
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        for key, value in missing.items():
+            # add() so a concurrent writer's version wins over ours
+            if not cache.add(key, value, None):
+                missing[key] = cache.get(key, value)
+        found.update(missing)
+    return [found[f'version:{name}'] for name in names]
+
+
+# ─── Tagged response cache ────────────────────────────────────────────────────
+
+def tag_version_name(tag):
+    return f'tag:{tag}'
+
+
+def invalidate_tags(*tags):
+    for tag in tags:
+        bump_version(tag_version_name(tag))
+
+
+def response_cache_key(request, tags):
+    """Path + sorted query params + the current version of every tag."""
+    params = sorted(
+        (key, value)
+        for key in request.query_params
+        for value in request.query_params.getlist(key)
+    )
+    raw = f"{request.build_absolute_uri(request.path)}?{urlencode(params)}"
+    versions = '.'.join(str(v) for v in get_versions([tag_version_name(tag) for tag in tags]))
+    return f"response:{hashlib.md5(raw.encode()).hexdigest()}:{versions}"
+
+
+class CachedResponseMixin:
+    """
+    Cache ``list`` and ``retrieve`` responses of a read-only viewset.
+
+    ``cache_tags`` names the models the response is built from (lower-case
+    model names); a save or delete of any of them bumps that tag's version
+    (see ``ecommerce.signals``), which retires every entry carrying it.
+    """
+
+    cache_tags = ()
+    cache_timeout = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
+
+    def cached_response(self, request, view, *args, **kwargs):
+        key = response_cache_key(request, self.cache_tags)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            timeout = self.cache_timeout if self.cache_timeout is not None else settings.RESPONSE_CACHE_TTL
+            cache.set(key, response.data, timeout)
+        return response
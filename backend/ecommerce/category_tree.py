@@ -0,0 +1,107 @@
+"""
+Cached category tree for the navigation menu.
+
+The tree is built in two queries (all categories, active product counts
+grouped by category), with each category's count rolled up over its whole
+subtree, and stored in the cache under a version number. Product and
+Category writes bump the version (see ``ecommerce.signals``), so a warm
+cache serves ``/categories/`` without touching the database.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from .caching import bump_version, get_version
+
+# Bump when the cached structure changes shape.
+FORMAT = 1
+
+
+def _image_url(name):
+    from .models import Category
+
+    return Category._meta.get_field('image').storage.url(name) if name else None
+
+
+def build_category_tree():
+    from .models import Category, Product
+
+    rows = list(Category.objects.order_by('name').values('id', 'name', 'slug', 'image', 'icon', 'parent_id', 'is_active'))
+    direct = dict(
+        Product.objects.filter(is_active=True, category__isnull=False)
+        .order_by()
+        .values_list('category_id')
+        .annotate(n=Count('pk'))
+    )
+
+    children = {}
+    for row in rows:
+        children.setdefault(row['parent_id'], []).append(row)
+
+    counts = {}
+
+    def rollup(row, path):
+        if row['id'] in counts:
+            return counts[row['id']]
+        total = direct.get(row['id'], 0)
+        for child in children.get(row['id'], ()):
+            if child['id'] not in path:    # guard against parent cycles
+                total += rollup(child, path | {child['id']})
+        counts[row['id']] = total
+        return total
+
+    for row in rows:
+        rollup(row, {row['id']})
+
+    roots = [
+        {
+            'id': row['id'],
+            'name': row['name'],
+            'slug': row['slug'],
+            'image': _image_url(row['image']),
+            'icon': row['icon'],
+            'parent': None,
+            'children': [
+                {
+                    'id': child['id'],
+                    'name': child['name'],
+                    'slug': child['slug'],
+                    'image': _image_url(child['image']),
+                    'icon': child['icon'],
+                }
+                for child in children.get(row['id'], ())
+            ],
+            'product_count': counts[row['id']],
+            'is_active': row['is_active'],
+        }
+        for row in children.get(None, ())
+        if row['is_active']
+    ]
+    return {'roots': roots, 'counts': counts}
+
+
+def get_category_tree():
+    key = f'category-tree:{FORMAT}:{get_version("category-tree")}'
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_category_tree()
+        cache.set(key, tree, settings.CATEGORY_TREE_CACHE_TTL)
+    return tree
+
+
+def invalidate_category_tree():
+    bump_version('category-tree')
+
+
+def with_absolute_urls(nodes, request):
+    """Copy of ``nodes`` with image paths made absolute, like the serializer does."""
+    result = []
+    for node in nodes:
+        node = dict(node)
+        if node['image']:
+            node['image'] = request.build_absolute_uri(node['image'])
+        if 'children' in node:
+            node['children'] = with_absolute_urls(node['children'], request)
+        result.append(node)
+    return result
@@ -0,0 +1,96 @@
+"""
+ETags and ``If-None-Match`` handling for the product endpoints.
+
+Validators are computed from timestamps and ids only, never from the
+rendered body, so a matching request is answered with a 304 before any
+serializer runs:
+
+    detail   one query: ``Product.updated_at`` plus the max ``updated_at``
+             and row count of its images, variants and reviews (the counts
+             catch deletes, which leave no timestamp behind), and the
+             normalised ``?fields=`` / ``?omit=`` selection
+    lists    the (id, updated_at) of every row on the page, in order, plus
+             the pagination envelope (count, next/previous links)
+
+Both fold in the ``category`` and ``brand`` cache tag versions (see
+``ecommerce.caching``) since their names are embedded in the payloads.
+``views`` is deliberately not part of the validator — it changes on every
+visit and would make revalidation pointless.
+"""
+
+import hashlib
+
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .caching import get_versions, tag_version_name
+from .fieldsets import requested_fieldset
+
+# Bump when the serialized shape of products changes.
+FORMAT = 1
+
+EMBEDDED_TAGS = ('category', 'brand')
+
+
+def make_etag(request, *parts):
+    versions = get_versions([tag_version_name(tag) for tag in EMBEDDED_TAGS])
+    renderer = getattr(request, 'accepted_media_type', None)
+    raw = repr((FORMAT, versions, renderer, parts))
+    return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+
+def etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    # If-None-Match uses the weak comparison: W/ prefixes are ignored.
+    candidates = {tag.removeprefix('W/') for tag in parse_etags(header)}
+    return '*' in candidates or etag in candidates
+
+
+def not_modified(etag):
+    return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+
+def _latest(model, values):
+    qs = model.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    return Subquery(qs.annotate(v=values).values('v'))
+
+
+def product_detail_validator(request, queryset):
+    """
+    Return ``(pk, etag)`` for the single product in ``queryset``, or None if
+    there is none. Runs one query.
+    """
+    from .models import ProductImage, ProductVariant, Review
+
+    annotations = {}
+    for prefix, model in (('images', ProductImage), ('variants', ProductVariant), ('reviews', Review)):
+        annotations[f'{prefix}_at'] = _latest(model, Max('updated_at'))
+        annotations[f'{prefix}_n'] = _latest(model, Count('pk', output_field=IntegerField()))
+    row = (
+        queryset.order_by()
+        .annotate(**annotations)
+        .values_list('pk', 'updated_at', 'category_id', 'brand_id', *annotations)
+        .first()
+    )
+    if row is None:
+        return None
+    # Each fieldset is its own representation; order and spacing don't matter
+    fieldset = sorted(
+        (key, sorted(names)) for key, names in requested_fieldset(request).items() if names
+    )
+    return row[0], make_etag(request, 'detail', row, fieldset)
+
+
+def product_list_etag(request, rows, envelope=None):
+    """ETag for a page of products (instances or ``product_rows`` rows) already fetched."""
+    return make_etag(
+        request,
+        'list',
+        request.build_absolute_uri(),
+        envelope,
+        [(row.id, row.updated_at) for row in rows],
+    )
@@ -0,0 +1,126 @@
+"""
+Full-catalog product feed (CSV / NDJSON) for marketplace and ad partners.
+
+Products are read in keyset batches on ``id`` — each batch is one short
+``WHERE id > last ORDER BY id LIMIT n`` query, consumed with ``iterator()``
+— with category, brand and the denormalised primary image selected in the
+same row. Rows are encoded and yielded one at a time, optionally through a
+streaming gzip compressor, so memory stays flat however large the catalog.
+
+Used by ``ProductFeedView`` (``/api/v1/feeds/products.<csv|ndjson>``) and the
+``export_products`` management command.
+"""
+
+import csv
+import json
+import zlib
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+FEED_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+COLUMNS = (
+    'id', 'sku', 'name', 'link', 'category', 'brand',
+    'price', 'original_price', 'stock', 'availability',
+    'rating', 'review_count', 'image', 'is_active', 'updated_at',
+)
+
+_SELECT = (
+    'id', 'sku', 'name', 'slug', 'category__name', 'brand__name',
+    'price', 'original_price', 'stock', 'rating', 'review_count',
+    'primary_image_path', 'is_active', 'updated_at',
+)
+
+
+def iter_feed_rows(chunk_size=None, include_inactive=False, media_base=''):
+    """Yield one dict per product, in ``COLUMNS`` order."""
+    from .models import Product, ProductImage
+
+    chunk_size = chunk_size or settings.PRODUCT_FEED_CHUNK_SIZE
+    storage = ProductImage._meta.get_field('image').storage
+    link_base = settings.FRONTEND_URL.rstrip('/')
+    products = Product.objects.all() if include_inactive else Product.objects.filter(is_active=True)
+
+    last = None
+    while True:
+        batch = products.order_by('id')
+        if last is not None:
+            batch = batch.filter(id__gt=last)
+        seen = 0
+        for (pk, sku, name, slug, category, brand, price, original_price, stock,
+             rating, review_count, image, is_active, updated_at) in (
+            batch.values_list(*_SELECT)[:chunk_size].iterator(chunk_size=chunk_size)
+        ):
+            seen += 1
+            last = pk
+            yield {
+                'id': str(pk),
+                'sku': sku,
+                'name': name,
+                'link': f'{link_base}/product/{slug}',
+                'category': category or '',
+                'brand': brand or '',
+                'price': price,
+                'original_price': original_price,
+                'stock': stock,
+                'availability': 'in stock' if stock > 0 else 'out of stock',
+                'rating': rating,
+                'review_count': review_count,
+                'image': f'{media_base}{storage.url(image)}' if image else '',
+                'is_active': is_active,
+                'updated_at': updated_at,
+            }
+        if seen < chunk_size:
+            return
+
+
+class _Line:
+    """File-like sink for csv.writer that hands back what was written."""
+
+    def write(self, value):
+        return value
+
+
+def encode_csv(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(COLUMNS).encode()
+    for row in rows:
+        yield writer.writerow([
+            '' if row[col] is None else (row[col].isoformat() if col == 'updated_at' else row[col])
+            for col in COLUMNS
+        ]).encode()
+
+
+def encode_ndjson(rows):
+    for row in rows:
+        yield (json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n').encode()
+
+
+ENCODERS = {'csv': encode_csv, 'ndjson': encode_ndjson}
+
+
+def gzip_stream(chunks, buffer_size=64 * 1024):
+    """Gzip a byte stream incrementally, yielding roughly ``buffer_size`` pieces."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    pending = []
+    size = 0
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            pending.append(out)
+            size += len(out)
+            if size >= buffer_size:
+                yield b''.join(pending)
+                pending, size = [], 0
+    pending.append(compressor.flush())
+    yield b''.join(pending)
+
+
+def feed_stream(fmt, gzip=False, **kwargs):
+    """Bytes of the whole feed, produced lazily."""
+    stream = ENCODERS[fmt](iter_feed_rows(**kwargs))
+    return gzip_stream(stream) if gzip else stream
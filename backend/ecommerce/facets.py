@@ -0,0 +1,105 @@
+"""
+Facet counts for a filtered product queryset.
+
+Everything is answered in three grouped aggregate queries regardless of how
+many brands, categories or price buckets exist:
+
+    1. GROUP BY brand
+    2. GROUP BY category
+    3. one row of conditional COUNTs (total, featured, flash deals, price buckets)
+"""
+
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+
+# Query params that change paging/sorting but not the result set.
+IGNORED_PARAMS = frozenset({'page', 'page_size', 'ordering', 'format', 'cursor'})
+
+
+def price_ranges():
+    """Consecutive (min, max) pairs from PRODUCT_PRICE_BUCKETS; the last one is open-ended."""
+    edges = list(settings.PRODUCT_PRICE_BUCKETS)
+    return list(zip(edges, edges[1:] + [None]))
+
+
+def compute_facets(queryset):
+    queryset = queryset.order_by()
+
+    brands = (
+        queryset.filter(brand__isnull=False)
+        .values('brand__slug', 'brand__name')
+        .annotate(count=Count('pk'))
+        .order_by('-count', 'brand__name')
+    )
+    categories = (
+        queryset.filter(category__isnull=False)
+        .values('category__slug', 'category__name')
+        .annotate(count=Count('pk'))
+        .order_by('-count', 'category__name')
+    )
+
+    ranges = price_ranges()
+    counts = {
+        'total': Count('pk'),
+        'featured': Count('pk', filter=Q(is_featured=True)),
+        'flash_deals': Count('pk', filter=Q(is_flash_deal=True, flash_deal_end__gt=timezone.now())),
+    }
+    for i, (low, high) in enumerate(ranges):
+        cond = Q(price__gte=low)
+        if high is not None:
+            cond &= Q(price__lt=high)
+        counts[f'price_{i}'] = Count('pk', filter=cond)
+    totals = queryset.aggregate(**counts)
+
+    return {
+        'total': totals['total'],
+        'brands': [
+            {'slug': row['brand__slug'], 'name': row['brand__name'], 'count': row['count']}
+            for row in brands
+        ],
+        'categories': [
+            {'slug': row['category__slug'], 'name': row['category__name'], 'count': row['count']}
+            for row in categories
+        ],
+        'price_ranges': [
+            {'min': low, 'max': high, 'count': totals[f'price_{i}']}
+            for i, (low, high) in enumerate(ranges)
+        ],
+        'featured': totals['featured'],
+        'flash_deals': totals['flash_deals'],
+    }
+
+
+def facets_cache_key(query_params):
+    """Key on the filter params only, sorted, so equivalent URLs share an entry."""
+    items = sorted(
+        (key, value)
+        for key in query_params
+        if key not in IGNORED_PARAMS
+        for value in sorted(query_params.getlist(key))
+        if value != ''
+    )
+    digest = hashlib.md5(urlencode(items).encode()).hexdigest()
+    return f'product-facets:{digest}'
+
+
+def get_facets(query_params, get_queryset):
+    """
+    Cached facets for ``query_params``. ``get_queryset`` is only called on a
+    cache miss, since filtering itself may hit the database (e.g. search).
+    """
+    ttl = settings.PRODUCT_FACETS_CACHE_TTL
+    if not ttl:
+        return compute_facets(get_queryset())
+    key = facets_cache_key(query_params)
+    data = cache.get(key)
+    if data is None:
+        data = compute_facets(get_queryset())
+        cache.set(key, data, ttl)
+    return data
@@ -0,0 +1,109 @@
+"""
+Sparse fieldsets for product and order payloads.
+
+    /api/v1/products/?fields=id,name,slug,price,primary_image,discount_percent
+    /api/v1/products/<slug>/?omit=reviews,reviews_next,variants
+
+``fields`` keeps only the named top-level fields, ``omit`` drops some;
+unknown names are ignored. Serializers opt in with ``SparseFieldsetMixin``
+and say in ``Meta.field_sources`` which model lookups each field reads
+(a field named after a model field reads that field). ``prune_queryset``
+turns the kept fields' lookups into ``only()``, ``select_related()`` and
+``prefetch_related()``, so a skipped field costs neither a column, a join,
+a prefetch query nor any serializer work:
+
+    'price'               column                   only('price')
+    'category__name'      column across a FK       select_related('category'), only('category__name')
+    'category'            whole related row        select_related('category'), only('category')
+    'images'              reverse / many relation  prefetch_related('images')
+"""
+
+from django.db.models.constants import LOOKUP_SEP
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+
+def _names(value):
+    names = {name.strip() for name in (value or '').split(',')}
+    names.discard('')
+    return names or None
+
+
+def requested_fieldset(request):
+    """Serializer / ``prune_queryset`` kwargs from the query string."""
+    if request is None:
+        return {}
+    params = request.query_params
+    return {'fields': _names(params.get(FIELDS_PARAM)), 'omit': _names(params.get(OMIT_PARAM))}
+
+
+def select_fields(names, fields=None, omit=None):
+    """The subset of ``names`` (in order) kept by ``fields`` / ``omit``."""
+    return [name for name in names if (fields is None or name in fields) and not (omit and name in omit)]
+
+
+def query_plan(model, lookups):
+    """``(only, select_related, prefetch_related)`` sets covering ``lookups``."""
+    only, select, prefetch = set(), set(), set()
+    for lookup in lookups:
+        parts = lookup.split(LOOKUP_SEP)
+        opts = model._meta
+        for i, part in enumerate(parts):
+            field = opts.get_field(part)
+            path = LOOKUP_SEP.join(parts[:i + 1])
+            if field.one_to_many or field.many_to_many:
+                prefetch.add(lookup)
+                break
+            if not field.is_relation:
+                only.add(path)
+                break
+            select.add(path)
+            opts = field.related_model._meta
+            if i == len(parts) - 1:
+                # Naming the relation itself loads the whole related row
+                only.add(parts[0])
+    return only, select, prefetch
+
+
+class SparseFieldsetMixin:
+    """
+    ``ModelSerializer`` whose rendered fields can be narrowed with the
+    ``fields=`` / ``omit=`` keyword arguments (write-only fields are always
+    kept). See ``Meta.field_sources`` and ``prune_queryset``.
+    """
+
+    def __init__(self, *args, fields=None, omit=None, **kwargs):
+        self.fieldset = set(select_fields(self.Meta.fields, fields, omit))
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        return {
+            name: field for name, field in super().get_fields().items()
+            if field.write_only or name in self.fieldset
+        }
+
+    @classmethod
+    def field_lookups(cls, name):
+        sources = getattr(cls.Meta, 'field_sources', {})
+        if name in sources:
+            return sources[name]
+        names = {f.name for f in cls.Meta.model._meta.get_fields()}
+        return (name,) if name in names else ()
+
+    @classmethod
+    def prune_queryset(cls, queryset, fields=None, omit=None, keep=()):
+        """
+        ``queryset`` loading only what the kept fields read, plus the
+        columns in ``keep`` (e.g. what the view itself reads off the rows).
+        """
+        lookups = list(keep)
+        for name in select_fields(cls.Meta.fields, fields, omit):
+            lookups.extend(cls.field_lookups(name))
+        only, select, prefetch = query_plan(queryset.model, lookups)
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if select:
+            queryset = queryset.select_related(*sorted(select))
+        if prefetch:
+            queryset = queryset.prefetch_related(*sorted(prefetch))
+        return queryset.only(*sorted(only))
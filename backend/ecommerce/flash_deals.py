@@ -0,0 +1,173 @@
+"""
+Active flash deals and their expiry.
+
+``active_flash_deals()`` serves the flash-deal section from a per-process
+snapshot of the running deals. The snapshot is reloaded only when the
+earliest deal in it ends or when a write bumps the ``flash-deals`` version
+(see ``ecommerce.signals``), so the endpoint normally runs no query at all.
+
+Ended deals are switched off by ``expire_flash_deals()``: one UPDATE over
+the ``(is_flash_deal, flash_deal_end)`` index, followed by invalidation of
+every cached deal payload. In web processes (started from ``wsgi.py`` /
+``asgi.py``) a background thread calls it exactly when the next deal ends,
+waking at least every ``FLASH_DEAL_MAX_SLEEP`` seconds to pick up deals
+created by other processes. Set ``FLASH_DEAL_MAX_SLEEP = 0`` to disable the
+thread and run ``manage.py expire_flash_deals`` from cron instead.
+"""
+
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Min
+from django.utils import timezone
+
+from .caching import bump_version, get_version
+
+logger = logging.getLogger(__name__)
+
+SECTION_SIZE = 12
+
+
+def invalidate_flash_deals():
+    bump_version('flash-deals')
+
+
+def expire_flash_deals(now=None):
+    """Switch off every deal that has ended. Returns the number expired."""
+    from .home import invalidate_home
+    from .models import Product
+
+    now = now or timezone.now()
+    expired = Product.objects.filter(is_flash_deal=True, flash_deal_end__lte=now).update(
+        is_flash_deal=False, updated_at=now,
+    )
+    if expired:
+        # .update() sends no signals; retire the cached payloads by hand
+        invalidate_flash_deals()
+        invalidate_home()
+    return expired
+
+
+def next_flash_deal_end():
+    from .models import Product
+
+    return (
+        Product.objects.filter(is_flash_deal=True, flash_deal_end__isnull=False)
+        .aggregate(next_end=Min('flash_deal_end'))['next_end']
+    )
+
+
+class ActiveDeals:
+    """Snapshot of the running deals shown in the flash-deal section."""
+
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._rows = None
+        self._version = None
+        self._expires_at = None
+
+    def get(self):
+        """
+        Return ``(rows, expires_at)``: the deals as ``product_rows`` rows, and
+        when the first of them ends.
+        """
+        version = get_version('flash-deals')
+        now = timezone.now()
+        with self._lock:
+            stale = (
+                self._rows is None
+                or self._version != version
+                or (self._expires_at is not None and self._expires_at <= now)
+            )
+            if stale:
+                self._load(version, now)
+            return self._rows, self._expires_at
+
+    def _load(self, version, now):
+        from .models import Product
+        from .product_rows import list_plan
+
+        # Only the shown deals matter: one ending further down the list
+        # cannot change which ones are shown.
+        deals = Product.objects.filter(is_active=True, is_flash_deal=True, flash_deal_end__gt=now)
+        rows = list(list_plan().values(deals)[:self.size])
+        self._rows = rows
+        self._version = version
+        self._expires_at = min((row.flash_deal_end for row in rows), default=None)
+
+
+class FlashDealScheduler:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.enabled = False
+
+    def start(self):
+        """Opt this process in; management commands and tests never call it."""
+        self.enabled = True
+        self.ensure_running()
+
+    def ensure_running(self):
+        max_sleep = settings.FLASH_DEAL_MAX_SLEEP
+        if not self.enabled or max_sleep <= 0:
+            return
+        # Re-arm after a fork: threads do not survive into worker processes.
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(max_sleep,), name='flash-deal-expiry', daemon=True
+            )
+            self._thread.start()
+
+    def reschedule(self):
+        """A deal was added or moved; recompute the next wake-up."""
+        self._wake.set()
+
+    def tick(self):
+        """Expire ended deals; return seconds until the next deal ends (or None)."""
+        expire_flash_deals()
+        next_end = next_flash_deal_end()
+        if next_end is None:
+            return None
+        return max((next_end - timezone.now()).total_seconds(), 0)
+
+    def _run(self, max_sleep):
+        while not self._stop.is_set():
+            self._wake.clear()
+            close_old_connections()
+            try:
+                delay = self.tick()
+            except Exception:
+                logger.exception("Expiring flash deals failed; will retry")
+                delay = None
+            timeout = max_sleep if delay is None else min(delay, max_sleep)
+            self._wake.wait(timeout)
+        close_old_connections()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+active_deals = ActiveDeals(SECTION_SIZE)
+flash_deal_scheduler = FlashDealScheduler()
+atexit.register(flash_deal_scheduler.stop)
+
+
+def active_flash_deals():
+    flash_deal_scheduler.ensure_running()
+    return active_deals.get()
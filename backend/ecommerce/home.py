@@ -0,0 +1,85 @@
+"""
+Precomputed homepage payload for ``/home/``.
+
+All five homepage sections are serialized once and cached under a version
+key. Product, Banner, Brand, Category and Review writes bump the version
+(see ``ecommerce.signals``); the entry also expires the moment the earliest
+shown flash deal ends, so an ended deal never lingers on the page.
+"""
+
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .caching import bump_version, get_version
+from .category_tree import get_category_tree, with_absolute_urls
+from .flash_deals import active_flash_deals
+
+SECTION_SIZE = 12
+
+
+def build_home_payload():
+    from .models import Banner, Product
+    from .product_rows import list_plan
+    from .serializers import BannerSerializer
+
+    plan = list_plan()
+    products = plan.values(Product.objects.filter(is_active=True))
+    flash, flash_expires_at = active_flash_deals()
+    return {
+        'featured': plan.render(list(products.filter(is_featured=True)[:SECTION_SIZE])),
+        'flash_deals': plan.render(flash),
+        'new_arrivals': plan.render(list(products.order_by('-created_at')[:SECTION_SIZE])),
+        'categories': get_category_tree()['roots'],
+        'banners': BannerSerializer(Banner.objects.filter(is_active=True), many=True).data,
+        'expires_at': flash_expires_at,
+    }
+
+
+def get_home_payload():
+    key = f'home-payload:{get_version("home")}'
+    payload = cache.get(key)
+    now = timezone.now()
+    if payload is None or (payload['expires_at'] and payload['expires_at'] <= now):
+        payload = build_home_payload()
+        ttl = settings.HOME_CACHE_TTL
+        if payload['expires_at']:
+            ttl = min(ttl, math.ceil((payload['expires_at'] - now).total_seconds()))
+        cache.set(key, payload, max(ttl, 1))
+    return payload
+
+
+def invalidate_home():
+    bump_version('home')
+
+
+def home_response_data(request):
+    """The cached payload with media paths made absolute for this request."""
+    payload = get_home_payload()
+    absolute = request.build_absolute_uri
+
+    def srcset(urls):
+        return {width: absolute(url) for width, url in urls.items()}
+
+    def products(rows):
+        return [
+            dict(
+                row,
+                primary_image=absolute(row['primary_image']),
+                primary_image_srcset=srcset(row['primary_image_srcset']),
+            ) if row['primary_image'] else row
+            for row in rows
+        ]
+
+    return {
+        'featured': products(payload['featured']),
+        'flash_deals': products(payload['flash_deals']),
+        'new_arrivals': products(payload['new_arrivals']),
+        'categories': with_absolute_urls(payload['categories'], request),
+        'banners': [
+            dict(row, image=absolute(row['image']), srcset=srcset(row['srcset'])) if row['image'] else row
+            for row in payload['banners']
+        ],
+    }
@@ -0,0 +1,78 @@
+"""
+Slug and SKU allocation.
+
+Slugs: a name's base slug is free, or it gets the next ``base-N`` suffix.
+All the existing ``base`` / ``base-N`` slugs for a batch of names are read
+with one query per ``SLUG_QUERY_CHUNK`` distinct bases, each base an
+equality plus a range probe on the slug index, so the cost no longer grows
+with how many products already share a name.
+
+SKUs: random 8-hex codes, checked against the table in one query per
+batch and redrawn on a clash.
+
+Both can still race with a concurrent insert; ``Product.save`` retries the
+INSERT with fresh values when the unique constraint catches one.
+"""
+
+import re
+import uuid
+
+from django.db.models import Q
+from django.utils.text import slugify
+
+SLUG_QUERY_CHUNK = 200      # keeps the OR'd prefix lookups well inside SQLite's expression limits
+SUFFIX_ROOM = 11            # "-" plus up to ten digits
+
+_suffix = re.compile(r'-(\d+)$')
+
+
+def slug_base(name, max_length, fallback='item'):
+    base = slugify(name)[:max_length - SUFFIX_ROOM].strip('-')
+    return base or fallback
+
+
+def allocate_slugs(queryset, bases, field='slug'):
+    """
+    Return one unique slug per entry of ``bases`` (duplicates allowed),
+    unique against ``queryset`` and within the batch.
+    """
+    taken = {}      # base -> set of used suffixes, 0 meaning the bare base
+    unique = list(dict.fromkeys(bases))
+    for start in range(0, len(unique), SLUG_QUERY_CHUNK):
+        chunk = unique[start:start + SLUG_QUERY_CHUNK]
+        lookup = Q(**{f'{field}__in': chunk})
+        for base in chunk:
+            taken[base] = set()
+            # A plain range, so it is an index range scan (startswith and
+            # regex lookups are not, on SQLite): every slug from "base-0" up
+            # to "base-9..." ("-:" sorts right after "-9"). Slugs in it that
+            # are not "base-N", e.g. "base-4k-tv", are dropped below.
+            lookup |= Q(**{f'{field}__gte': f'{base}-0', f'{field}__lt': f'{base}-:'})
+        for slug in queryset.filter(lookup).order_by().values_list(field, flat=True).iterator():
+            if slug in taken:
+                taken[slug].add(0)
+            match = _suffix.search(slug)
+            if match and slug[:match.start()] in taken:
+                taken[slug[:match.start()]].add(int(match.group(1)))
+
+    slugs = []
+    for base in bases:
+        used = taken[base]
+        n = 0 if 0 not in used else max(used) + 1
+        used.add(n)
+        slugs.append(base if n == 0 else f'{base}-{n}')
+    return slugs
+
+
+def new_sku():
+    return uuid.uuid4().hex[:8].upper()
+
+
+def allocate_skus(queryset, count, field='sku'):
+    """Return ``count`` fresh SKUs not present in ``queryset`` and distinct from each other."""
+    skus = set()
+    while len(skus) < count:
+        candidates = {new_sku() for _ in range(count - len(skus))} - skus
+        clashes = set(queryset.filter(**{f'{field}__in': candidates}).values_list(field, flat=True))
+        skus |= candidates - clashes
+    return list(skus)
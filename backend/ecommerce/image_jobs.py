@@ -0,0 +1,191 @@
+"""
+Bulk image processing in a process pool.
+
+Decoding, resizing, WebP re-encoding and hashing are CPU-bound, so bulk
+callers (``seed_data``, ``import_products``, ``generate_image_variants``)
+hand them to ``run_image_jobs``: a ``ProcessPoolExecutor`` with one worker
+per core (``IMAGE_JOB_WORKERS`` overrides; 1 runs inline). Jobs are fed
+through a bounded window and results come back in completion order, so
+memory stays flat however many images there are. A job that fails —
+unreadable file, corrupt image, even a crashed worker — yields an
+``ImageResult`` carrying the error; the rest carry on.
+
+Workers only see file paths or bytes and return bytes; storage and the
+database stay in the calling process, which writes rows in bulk. Bulk
+writes send no signals, so ``create_product_images`` refreshes the
+denormalised primary image columns itself.
+"""
+
+import hashlib
+import io
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image
+
+from .images import render_variants, store_variants
+from .storage import ContentAddressedStorage
+
+WINDOW_PER_WORKER = 4       # jobs in flight per worker; bounds the bytes held in memory
+
+
+class ImageJob:
+    """One image to process. ``key`` is the caller's handle, returned untouched."""
+
+    def __init__(self, key, path=None, data=None, buckets=None, quality=None):
+        self.key = key
+        self.path = path
+        self.data = data
+        self.buckets = tuple(buckets or settings.IMAGE_VARIANT_WIDTHS)
+        self.quality = quality or settings.IMAGE_VARIANT_QUALITY
+
+
+class ImageResult:
+
+    def __init__(self, key, sha256=None, width=None, height=None, variants=(), error=None):
+        self.key = key
+        self.sha256 = sha256            # of the original bytes; spares the parent a second read
+        self.width = width
+        self.height = height
+        self.variants = variants       # [(width, height, webp_bytes), ...]
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def process_image(job):
+    """Worker entry point: never raises, so one bad image cannot sink a batch."""
+    try:
+        data = job.data
+        if data is None:
+            with open(job.path, 'rb') as fh:
+                data = fh.read()
+        with Image.open(io.BytesIO(data)) as img:
+            width, height = img.width, img.height
+        return ImageResult(
+            job.key,
+            sha256=hashlib.sha256(data).hexdigest(),
+            width=width,
+            height=height,
+            variants=render_variants(data, job.buckets, job.quality),
+        )
+    except Exception as exc:
+        return ImageResult(job.key, error=f'{type(exc).__name__}: {exc}')
+
+
+def pool_size(workers=None):
+    return max(1, workers or settings.IMAGE_JOB_WORKERS or os.cpu_count() or 1)
+
+
+def run_image_jobs(jobs, workers=None):
+    """Process ``jobs`` (any iterable), yielding an ``ImageResult`` for each as it completes."""
+    workers = pool_size(workers)
+    if workers == 1:
+        for job in jobs:
+            yield process_image(job)
+        return
+
+    jobs = iter(jobs)
+    # Workers import only this module and Pillow; spawn keeps them clear of
+    # the parent's threads and database connections.
+    context = multiprocessing.get_context('spawn')
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    pending = {}
+
+    def submit(job):
+        nonlocal pool
+        try:
+            pending[pool.submit(process_image, job)] = job
+        except BrokenProcessPool:
+            pool.shutdown(wait=False, cancel_futures=True)
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            pending[pool.submit(process_image, job)] = job
+
+    try:
+        for job in itertools.islice(jobs, workers * WINDOW_PER_WORKER):
+            submit(job)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as exc:     # the worker died with the job (or its pool did)
+                    result = ImageResult(job.key, error=f'{type(exc).__name__}: {exc}')
+                yield result
+                for job in itertools.islice(jobs, 1):
+                    submit(job)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def file_job(key, field_file):
+    """Job for an already-stored file: by path when the storage is local, else by content."""
+    storage = field_file.storage
+    try:
+        return ImageJob(key, path=storage.path(field_file.name))
+    except NotImplementedError:
+        with storage.open(field_file.name, 'rb') as fh:
+            return ImageJob(key, data=fh.read())
+
+
+def upload_images(sources, field, workers=None, store=True):
+    """
+    Process local files and store each valid one (plus its variants) where
+    ``field`` (an ``ImageField``) would put an upload.
+
+    ``sources`` is an iterable of ``(key, path)``. Yields
+    ``(key, name, variants_record, error)``; ``name`` and the record are
+    None when the image failed or ``store`` is False (validation only).
+    """
+    paths = {}
+
+    def jobs():
+        for key, path in sources:
+            paths[key] = path
+            yield ImageJob(key, path=str(path))
+
+    storage = field.storage
+    # Content-addressed storage names the file by the digest the worker already took
+    addressed = isinstance(storage, ContentAddressedStorage)
+    for result in run_image_jobs(jobs(), workers):
+        path = paths.pop(result.key)
+        if not result.ok or not store:
+            yield result.key, None, None, result.error
+            continue
+        try:
+            with open(path, 'rb') as fh:
+                extra = {'digest': result.sha256} if addressed else {}
+                name = storage.save(field.generate_filename(None, os.path.basename(path)), File(fh), **extra)
+            record = {'source': name, 'sizes': store_variants(storage, name, result.variants)}
+        except OSError as exc:
+            yield result.key, None, None, f'{type(exc).__name__}: {exc}'
+            continue
+        yield result.key, name, record, None
+
+
+def create_product_images(images, batch_size=500):
+    """
+    Bulk-insert unsaved ``ProductImage`` rows whose ``image`` and
+    ``image_variants`` are already set, then refresh their products'
+    primary image columns. Returns the number of products refreshed.
+    """
+    from .flash_deals import invalidate_flash_deals
+    from .home import invalidate_home
+    from .models import Product, ProductImage
+
+    if not images:
+        return 0
+    ProductImage.objects.bulk_create(images, batch_size=batch_size)
+    refreshed = Product.objects.filter(pk__in={img.product_id for img in images}).refresh_primary_images()
+    if refreshed:
+        invalidate_home()
+        invalidate_flash_deals()
+    return refreshed
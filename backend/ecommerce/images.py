@@ -0,0 +1,147 @@
+"""
+Responsive WebP derivatives for uploaded images.
+
+Every ``ProductImage`` and ``Banner`` image gets one WebP per width bucket
+in ``IMAGE_VARIANT_WIDTHS`` that is narrower than the original, plus one at
+the original width when it is smaller than the largest bucket. They are
+stored next to the upload under ``<upload_to>/variants/`` and recorded on
+the row as
+
+    {"source": "products/a.jpg",
+     "sizes": {"160": {"name": "products/variants/a_w160.webp", "width": 160, "height": 120}, ...}}
+
+``source`` tells a stale record (the image was replaced) from a current
+one. Variants are generated by the post_save handlers in
+``ecommerce.signals`` and by ``manage.py generate_image_variants``;
+``srcset_map`` turns a record into the ``{"160w": url, ...}`` map the
+serializers return. Bulk work renders in a process pool instead, see
+``ecommerce.image_jobs``.
+"""
+
+import io
+import logging
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+
+def target_widths(width, buckets=None):
+    buckets = sorted(buckets or settings.IMAGE_VARIANT_WIDTHS)
+    widths = [w for w in buckets if w < width]
+    if width < buckets[-1]:
+        widths.append(width)
+    return widths
+
+
+def render_variants(data, buckets=None, quality=None):
+    """
+    Decode image bytes and return ``[(width, height, webp_bytes), ...]``,
+    smallest first. Pure CPU work: no Django storage or database access.
+    """
+    quality = quality or settings.IMAGE_VARIANT_QUALITY
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'PA') else 'RGB')
+        results = []
+        for width in target_widths(img.width, buckets):
+            height = max(1, round(img.height * width / img.width))
+            resized = img if width == img.width else img.resize((width, height), Image.LANCZOS)
+            out = io.BytesIO()
+            resized.save(out, 'WEBP', quality=quality, method=4)
+            results.append((width, height, out.getvalue()))
+        return results
+
+
+def variant_name(source, width):
+    path = PurePosixPath(source)
+    return str(path.parent / 'variants' / f'{path.stem}_w{width}.webp')
+
+
+def store_variants(storage, source, rendered):
+    """Save rendered variants beside ``source``; return the ``sizes`` record."""
+    sizes = {}
+    for width, height, data in rendered:
+        name = variant_name(source, width)
+        if storage.exists(name):
+            storage.delete(name)
+        sizes[str(width)] = {
+            'name': storage.save(name, ContentFile(data)),
+            'width': width,
+            'height': height,
+        }
+    return sizes
+
+
+def variant_fields(model):
+    """Columns written when a row's variants change."""
+    fields = ['image_variants']
+    if any(f.name == 'updated_at' for f in model._meta.concrete_fields):
+        fields.append('updated_at')     # feeds the product ETags
+    return fields
+
+
+def apply_variants(instance, rendered):
+    """
+    Store ``rendered`` for ``instance.image`` and set the record (and
+    ``updated_at``) on the unsaved instance. Returns the names of the
+    variant files it supersedes, to delete once the row is written.
+    """
+    field_file = instance.image
+    record = instance.image_variants or {}
+    old_names = {size['name'] for size in (record.get('sizes') or {}).values()}
+    record = {'source': field_file.name, 'sizes': store_variants(field_file.storage, field_file.name, rendered)}
+    instance.image_variants = record
+    if 'updated_at' in variant_fields(type(instance)):
+        instance.updated_at = timezone.now()
+    return old_names - {size['name'] for size in record['sizes'].values()}
+
+
+def delete_files(storage, names):
+    if getattr(storage, 'shares_files', False):
+        return      # may still be referenced by another row; dedupe_media reclaims them
+    for name in names:
+        storage.delete(name)
+
+
+def generate_variants(instance, force=False):
+    """
+    (Re)build the variants of ``instance.image`` unless they are current.
+    Writes the record with ``.update()`` (no signals) and returns it, or
+    None when the source file cannot be read.
+    """
+    field_file = instance.image
+    record = instance.image_variants or {}
+    if not field_file.name or (record.get('source') == field_file.name and not force):
+        return record
+    try:
+        with field_file.storage.open(field_file.name, 'rb') as fh:
+            data = fh.read()
+    except FileNotFoundError:
+        return None
+    try:
+        rendered = render_variants(data)
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        logger.warning("Could not render variants of %s: %s", field_file.name, exc)
+        return None
+    stale = apply_variants(instance, rendered)
+    model = type(instance)
+    model.objects.filter(pk=instance.pk).update(**{f: getattr(instance, f) for f in variant_fields(model)})
+    # Drop the derivatives of a replaced image
+    delete_files(field_file.storage, stale)
+    return instance.image_variants
+
+
+def srcset_map(record, storage, request=None):
+    """``{"160w": url, ...}`` for a variants record, smallest first."""
+    sizes = (record or {}).get('sizes') or {}
+    result = {}
+    for width in sorted(sizes, key=int):
+        url = storage.url(sizes[width]['name'])
+        result[f'{width}w'] = request.build_absolute_uri(url) if request else url
+    return result
@@ -0,0 +1,36 @@
+"""
+Django management command: backfill_primary_images
+===================================================
+Usage:
+    python manage.py backfill_primary_images
+    python manage.py backfill_primary_images --chunk-size 1000
+
+Recomputes Product.primary_image_path / _width / _height from ProductImage
+rows. Signals keep these in sync for normal saves; run this after loading
+images with bulk_create, raw SQL or fixtures.
+"""
+
+from django.core.management.base import BaseCommand
+
+from ecommerce.models import Product
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalised primary image columns on Product."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Products processed per batch (default: 500)",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        pks = list(Product.objects.order_by("pk").values_list("pk", flat=True))
+        updated = 0
+        for start in range(0, len(pks), chunk_size):
+            updated += Product.objects.filter(pk__in=pks[start:start + chunk_size]).refresh_primary_images()
+            self.stdout.write(f"   {min(start + chunk_size, len(pks))}/{len(pks)} products checked")
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} of {len(pks)} products"))
@@ -0,0 +1,79 @@
+"""
+Django management command: benchmark_product_lists
+====================================================
+Usage:
+    python manage.py benchmark_product_lists
+    python manage.py benchmark_product_lists --sizes 20 100 500 --repeat 50
+
+Times one page of the product list both ways, against the current catalog:
+ProductListSerializer over model instances, and the row renderer the list
+endpoints use (see ecommerce.product_rows). Each line reports the median
+of --repeat runs, with the query included ("fetch + render") and without
+("render"), and checks that both produce the same JSON. Nothing is written.
+"""
+
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from ecommerce.models import Product
+from ecommerce.product_rows import list_plan
+from ecommerce.serializers import ProductListSerializer
+
+
+def median_ms(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+class Command(BaseCommand):
+    help = "Compare ProductListSerializer with the row renderer at several page sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100, 500], help="Page sizes (default: 20 100 500)")
+        parser.add_argument("--repeat", type=int, default=20, help="Runs per measurement (default: 20)")
+
+    def handle(self, *args, **options):
+        request = APIRequestFactory().get("/api/v1/products/")
+        products = Product.objects.filter(is_active=True)
+        plan = list_plan()
+        available = products.count()
+        repeat = options["repeat"]
+
+        self.stdout.write(f"{available} active products; median of {repeat} runs\n")
+        self.stdout.write(f"{'size':>6} {'':>16} {'serializer':>12} {'rows':>10} {'speedup':>8}")
+        for size in options["sizes"]:
+            if size > available:
+                self.stdout.write(self.style.WARNING(f"{size:>6} skipped: only {available} products"))
+                continue
+            instances = products.select_related("category", "brand")[:size]
+            values = plan.values(products)[:size]
+
+            def slow(rows=None):
+                rows = list(instances.all()) if rows is None else rows
+                return ProductListSerializer(rows, many=True, context={"request": request}).data
+
+            def fast(rows=None):
+                rows = list(values.all()) if rows is None else rows
+                return plan.render(rows, request)
+
+            if JSONRenderer().render(slow()) != JSONRenderer().render(fast()):
+                self.stdout.write(self.style.ERROR(f"{size:>6} outputs differ"))
+                continue
+            fetched_instances, fetched_rows = list(instances), list(values)
+            for label, slow_run, fast_run in (
+                ("fetch + render", slow, fast),
+                ("render", lambda: slow(fetched_instances), lambda: fast(fetched_rows)),
+            ):
+                slow_ms, fast_ms = median_ms(slow_run, repeat), median_ms(fast_run, repeat)
+                self.stdout.write(
+                    f"{size:>6} {label:>16} {slow_ms:>10.2f}ms {fast_ms:>8.2f}ms {slow_ms / fast_ms:>7.1f}x"
+                )
+        self.stdout.write(self.style.SUCCESS("Done"))
@@ -0,0 +1,34 @@
+"""
+Django management command: compute_bought_together
+====================================================
+Usage:
+    python manage.py compute_bought_together            # new orders only
+    python manage.py compute_bought_together --rebuild  # recount every order
+
+Updates the "frequently bought together" lists (see
+ecommerce.bought_together) from the orders placed since the last run.
+Run it from cron, e.g. hourly; a run with no new orders is a no-op.
+--rebuild discards the saved counts and recounts the whole order history,
+e.g. after changing the scoring settings or to drop cancelled orders.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from ecommerce.bought_together import update_bought_together
+
+
+class Command(BaseCommand):
+    help = "Update the frequently-bought-together lists from new orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true", help="Recount all orders from scratch")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        orders, products, rows = update_bought_together(rebuild=options["rebuild"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Counted {orders} orders; rewrote the lists of {products} products "
+            f"({rows} rows) in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,35 @@
+"""
+Django management command: compute_similar_products
+=====================================================
+Usage:
+    python manage.py compute_similar_products            # products edited since the last run
+    python manage.py compute_similar_products --rebuild  # re-vectorise the whole catalog
+
+Updates the "similar products" lists (see ecommerce.similar) from product
+names, descriptions, categories and brands. Run it from cron, e.g. every
+15 minutes; only lists that can have changed are rewritten. --rebuild
+recomputes the term weights from the current catalog and every list from
+scratch — run it now and then (e.g. nightly) as the catalog's vocabulary
+drifts, and after changing the SIMILAR_* settings.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from ecommerce.similar import update_similar
+
+
+class Command(BaseCommand):
+    help = "Update the similar-products lists from catalog content."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true", help="Re-vectorise every product from scratch")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        products, lists, rows = update_similar(rebuild=options["rebuild"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-vectorised {products} products; rewrote {lists} lists "
+            f"({rows} rows) in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,178 @@
+"""
+Django management command: dedupe_media
+========================================
+Usage:
+    python manage.py dedupe_media --dry-run       # report only
+    python manage.py dedupe_media
+    python manage.py dedupe_media --no-reclaim    # rewrite rows, keep the old files
+
+Moves catalog images stored before content-addressed storage (see
+ecommerce.storage) to their digest names: each legacy file is hashed once,
+copied to ``<dir>/<aa>/<bb>/<digest>.<ext>`` unless those bytes are already
+there, and every row pointing at it is rewritten with one bulk_update per
+chunk. WebP variants move along with their source. Products' denormalised
+primary image columns are refreshed and the cached payloads invalidated
+afterwards.
+
+Then every file under the catalog upload folders that no row references
+any more — the legacy copies and ``_c4NlbXh``-suffixed duplicates, stale
+variants — is deleted. Files newer than the start of the run are left
+alone, so uploads that land meanwhile are safe.
+"""
+
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ecommerce.caching import invalidate_tags
+from ecommerce.category_tree import invalidate_category_tree
+from ecommerce.flash_deals import invalidate_flash_deals
+from ecommerce.home import invalidate_home
+from ecommerce.images import variant_name
+from ecommerce.models import Banner, Brand, Category, ProductImage
+from ecommerce.storage import addressed_name, content_digest, is_addressed
+
+FIELDS = ((ProductImage, "image"), (Banner, "image"), (Category, "image"), (Brand, "logo"))
+
+
+class Command(BaseCommand):
+    help = "Move catalog images to content-addressed names and delete duplicate files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report what would change, write nothing")
+        parser.add_argument("--no-reclaim", action="store_true", help="Do not delete unreferenced files")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Rows written per batch (default: 500)",
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options["dry_run"]
+        self.started = timezone.now()
+        self.moved = {}             # legacy name -> addressed name (None: unreadable)
+        self.referenced = set()
+        verb = "Would rewrite" if self.dry_run else "Rewrote"
+
+        for model, field in FIELDS:
+            rewritten, missing = self.rewrite(model, field, options["chunk_size"])
+            self.stdout.write(f"   {model.__name__}: {verb.lower()} {rewritten} rows, {missing} missing files")
+
+        if not self.dry_run and self.moved:
+            call_command("backfill_primary_images", stdout=self.stdout)
+            # bulk_update sends no signals; retire every payload that embeds an image URL
+            invalidate_category_tree()
+            invalidate_home()
+            invalidate_flash_deals()
+            invalidate_tags("product", "category", "brand", "banner")
+
+        copies = sum(1 for name in set(self.moved.values()) if name)
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {len(self.moved)} legacy files as {copies} content-addressed ones"
+        ))
+        if not options["no_reclaim"]:
+            self.reclaim()
+
+    # ── Rows ─────────────────────────────────────────────────────────────────
+    def rewrite(self, model, field, chunk_size):
+        has_variants = any(f.name == "image_variants" for f in model._meta.concrete_fields)
+        fields = [field] + (["image_variants"] if has_variants else [])
+        rows = model.objects.exclude(**{f"{field}__isnull": True}).exclude(**{field: ""})
+        batch, rewritten, missing = [], 0, 0
+        for instance in rows.order_by("pk").only("pk", *fields).iterator(chunk_size=chunk_size):
+            file = getattr(instance, field)
+            name = file.name
+            if is_addressed(name):
+                self.keep(name, instance.image_variants if has_variants else None)
+                continue
+            new = self.move(file.storage, name)
+            if new is None:
+                missing += 1
+                continue
+            setattr(instance, field, new)
+            if has_variants:
+                instance.image_variants = self.move_variants(file.storage, instance.image_variants, new)
+            self.keep(new, instance.image_variants if has_variants else None)
+            batch.append(instance)
+            rewritten += 1
+            if len(batch) >= chunk_size:
+                self.write(model, batch, fields)
+                batch = []
+        self.write(model, batch, fields)
+        return rewritten, missing
+
+    def write(self, model, batch, fields):
+        if batch and not self.dry_run:
+            model.objects.bulk_update(batch, fields)
+
+    def keep(self, name, variants):
+        self.referenced.add(name)
+        for size in ((variants or {}).get("sizes") or {}).values():
+            self.referenced.add(size["name"])
+
+    def move(self, storage, name):
+        if name not in self.moved:
+            try:
+                with storage.open(name, "rb") as fh:
+                    content = File(fh, name)
+                    if self.dry_run:
+                        self.moved[name] = addressed_name(name, content_digest(content))
+                    else:
+                        self.moved[name] = storage.save(name, content)
+            except FileNotFoundError:
+                self.moved[name] = None
+        return self.moved[name]
+
+    def move_variants(self, storage, record, source):
+        """Copy the variants to names derived from ``source``; {} (rebuild) if any is missing."""
+        sizes = {}
+        for width, size in ((record or {}).get("sizes") or {}).items():
+            name = variant_name(source, width)
+            if not self.dry_run and not storage.exists(name):
+                try:
+                    with storage.open(size["name"], "rb") as fh:
+                        name = storage.save(name, File(fh, name))
+                except FileNotFoundError:
+                    return {}
+            sizes[width] = {**size, "name": name}
+        return {"source": source, "sizes": sizes} if sizes else {}
+
+    # ── Files ────────────────────────────────────────────────────────────────
+    def reclaim(self):
+        files = freed = 0
+        roots = {(model._meta.get_field(field).storage, model._meta.get_field(field).upload_to.strip("/"))
+                 for model, field in FIELDS}
+        for storage, root in roots:
+            for name in self.walk(storage, root):
+                if name in self.referenced:
+                    continue
+                if storage.get_modified_time(name) >= self.started:
+                    continue
+                files += 1
+                freed += storage.size(name)
+                if not self.dry_run:
+                    storage.delete(name)
+        verb = "Would delete" if self.dry_run else "Deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {files} unreferenced files ({freed / 1024 / 1024:.1f} MB)"
+        ))
+
+    def walk(self, storage, directory):
+        if not storage.exists(directory):
+            return
+        dirs, files = storage.listdir(directory)
+        for filename in files:
+            yield posixpath.join(directory, filename)
+        for sub in dirs:
+            path = posixpath.join(directory, sub)
+            yield from self.walk(storage, path)
+            if not self.dry_run and storage.listdir(path) == ([], []):
+                try:
+                    os.rmdir(storage.path(path))    # shard folders emptied by the deletes
+                except (NotImplementedError, OSError):
+                    pass
@@ -0,0 +1,49 @@
+"""
+Django management command: expire_flash_deals
+==============================================
+Usage:
+    python manage.py expire_flash_deals
+    python manage.py expire_flash_deals --watch
+
+Switches off every flash deal whose flash_deal_end has passed and retires
+the cached deal payloads. Web processes do this on their own (see
+FLASH_DEAL_MAX_SLEEP); run this from cron, or as a long-lived process with
+--watch, when that background thread is disabled.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ecommerce.flash_deals import expire_flash_deals, flash_deal_scheduler
+
+
+class Command(BaseCommand):
+    help = "Expire ended flash deals."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="Keep running, waking exactly when the next deal ends",
+        )
+        parser.add_argument(
+            "--max-sleep",
+            type=int,
+            default=60,
+            help="With --watch, longest wait between checks in seconds (default: 60)",
+        )
+
+    def handle(self, *args, **options):
+        if not options["watch"]:
+            count = expire_flash_deals()
+            self.stdout.write(self.style.SUCCESS(f"Expired {count} flash deals"))
+            return
+
+        while True:
+            # A connection held across long sleeps can be dropped by the server
+            close_old_connections()
+            delay = flash_deal_scheduler.tick()
+            wait = options["max_sleep"] if delay is None else min(delay, options["max_sleep"])
+            time.sleep(max(wait, 0.05))
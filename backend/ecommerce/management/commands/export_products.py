@@ -0,0 +1,58 @@
+"""
+Django management command: export_products
+===========================================
+Usage:
+    python manage.py export_products --output products.csv
+    python manage.py export_products --format ndjson --gzip --output products.ndjson.gz
+    python manage.py export_products --format ndjson | partner-upload
+    python manage.py export_products --base-url https://shop.example.com
+
+Writes the full product feed (the same rows as /api/v1/feeds/products.csv)
+to a file or stdout, streaming in keyset batches so memory stays constant.
+--base-url prefixes image paths, which are otherwise relative to MEDIA_URL.
+"""
+
+import sys
+
+from django.core.management.base import BaseCommand
+
+from ecommerce.export import FEED_FORMATS, feed_stream
+
+
+class Command(BaseCommand):
+    help = "Stream the product feed as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(FEED_FORMATS), default="csv")
+        parser.add_argument("--output", help="File to write (default: stdout)")
+        parser.add_argument("--gzip", action="store_true", help="Gzip the output")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=None,
+            help="Products read per batch (default: PRODUCT_FEED_CHUNK_SIZE)",
+        )
+        parser.add_argument("--include-inactive", action="store_true", help="Also export inactive products")
+        parser.add_argument("--base-url", default="", help="Prefix for image URLs, e.g. https://shop.example.com")
+
+    def handle(self, *args, **options):
+        stream = feed_stream(
+            options["format"],
+            gzip=options["gzip"],
+            chunk_size=options["chunk_size"],
+            include_inactive=options["include_inactive"],
+            media_base=options["base_url"].rstrip("/"),
+        )
+        if not options["output"]:
+            out = sys.stdout.buffer
+            for chunk in stream:
+                out.write(chunk)
+            out.flush()
+            return
+
+        written = 0
+        with open(options["output"], "wb") as fh:
+            for chunk in stream:
+                fh.write(chunk)
+                written += len(chunk)
+        self.stderr.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}"))
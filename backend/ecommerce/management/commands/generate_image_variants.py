@@ -0,0 +1,92 @@
+"""
+Django management command: generate_image_variants
+===================================================
+Usage:
+    python manage.py generate_image_variants
+    python manage.py generate_image_variants --force          # rebuild all
+    python manage.py generate_image_variants --model banner
+
+Builds the WebP size variants (see ecommerce.images) for product and banner
+images that have none or whose record is stale, e.g. images uploaded
+before variants existed or loaded with bulk_create. Images are rendered in
+a process pool (see ecommerce.image_jobs; --workers overrides the pool
+size) and the records written with one bulk_update per chunk. Products'
+denormalised primary image columns are refreshed afterwards.
+"""
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from ecommerce.image_jobs import file_job, run_image_jobs
+from ecommerce.images import apply_variants, delete_files, variant_fields
+from ecommerce.models import Banner, ProductImage
+
+MODELS = {"productimage": ProductImage, "banner": Banner}
+
+
+class Command(BaseCommand):
+    help = "Generate WebP size variants for product and banner images."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", choices=sorted(MODELS), action="append",
+                            help="Limit to one model (repeatable; default: all)")
+        parser.add_argument("--force", action="store_true", help="Rebuild variants that are already current")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=200,
+            help="Rows read per batch (default: 200)",
+        )
+        parser.add_argument("--workers", type=int, help="Worker processes (default: IMAGE_JOB_WORKERS or one per core)")
+
+    def handle(self, *args, **options):
+        for name in options["model"] or sorted(MODELS):
+            model = MODELS[name]
+            self.model, self.chunk_size = model, options["chunk_size"]
+            self.done = self.failed = 0
+            rows = model.objects.exclude(image="").order_by("pk").only("pk", "image", "image_variants")
+            total = rows.count()
+            self.pending = {}
+            written, stale = [], set()
+            for result in run_image_jobs(self.jobs(rows, options["force"]), options["workers"]):
+                instance = self.pending.pop(result.key)
+                if not result.ok:
+                    self.fail(instance, result.error)
+                    continue
+                stale |= apply_variants(instance, result.variants)
+                written.append(instance)
+                if len(written) >= self.chunk_size:
+                    self.write(written, stale)
+                    self.stdout.write(f"   {name}: {self.done + self.failed}/{total}")
+                    written, stale = [], set()
+            self.write(written, stale)
+            self.stdout.write(self.style.SUCCESS(
+                f"{name}: generated variants for {self.done} images, {self.failed} unreadable"
+            ))
+
+        if "productimage" in (options["model"] or MODELS):
+            call_command("backfill_primary_images", stdout=self.stdout)
+
+    def jobs(self, rows, force):
+        for instance in rows.iterator(chunk_size=self.chunk_size):
+            current = (instance.image_variants or {}).get("source") == instance.image.name
+            if current and not force:
+                continue
+            try:
+                job = file_job(instance.pk, instance.image)
+            except OSError as exc:
+                self.fail(instance, exc)
+                continue
+            self.pending[instance.pk] = instance
+            yield job
+
+    def write(self, written, stale):
+        if not written:
+            return
+        self.model.objects.bulk_update(written, variant_fields(self.model))
+        delete_files(written[0].image.storage, stale)
+        self.done += len(written)
+
+    def fail(self, instance, error):
+        self.failed += 1
+        self.stderr.write(f"   {instance.image.name}: {error}")
@@ -0,0 +1,473 @@
+"""
+Django management command: import_products
+============================================
+Usage:
+    python manage.py import_products catalog.csv
+    python manage.py import_products catalog.jsonl --chunk-size 2000
+    python manage.py import_products catalog.csv --dry-run
+    python manage.py import_products catalog.csv --resume
+    python manage.py import_products catalog.csv --create-missing
+    python manage.py import_products catalog.csv --images-dir ./photos --workers 8
+
+Streams a supplier catalog (CSV with a header row, or JSON Lines) into
+Product / ProductVariant. Recognised columns / keys:
+
+    name, price                       required for new products
+    sku                               matches an existing product → update it
+    description, short_description, original_price, stock,
+    is_active, is_featured, is_flash_deal, flash_deal_end
+    category, brand                   slug or name (case-insensitive)
+    variants                          list of {name, value, price_adjustment, stock}
+                                      (a JSON string in CSV); replaces existing ones
+    images                            image files, first one primary: a list, or
+                                      "a.jpg|b.jpg" in CSV; paths relative to
+                                      --images-dir (default: the input's folder);
+                                      replaces existing ones
+
+Rows are written in chunks, one transaction each, with bulk_create /
+bulk_update; slugs and SKUs are allocated per chunk. A chunk's images are
+resized and stored in a process pool (ecommerce.image_jobs) before its
+transaction opens; an unreadable image is reported and skipped without
+rejecting its row. After every chunk a
+checkpoint (<file>.checkpoint.json) records how far the import got, and
+--resume continues from there. --dry-run validates and writes everything
+inside a transaction that is rolled back.
+
+Signals do not fire for bulk writes: the search index is updated chunk by
+chunk and the cached category tree, homepage, flash deals and catalog
+responses are invalidated at the end. Autocomplete picks the products up
+on its next periodic rebuild (SUGGEST_MAX_AGE).
+"""
+
+import csv
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ecommerce.caching import invalidate_tags
+from ecommerce.category_tree import invalidate_category_tree
+from ecommerce.flash_deals import invalidate_flash_deals
+from ecommerce.home import invalidate_home
+from ecommerce.identifiers import allocate_skus, allocate_slugs, slug_base
+from ecommerce.image_jobs import create_product_images, upload_images
+from ecommerce.models import Brand, Category, Product, ProductImage, ProductVariant
+from ecommerce.search import get_search_backend
+
+TRUE_VALUES = {"1", "true", "yes", "y"}
+FALSE_VALUES = {"0", "false", "no", "n", ""}
+MAX_REPORTED_ERRORS = 50
+
+
+class RowError(ValueError):
+    pass
+
+
+# ─── Input ───────────────────────────────────────────────────────────────────
+
+def read_rows(path, fmt):
+    """Yield (row number, dict) pairs without loading the file into memory."""
+    with open(path, encoding="utf-8-sig", newline="") as fh:
+        if fmt == "csv":
+            for number, row in enumerate(csv.DictReader(fh), start=1):
+                yield number, row
+            return
+        number = 0
+        for line in fh:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                row = RowError(f"invalid JSON: {exc}")
+            yield number, row
+
+
+def _text(value):
+    return "" if value is None else str(value).strip()
+
+
+def _decimal(value, field):
+    try:
+        return Decimal(_text(value))
+    except InvalidOperation:
+        raise RowError(f"{field}: not a number: {value!r}")
+
+
+def _int(value, field):
+    try:
+        return int(_text(value))
+    except ValueError:
+        raise RowError(f"{field}: not an integer: {value!r}")
+
+
+def _bool(value, field):
+    if isinstance(value, bool):
+        return value
+    text = _text(value).lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise RowError(f"{field}: not a boolean: {value!r}")
+
+
+def _datetime(value, field):
+    text = _text(value)
+    if not text:
+        return None
+    parsed = parse_datetime(text)
+    if parsed is None:
+        raise RowError(f"{field}: not an ISO datetime: {value!r}")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def _variants(value):
+    if isinstance(value, str):
+        if not value.strip():
+            return []
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise RowError("variants: invalid JSON")
+    if not isinstance(value, list):
+        raise RowError("variants: expected a list")
+    variants = []
+    for item in value:
+        if not isinstance(item, dict) or not _text(item.get("name")) or not _text(item.get("value")):
+            raise RowError("variants: each needs a name and a value")
+        variants.append({
+            "name": _text(item["name"])[:100],
+            "value": _text(item["value"])[:100],
+            "price_adjustment": _decimal(item.get("price_adjustment") or 0, "variants.price_adjustment"),
+            "stock": _int(item.get("stock") or 0, "variants.stock"),
+        })
+    return variants
+
+
+def _images(value):
+    if isinstance(value, str):
+        value = value.split("|")
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise RowError("images: expected a list of paths")
+    return [item.strip() for item in value if item.strip()]
+
+
+PARSERS = {
+    "name": lambda v: _text(v)[:500],
+    "description": _text,
+    "short_description": lambda v: _text(v)[:500],
+    "price": lambda v: _decimal(v, "price"),
+    "original_price": lambda v: _decimal(v, "original_price") if _text(v) else None,
+    "stock": lambda v: _int(v, "stock"),
+    "is_active": lambda v: _bool(v, "is_active"),
+    "is_featured": lambda v: _bool(v, "is_featured"),
+    "is_flash_deal": lambda v: _bool(v, "is_flash_deal"),
+    "flash_deal_end": lambda v: _datetime(v, "flash_deal_end"),
+}
+
+
+def parse_row(raw):
+    """Turn one input row into model field values (only the keys present)."""
+    if isinstance(raw, RowError):
+        raise raw
+    if not isinstance(raw, dict):
+        raise RowError("expected an object")
+    fields = {}
+    for key, parse in PARSERS.items():
+        if raw.get(key) not in (None, ""):      # blank CSV cells leave the field alone
+            fields[key] = parse(raw[key])
+    return {
+        "sku": _text(raw.get("sku"))[:100],
+        "fields": fields,
+        "category": _text(raw.get("category")),
+        "brand": _text(raw.get("brand")),
+        "variants": _variants(raw["variants"]) if raw.get("variants") not in (None, "") else None,
+        "images": _images(raw["images"]) if raw.get("images") not in (None, "") else None,
+    }
+
+
+# ─── Lookups ─────────────────────────────────────────────────────────────────
+
+class Lookup:
+    """Slug / lower-cased name → instance, loaded once for the whole import."""
+
+    def __init__(self, model, create_missing):
+        self.model = model
+        self.create_missing = create_missing
+        self.created = 0
+        self.by_key = {}
+        for obj in model.objects.all():
+            self.by_key[obj.slug] = obj
+            self.by_key.setdefault(obj.name.lower(), obj)
+
+    def resolve(self, ref):
+        if not ref:
+            return None
+        obj = self.by_key.get(ref) or self.by_key.get(ref.lower())
+        if obj is None:
+            if not self.create_missing:
+                raise RowError(f"unknown {self.model._meta.verbose_name}: {ref!r}")
+            obj = self.model.objects.create(name=ref)
+            self.by_key[obj.slug] = self.by_key[ref.lower()] = obj
+            self.created += 1
+        return obj
+
+
+# ─── Command ─────────────────────────────────────────────────────────────────
+
+class Command(BaseCommand):
+    help = "Bulk import products from a CSV or JSON Lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="Input format (default: from the file extension)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Rows written per transaction (default: 1000)",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Validate everything, write nothing")
+        parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint")
+        parser.add_argument(
+            "--create-missing",
+            action="store_true",
+            help="Create unknown categories and brands instead of rejecting the row",
+        )
+        parser.add_argument("--images-dir", help="Base folder for relative image paths (default: the input's folder)")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Image processing processes (default: IMAGE_JOB_WORKERS or one per core)",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.is_file():
+            raise CommandError(f"No such file: {path}")
+        fmt = options["format"] or ("csv" if path.suffix.lower() == ".csv" else "jsonl")
+        self.dry_run = options["dry_run"]
+        self.checkpoint_path = path.with_name(path.name + ".checkpoint.json")
+        self.source = {"path": str(path.resolve()), "size": path.stat().st_size}
+        self.images_dir = Path(options["images_dir"]) if options["images_dir"] else path.resolve().parent
+        self.workers = options["workers"]
+
+        self.stats = {"rows": 0, "created": 0, "updated": 0, "errors": 0, "images": 0}
+        if options["resume"]:
+            self.load_checkpoint()
+
+        self.started = time.monotonic()
+        self.processed = self.reported = 0
+        try:
+            if self.dry_run:
+                with transaction.atomic():
+                    self.run(path, fmt, options)
+                    transaction.set_rollback(True)
+            else:
+                self.run(path, fmt, options)
+        finally:
+            if not self.dry_run and (self.stats["created"] or self.stats["updated"]):
+                invalidate_category_tree()
+                invalidate_home()
+                invalidate_flash_deals()
+                invalidate_tags("product")
+
+        verb = "Would import" if self.dry_run else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {self.stats['rows']} rows: {self.stats['created']} created, "
+            f"{self.stats['updated']} updated, {self.stats['errors']} rejected, {self.stats['images']} images"
+            f" ({self.categories.created} categories, {self.brands.created} brands created)"
+        ))
+
+    def run(self, path, fmt, options):
+        self.categories = Lookup(Category, options["create_missing"])
+        self.brands = Lookup(Brand, options["create_missing"])
+        skip = self.stats["rows"]
+        chunk = []
+        for number, raw in read_rows(path, fmt):
+            if number <= skip:
+                continue
+            chunk.append((number, raw))
+            if len(chunk) >= options["chunk_size"]:
+                self.import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.import_chunk(chunk)
+        if not self.dry_run and self.checkpoint_path.exists():
+            self.checkpoint_path.unlink()
+
+    # ── Chunks ───────────────────────────────────────────────────────────────
+    def import_chunk(self, chunk):
+        uploads = self.upload_chunk_images(chunk)
+        try:
+            with transaction.atomic():
+                created, updated, errors, images = self.write_chunk(chunk, uploads)
+        except IntegrityError as exc:
+            raise CommandError(
+                f"Rows {chunk[0][0]}-{chunk[-1][0]} failed and were rolled back ({exc}). "
+                f"Fix the input and re-run with --resume."
+            )
+        self.stats["rows"] = chunk[-1][0]
+        self.stats["created"] += created
+        self.stats["updated"] += updated
+        self.stats["errors"] += errors
+        self.stats["images"] += images
+        if not self.dry_run:
+            self.save_checkpoint()
+        self.processed += len(chunk)
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        self.stdout.write(
+            f"   {self.stats['rows']} rows · {self.stats['created']} created · "
+            f"{self.stats['updated']} updated · {self.stats['errors']} rejected · "
+            f"{self.processed / elapsed:.0f} rows/s"
+        )
+
+    def upload_chunk_images(self, chunk):
+        """Process and store every image the chunk names; ``{ref: (name, variants, error)}``."""
+        paths = {}
+        for _, raw in chunk:
+            if not isinstance(raw, dict) or raw.get("images") in (None, ""):
+                continue
+            try:
+                refs = _images(raw["images"])
+            except RowError:
+                continue        # reported with the rest of the row by write_chunk
+            for ref in refs:
+                paths.setdefault(ref, self.images_dir / ref)
+        field = ProductImage._meta.get_field("image")
+        # A dry run still decodes everything but stores nothing
+        return {
+            ref: (name, variants, error)
+            for ref, name, variants, error in upload_images(
+                paths.items(), field, self.workers, store=not self.dry_run,
+            )
+        }
+
+    def write_chunk(self, chunk, uploads):
+        errors = 0
+        rows = {}       # sku (or row number) -> (number, parsed); the last row for a SKU wins
+        for number, raw in chunk:
+            try:
+                row = parse_row(raw)
+                row["category_obj"] = self.categories.resolve(row["category"])
+                row["brand_obj"] = self.brands.resolve(row["brand"])
+            except RowError as exc:
+                errors += 1
+                self.report(number, exc)
+                continue
+            rows[row["sku"] or number] = (number, row)
+
+        skus = [row["sku"] for _, row in rows.values() if row["sku"]]
+        existing = {p.sku: p for p in Product.objects.filter(sku__in=skus)} if skus else {}
+
+        to_create, to_update, update_fields, variants_for, images_for = [], [], set(), {}, {}
+        for number, row in rows.values():
+            product = existing.get(row["sku"])
+            if product is None:
+                missing = [f for f in ("name", "price") if row["fields"].get(f) in (None, "")]
+                if missing:
+                    errors += 1
+                    self.report(number, RowError(f"new product needs {', '.join(missing)}"))
+                    continue
+                product = Product(**{"description": "", **row["fields"], "sku": row["sku"]})
+                to_create.append(product)
+            else:
+                for field, value in row["fields"].items():
+                    setattr(product, field, value)
+                update_fields.update(row["fields"])
+                to_update.append(product)
+            if row["category"]:
+                product.category = row["category_obj"]
+                update_fields.add("category")
+            if row["brand"]:
+                product.brand = row["brand_obj"]
+                update_fields.add("brand")
+            if row["variants"] is not None:
+                variants_for[product] = row["variants"]
+            if row["images"] is not None:
+                images_for[product] = (number, row["images"])
+
+        if to_create:
+            max_length = Product._meta.get_field("slug").max_length
+            slugs = allocate_slugs(Product.objects.all(), [slug_base(p.name, max_length, "product") for p in to_create])
+            fresh_skus = iter(allocate_skus(Product.objects.all(), sum(1 for p in to_create if not p.sku)))
+            for product, slug in zip(to_create, slugs):
+                product.slug = slug
+                product.sku = product.sku or next(fresh_skus)
+            Product.objects.bulk_create(to_create)
+        if to_update:
+            now = timezone.now()
+            for product in to_update:
+                product.updated_at = now
+            Product.objects.bulk_update(to_update, sorted(update_fields | {"updated_at"}))
+
+        if variants_for:
+            ProductVariant.objects.filter(product__in=[p for p in variants_for if p in to_update]).delete()
+            ProductVariant.objects.bulk_create([
+                ProductVariant(product=product, **variant)
+                for product, variants in variants_for.items()
+                for variant in variants
+            ])
+
+        images = self.write_images(images_for, uploads, to_update)
+        get_search_backend().update(to_create + to_update)
+        return len(to_create), len(to_update), errors, images
+
+    def write_images(self, images_for, uploads, updated):
+        if not images_for:
+            return 0
+        ProductImage.objects.filter(product__in=[p for p in images_for if p in updated]).delete()
+        images = []
+        for product, (number, refs) in images_for.items():
+            order = 0
+            for ref in refs:
+                name, variants, error = uploads[ref]
+                if error:
+                    self.report(number, RowError(f"image {ref}: {error}"))
+                    continue
+                images.append(ProductImage(
+                    product=product,
+                    image=name,
+                    image_variants=variants,
+                    alt_text=product.name[:200],
+                    is_primary=order == 0,
+                    order=order,
+                ))
+                order += 1
+        if not self.dry_run:
+            create_product_images(images)
+        return len(images)
+
+    def report(self, number, exc):
+        self.reported += 1
+        if self.reported <= MAX_REPORTED_ERRORS:
+            self.stderr.write(f"   row {number}: {exc}")
+
+    # ── Checkpoints ──────────────────────────────────────────────────────────
+    def load_checkpoint(self):
+        if not self.checkpoint_path.exists():
+            raise CommandError(f"No checkpoint to resume from ({self.checkpoint_path})")
+        with open(self.checkpoint_path) as fh:
+            saved = json.load(fh)
+        if saved.get("source") != self.source:
+            raise CommandError("The checkpoint belongs to a different or modified input file")
+        self.stats.update(saved["stats"])
+        self.stdout.write(f"   Resuming after row {self.stats['rows']}")
+
+    def save_checkpoint(self):
+        tmp = self.checkpoint_path.with_suffix(".tmp")
+        with open(tmp, "w") as fh:
+            json.dump({"source": self.source, "stats": self.stats}, fh)
+        os.replace(tmp, self.checkpoint_path)
@@ -0,0 +1,35 @@
+"""
+Django management command: rebuild_search_index
+================================================
+Usage:
+    python manage.py rebuild_search_index
+    python manage.py rebuild_search_index --chunk-size 5000
+
+Re-indexes every product into the configured SEARCH_BACKEND. Run it after
+bulk loads that bypass Product.save() (raw SQL, queryset.update, fixtures).
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ecommerce.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Products read and indexed per batch (default: 2000)",
+        )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        with transaction.atomic():
+            count = backend.rebuild(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {count} products with {type(backend).__name__}"
+        ))
@@ -441,6 +441,7 @@ class Command(BaseCommand):
 
         # Demo user for reviews
         demo_user = User.objects.filter(is_superuser=True).first()
+        pending_images = []
 
         for (
             name, cat_slug, brand_name, price, orig_price,
@@ -470,12 +471,10 @@ class Command(BaseCommand):
                 is_featured=featured,
                 is_flash_deal=flash,
                 flash_deal_end=flash_end if flash else None,
-                rating=Decimal(str(round(random.uniform(3.5, 5.0), 1))),
-                review_count=random.randint(5, 120),
             )
 
             # ── Images ───────────────────────────────────────────────────────
-            self._attach_images(product, image_pool, ProductImage, count=random.randint(2, 4))
+            self._attach_images(product, image_pool, ProductImage, pending_images, count=random.randint(2, 4))
 
             # ── Variants ─────────────────────────────────────────────────────
             for partial, variant_list in PRODUCT_VARIANTS.items():
@@ -509,27 +508,43 @@ class Command(BaseCommand):
 
             self.stdout.write(ok(f"Created product: {name}"))
 
-    def _attach_images(self, product, image_pool, ProductImage, count=2):
-        """Pick random images from the pool and attach them to the product."""
+        self._upload_images(ProductImage, pending_images)
+
+    def _attach_images(self, product, image_pool, ProductImage, pending, count=2):
+        """Pick random images from the pool and queue them for the product."""
         if not image_pool:
             return
 
         selected = random.sample(image_pool, min(count, len(image_pool)))
-        media_products_dir = Path(settings.MEDIA_ROOT) / "products"
-        media_products_dir.mkdir(parents=True, exist_ok=True)
-
         for i, img_path in enumerate(selected):
-            try:
-                with open(img_path, "rb") as f:
-                    img_obj = ProductImage(
-                        product=product,
-                        alt_text=f"{product.name} image {i+1}",
-                        is_primary=(i == 0),
-                        order=i,
-                    )
-                    img_obj.image.save(img_path.name, File(f), save=True)
-            except Exception as exc:
-                self.stdout.write(warn(f"   Could not attach image {img_path.name}: {exc}"))
+            img_obj = ProductImage(
+                product=product,
+                alt_text=f"{product.name} image {i+1}",
+                is_primary=(i == 0),
+                order=i,
+            )
+            pending.append((img_obj, img_path))
+
+    def _upload_images(self, ProductImage, pending):
+        """Resize and store the queued images in parallel, then insert them in bulk."""
+        from ecommerce.image_jobs import create_product_images, upload_images
+
+        if not pending:
+            return
+        self.stdout.write(f"   Processing {len(pending)} product images…")
+        queued = dict(enumerate(pending))
+        sources = ((key, img_path) for key, (_, img_path) in queued.items())
+        images = []
+        for key, name, variants, error in upload_images(sources, ProductImage._meta.get_field("image")):
+            img_obj, img_path = queued[key]
+            if error:
+                self.stdout.write(warn(f"   Could not attach image {img_path.name}: {error}"))
+                continue
+            img_obj.image = name
+            img_obj.image_variants = variants
+            images.append(img_obj)
+        create_product_images(images)
+        self.stdout.write(ok(f"Attached {len(images)} product images"))
 
     # ── Counties & Stations ───────────────────────────────────────────────────
     def _seed_counties(self, County, PickupStation):
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+
+FTS_TABLE = 'ecommerce_product_fts'
+FTS_DOCS_TABLE = 'ecommerce_product_fts_docs'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Product = apps.get_model('ecommerce', 'Product')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {FTS_DOCS_TABLE} ("
+            f"rowid INTEGER PRIMARY KEY, product_id CHAR(32) NOT NULL UNIQUE)"
+        )
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"name, sku, brand, category, description, "
+            f"tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        for product in Product.objects.select_related('category', 'brand').iterator():
+            cursor.execute(f"INSERT INTO {FTS_DOCS_TABLE} (product_id) VALUES (%s)", [product.pk.hex])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, sku, brand, category, description) "
+                f"VALUES (last_insert_rowid(), %s, %s, %s, %s, %s)",
+                [
+                    product.name,
+                    product.sku,
+                    product.brand.name if product.brand_id else '',
+                    product.category.name if product.category_id else '',
+                    f"{product.short_description}\n{product.description}",
+                ],
+            )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_DOCS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
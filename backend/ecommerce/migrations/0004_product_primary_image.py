@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:49
+
+from django.db import migrations, models
+
+
+def copy_primary_image_paths(apps, schema_editor):
+    # Paths only — run `manage.py backfill_primary_images` to fill in dimensions.
+    Product = apps.get_model('ecommerce', 'Product')
+    ProductImage = apps.get_model('ecommerce', 'ProductImage')
+    chosen = {}
+    for product_id, image in (
+        ProductImage.objects.order_by('product_id', '-is_primary', 'order', 'pk')
+        .values_list('product_id', 'image')
+    ):
+        chosen.setdefault(product_id, image)
+    for product_id, image in chosen.items():
+        Product.objects.filter(pk=product_id).update(primary_image_path=image)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0003_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='primary_image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_image_path',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(copy_primary_image_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:50
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    Category = apps.get_model('ecommerce', 'Category')
+    parents = dict(Category.objects.values_list('pk', 'parent_id'))
+    paths = {}
+
+    def path_of(pk, seen=()):
+        if pk not in paths:
+            parent = parents[pk]
+            if parent is None or parent in seen:
+                paths[pk] = f'/{pk}/'
+            else:
+                paths[pk] = f'{path_of(parent, seen + (pk,))}{pk}/'
+        return paths[pk]
+
+    for pk in parents:
+        Category.objects.filter(pk=pk).update(path=path_of(pk))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0004_product_primary_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
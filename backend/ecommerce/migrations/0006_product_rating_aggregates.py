@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:52
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def recompute_from_reviews(apps, schema_editor):
+    # Reviews are the source of truth; stale or seeded rating/review_count are replaced.
+    Product = apps.get_model('ecommerce', 'Product')
+    Review = apps.get_model('ecommerce', 'Review')
+    stats = {}
+    for product_id, rating, n in (
+        Review.objects.order_by().values_list('product_id', 'rating').annotate(n=Count('pk'))
+    ):
+        stats.setdefault(product_id, {})[rating] = n
+    Product.objects.update(rating=0, review_count=0, rating_sum=0)
+    for product_id, histogram in stats.items():
+        count = sum(histogram.values())
+        total = sum(stars * n for stars, n in histogram.items())
+        Product.objects.filter(pk=product_id).update(
+            rating=round(Decimal(total) / count, 2),
+            review_count=count,
+            rating_sum=total,
+            **{f'stars_{stars}': n for stars, n in histogram.items()},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0005_category_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stars_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stars_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stars_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stars_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stars_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(recompute_from_reviews, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0008_review_page_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_flash_deal', 'flash_deal_end'], name='product_flash_deal_end_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:21
+
+import ecommerce.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0010_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='banner',
+            name='image',
+            field=models.ImageField(storage=ecommerce.storage.get_content_storage, upload_to='banners/'),
+        ),
+        migrations.AlterField(
+            model_name='brand',
+            name='logo',
+            field=models.ImageField(blank=True, null=True, storage=ecommerce.storage.get_content_storage, upload_to='brands/'),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=ecommerce.storage.get_content_storage, upload_to='categories/'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=ecommerce.storage.get_content_storage, upload_to='products/'),
+        ),
+    ]
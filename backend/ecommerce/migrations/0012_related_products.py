@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0011_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('bought_together', 'Frequently bought together')], max_length=20)),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('support', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['rank'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='order_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='relatedproduct',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='ecommerce.product'),
+        ),
+        migrations.AddField(
+            model_name='relatedproduct',
+            name='related',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_to', to='ecommerce.product'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='relatedproduct',
+            unique_together={('product', 'kind', 'rank')},
+        ),
+    ]
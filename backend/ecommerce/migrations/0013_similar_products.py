@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0012_related_products'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='relatedproduct',
+            name='kind',
+            field=models.CharField(choices=[('bought_together', 'Frequently bought together'), ('similar', 'Similar products')], max_length=20),
+        ),
+    ]
@@ -1,8 +1,15 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Cast, Concat, Round, Substr
+from django.db.models.lookups import GreaterThan
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 from django.utils.text import slugify
 import uuid
 
+from .identifiers import allocate_slugs, new_sku, slug_base
+from .storage import get_content_storage
+
 
 class User(AbstractUser):
     phone = models.CharField(max_length=15, blank=True)
@@ -17,23 +24,62 @@ class User(AbstractUser):
         return self.email
 
 
+class CategoryQuerySet(models.QuerySet):
+
+    def subtree(self, path):
+        """Categories at or below ``path`` — an index range scan on ``path``."""
+        # '0' sorts right after '/', so [path, path-without-slash + '0') is the prefix range
+        return self.filter(path__gte=path, path__lt=path[:-1] + '0')
+
+
 class Category(models.Model):
     name = models.CharField(max_length=200)
     slug = models.SlugField(unique=True, blank=True)
     parent = models.ForeignKey('self', null=True, blank=True, related_name='children', on_delete=models.SET_NULL)
-    image = models.ImageField(upload_to='categories/', blank=True, null=True)
+    # Materialised path of ancestor ids, e.g. "/1/5/12/"; maintained by save()
+    path = models.CharField(max_length=255, blank=True, db_index=True, editable=False)
+    image = models.ImageField(upload_to='categories/', blank=True, null=True, storage=get_content_storage)
     icon = models.CharField(max_length=100, blank=True)  # Bootstrap icon class
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CategoryQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = 'Categories'
         ordering = ['name']
 
+    def _parent_path(self):
+        # Read from the database: an in-memory parent may hold a stale path
+        if not self.parent_id:
+            return '/'
+        return Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or '/'
+
+    def clean(self):
+        if self.pk and self.parent_id:
+            own_path = f"/{self.pk}/"
+            if self.parent_id == self.pk or own_path in self._parent_path():
+                raise ValidationError({'parent': 'A category cannot be nested under itself or its descendants.'})
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
         super().save(*args, **kwargs)
+        self.refresh_path()
+
+    def refresh_path(self):
+        """Recompute this category's path and re-prefix its whole subtree if it moved."""
+        new_path = f"{self._parent_path()}{self.pk}/"
+        old_path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first()
+        if new_path == old_path:
+            self.path = new_path
+            return
+        Category.objects.filter(pk=self.pk).update(path=new_path)
+        if old_path:
+            Category.objects.subtree(old_path).exclude(pk=self.pk).update(
+                path=Concat(models.Value(new_path), Substr('path', len(old_path) + 1))
+            )
+        self.path = new_path
 
     def __str__(self):
         return self.name
@@ -42,7 +88,7 @@ class Category(models.Model):
 class Brand(models.Model):
     name = models.CharField(max_length=200)
     slug = models.SlugField(unique=True, blank=True)
-    logo = models.ImageField(upload_to='brands/', blank=True, null=True)
+    logo = models.ImageField(upload_to='brands/', blank=True, null=True, storage=get_content_storage)
     is_active = models.BooleanField(default=True)
 
     def save(self, *args, **kwargs):
@@ -54,6 +100,91 @@ class Brand(models.Model):
         return self.name
 
 
+# Fresh slug/SKU draws before giving up on a unique-constraint clash
+IDENTIFIER_ATTEMPTS = 5
+
+
+def discount_percent(price, original_price):
+    if original_price and original_price > price:
+        return int(((original_price - price) / original_price) * 100)
+    return 0
+
+
+class ProductQuerySet(models.QuerySet):
+
+    def refresh_primary_images(self):
+        """
+        Recompute the denormalised ``primary_image_*`` columns for these
+        products from their ProductImage rows (primary image, else the first
+        by ``order``). Images are read in one query; only products whose
+        image actually changed are written. Returns the number updated.
+        """
+        products = {
+            p.pk: p for p in self.only(
+                'pk', 'primary_image_path', 'primary_image_width', 'primary_image_height', 'primary_image_variants',
+            )
+        }
+        chosen = {}
+        images = (
+            ProductImage.objects.filter(product_id__in=list(products))
+            .order_by('product_id', '-is_primary', 'order', 'pk')
+        )
+        for img in images:
+            chosen.setdefault(img.product_id, img)
+
+        updated = 0
+        for pk, product in products.items():
+            img = chosen.get(pk)
+            path = img.image.name if img else ''
+            variants = img.image_variants if img else {}
+            if (
+                path == product.primary_image_path
+                and (not path or product.primary_image_width)
+                and variants == product.primary_image_variants
+            ):
+                continue
+            width = height = None
+            if img:
+                try:
+                    width, height = img.image.width, img.image.height
+                except (OSError, ValueError, TypeError):
+                    pass
+            Product.objects.filter(pk=pk).update(
+                primary_image_path=path,
+                primary_image_width=width,
+                primary_image_height=height,
+                primary_image_variants=variants,
+                updated_at=timezone.now(),
+            )
+            updated += 1
+        return updated
+
+    def apply_review_change(self, added=None, removed=None):
+        """
+        Fold one review insert (``added``), delete (``removed``) or rating
+        edit (both) into the stored rating aggregates with a single UPDATE.
+        """
+        sum_delta = (added or 0) - (removed or 0)
+        count_delta = (added is not None) - (removed is not None)
+        new_sum = models.F('rating_sum') + sum_delta
+        new_count = models.F('review_count') + count_delta
+        changes = {
+            'rating_sum': new_sum,
+            'review_count': new_count,
+            'updated_at': timezone.now(),
+            'rating': models.Case(
+                models.When(GreaterThan(new_count, 0), then=Round(Cast(new_sum, models.FloatField()) / new_count, 2)),
+                default=models.Value(0),
+                output_field=models.DecimalField(max_digits=3, decimal_places=2),
+            ),
+        }
+        for stars, delta in ((added, 1), (removed, -1)):
+            if stars is not None:
+                field = f'stars_{stars}'
+                changes[field] = changes.get(field, models.F(field)) + delta
+        return self.update(**changes)
+
+
 class Product(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=500)
@@ -73,29 +204,72 @@ class Product(models.Model):
     views = models.PositiveIntegerField(default=0)
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=0)
     review_count = models.PositiveIntegerField(default=0)
+    # Running review aggregates, maintained by the Review signals
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    stars_1 = models.PositiveIntegerField(default=0, editable=False)
+    stars_2 = models.PositiveIntegerField(default=0, editable=False)
+    stars_3 = models.PositiveIntegerField(default=0, editable=False)
+    stars_4 = models.PositiveIntegerField(default=0, editable=False)
+    stars_5 = models.PositiveIntegerField(default=0, editable=False)
+    # Denormalised from ProductImage so product cards need no image query
+    primary_image_path = models.CharField(max_length=255, blank=True, editable=False)
+    primary_image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    primary_image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    primary_image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination: every catalog ordering plus the id tie-breaker
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            models.Index(fields=['rating', 'id'], name='product_rating_id_idx'),
+            models.Index(fields=['views', 'id'], name='product_views_id_idx'),
+            # Running / ended flash deals
+            models.Index(fields=['is_flash_deal', 'flash_deal_end'], name='product_flash_deal_end_idx'),
+        ]
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.name)
-            self.slug = base_slug
-            counter = 1
-            while Product.objects.filter(slug=self.slug).exclude(pk=self.pk).exists():
-                self.slug = f"{base_slug}-{counter}"
-                counter += 1
-        if not self.sku:
-            self.sku = str(uuid.uuid4()).split('-')[0].upper()
-        super().save(*args, **kwargs)
+        auto_slug, auto_sku = not self.slug, not self.sku
+        if not (auto_slug or auto_sku):
+            return super().save(*args, **kwargs)
+        others = Product.objects.exclude(pk=self.pk)
+        for attempt in range(IDENTIFIER_ATTEMPTS):
+            if auto_slug:
+                max_length = self._meta.get_field('slug').max_length
+                self.slug = allocate_slugs(others, [slug_base(self.name, max_length, 'product')])[0]
+            if auto_sku:
+                self.sku = new_sku()
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # Only retry when a concurrent insert took our slug or SKU
+                clash = models.Q()
+                if auto_slug:
+                    clash |= models.Q(slug=self.slug)
+                if auto_sku:
+                    clash |= models.Q(sku=self.sku)
+                if attempt == IDENTIFIER_ATTEMPTS - 1 or not others.filter(clash).exists():
+                    raise
+
+    @property
+    def rating_histogram(self):
+        return {stars: getattr(self, f'stars_{stars}') for stars in range(5, 0, -1)}
+
+    @property
+    def primary_image_url(self):
+        if not self.primary_image_path:
+            return None
+        return ProductImage._meta.get_field('image').storage.url(self.primary_image_path)
 
     @property
     def discount_percent(self):
-        if self.original_price and self.original_price > self.price:
-            return int(((self.original_price - self.price) / self.original_price) * 100)
-        return 0
+        return discount_percent(self.price, self.original_price)
 
     def __str__(self):
         return self.name
@@ -103,10 +277,13 @@ class Product(models.Model):
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to='products/')
+    image = models.ImageField(upload_to='products/', storage=get_content_storage)
     alt_text = models.CharField(max_length=200, blank=True)
     is_primary = models.BooleanField(default=False)
     order = models.PositiveIntegerField(default=0)
+    # WebP derivatives by width, see ecommerce.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['order']
@@ -121,6 +298,7 @@ class ProductVariant(models.Model):
     value = models.CharField(max_length=100)  # e.g., "Red", "XL"
     price_adjustment = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     stock = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.product.name} - {self.name}: {self.value}"
@@ -132,14 +310,89 @@ class Review(models.Model):
     rating = models.PositiveSmallIntegerField(choices=[(i, i) for i in range(1, 6)])
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('product', 'user')
+        indexes = [
+            # Review pages: a product's reviews, newest first
+            models.Index(fields=['product', 'created_at', 'id'], name='review_product_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.product.name} ({self.rating}★)"
 
 
+class RelatedProductQuerySet(models.QuerySet):
+    WRITE_CHUNK = 500
+
+    def replace_lists(self, kind, lists, replace_all=False):
+        """
+        Store ``lists`` — ``{product_pk: [(related_pk, score, support), ...]}``,
+        best first — as those products' ``kind`` neighbours, replacing what
+        they had (every product's, with ``replace_all``). Products that no
+        longer exist are skipped. Returns the number of rows written.
+        """
+        chunk = self.WRITE_CHUNK
+        involved = list({pk for pk in lists} | {related for entries in lists.values() for related, _, _ in entries})
+        live = set()
+        for start in range(0, len(involved), chunk):
+            live.update(
+                pk.hex for pk in Product.objects.filter(pk__in=involved[start:start + chunk])
+                .values_list('pk', flat=True)
+            )
+        rows = []
+        for pk, entries in lists.items():
+            if pk not in live:
+                continue
+            entries = [entry for entry in entries if entry[0] in live]
+            rows.extend(
+                RelatedProduct(product_id=pk, related_id=related, kind=kind, rank=rank, score=score, support=support)
+                for rank, (related, score, support) in enumerate(entries)
+            )
+
+        stale = self.filter(kind=kind)
+        with transaction.atomic():
+            if replace_all:
+                stale.delete()
+            else:
+                pks = list(lists)
+                for start in range(0, len(pks), chunk):
+                    stale.filter(product_id__in=pks[start:start + chunk]).delete()
+            self.bulk_create(rows, batch_size=chunk)
+        return len(rows)
+
+
+class RelatedProduct(models.Model):
+    """
+    Precomputed top-K neighbours of a product, one row per neighbour,
+    written by the offline jobs (see ``ecommerce.bought_together`` and
+    ``ecommerce.similar``). Product pks are passed around as hex strings.
+    """
+    BOUGHT_TOGETHER = 'bought_together'
+    SIMILAR = 'similar'
+    KIND_CHOICES = [
+        (BOUGHT_TOGETHER, 'Frequently bought together'),
+        (SIMILAR, 'Similar products'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_to')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    support = models.PositiveIntegerField(default=0)    # orders containing both
+
+    objects = RelatedProductQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['rank']
+        unique_together = ('product', 'kind', 'rank')
+
+    def __str__(self):
+        return f"{self.product_id} → {self.related_id} ({self.kind} #{self.rank})"
+
+
 # ─── Delivery / Pickup Stations ─────────────────────────────────────────────
 
 class County(models.Model):
@@ -253,6 +506,10 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Incremental scans over new orders (bought-together job)
+            models.Index(fields=['created_at'], name='order_created_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.order_number:
@@ -322,7 +579,8 @@ class Wishlist(models.Model):
 class Banner(models.Model):
     title = models.CharField(max_length=200)
     subtitle = models.CharField(max_length=300, blank=True)
-    image = models.ImageField(upload_to='banners/')
+    image = models.ImageField(upload_to='banners/', storage=get_content_storage)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     link = models.CharField(max_length=500, blank=True)
     is_active = models.BooleanField(default=True)
     order = models.PositiveIntegerField(default=0)
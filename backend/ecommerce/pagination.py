@@ -0,0 +1,224 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework import exceptions
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination.
+
+    Rows are ordered by the view's active ordering field plus ``id`` as a
+    unique tie-breaker, and each page starts strictly after the (value, id)
+    of the last row seen — an indexed range scan instead of OFFSET, so page
+    1000 costs the same as page 1. ``count`` is only computed on request
+    (``?count=true``).
+    """
+
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    tiebreak_field = 'id'
+    invalid_cursor_message = 'Invalid cursor'
+    unkeyed_ordering_message = "Cursor pages cannot be ordered by '{field}'; use page numbers or another ordering"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request, queryset, view)
+        if not self.is_keyable(queryset.model, self.field):
+            # e.g. search_rank: an annotation has no stable value to seek from
+            raise exceptions.ValidationError(
+                {self.cursor_query_param: self.unkeyed_ordering_message.format(field=self.field)}
+            )
+
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes'):
+            self.count = queryset.count()
+
+        cursor = self.decode_cursor(request, queryset.model)
+        reverse = bool(cursor and cursor['reverse'])
+        # Walking backwards means flipping the sort, then flipping the page back.
+        descending = self.descending != reverse
+
+        queryset = queryset.order_by(*self.order_by(descending))
+        if cursor:
+            queryset = queryset.filter(self.seek(cursor['value'], cursor['id'], descending))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = rows
+        return rows
+
+    def first_page(self, queryset, url):
+        """
+        First page of ``queryset`` for embedding in another payload; links
+        point at ``url``, the endpoint that serves the following pages.
+        """
+        self.base_url = url
+        self.count = None
+        self.field, self.descending = self.get_ordering(None, queryset, None)
+        rows = list(queryset.order_by(*self.order_by(self.descending))[:self.page_size + 1])
+        self.has_next, self.has_previous = len(rows) > self.page_size, False
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        payload = {}
+        if self.count is not None:
+            payload['count'] = self.count
+        payload['next'] = self.get_next_link()
+        payload['previous'] = self.get_previous_link()
+        payload['results'] = data
+        return Response(payload)
+
+    # ── Ordering ──────────────────────────────────────────────────────────────
+    def get_ordering(self, request, queryset, view):
+        """Return (field, descending) from the view's OrderingFilter, else the view default."""
+        ordering = None
+        for backend in getattr(view, 'filter_backends', []):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        if not ordering:
+            ordering = getattr(view, 'ordering', None) or ['-created_at']
+        field = ordering[0]
+        return field.lstrip('-'), field.startswith('-')
+
+    @staticmethod
+    def is_keyable(model, name):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return False
+        return field.concrete and not field.is_relation
+
+    def order_by(self, descending):
+        prefix = '-' if descending else ''
+        return [f'{prefix}{self.field}', f'{prefix}{self.tiebreak_field}']
+
+    def seek(self, value, pk, descending):
+        op = 'lt' if descending else 'gt'
+        return (
+            Q(**{f'{self.field}__{op}': value})
+            | Q(**{self.field: value, f'{self.tiebreak_field}__{op}': pk})
+        )
+
+    # ── Cursors ───────────────────────────────────────────────────────────────
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            return {
+                'value': self.cursor_value(model, self.field, raw['v']),
+                'id': self.cursor_value(model, self.tiebreak_field, raw['i']),
+                'reverse': bool(raw.get('r')),
+            }
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def cursor_value(model, name, value):
+        """
+        ``value`` converted by the model field ``name`` (a ``uuid.UUID`` for
+        UUID keys). Cursors are client input: anything the field would not
+        store raises here rather than when the page query runs.
+        """
+        field = model._meta.get_field(name)
+        value = field.to_python(value)
+        if value is None:
+            raise ValueError(name)
+        field.run_validators(value)     # e.g. integers out of the column's range
+        return value
+
+    def encode_cursor(self, obj, reverse):
+        value = getattr(obj, self.field)
+        if isinstance(value, Decimal):
+            value = str(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        raw = {'v': value, 'i': str(getattr(obj, self.tiebreak_field))}
+        if reverse:
+            raw['r'] = 1
+        encoded = urlsafe_b64encode(json.dumps(raw, separators=(',', ':')).encode()).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+
+class ProductPagination(PageNumberPagination):
+    """
+    Page numbers by default (what the listing pages use today); keyset
+    pagination as soon as a ``cursor`` param is sent — ``?cursor=`` with an
+    empty value requests the first keyset page.
+    """
+
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_next_link(self):
+        if self.keyset is not None:
+            return self.keyset.get_next_link()
+        return super().get_next_link()
+
+    def get_previous_link(self):
+        if self.keyset is not None:
+            return self.keyset.get_previous_link()
+        return super().get_previous_link()
+
+
+class ReviewPagination(KeysetPagination):
+    """Newest reviews first, keyed on (created_at, id)."""
+
+    page_size = settings.REVIEWS_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        return 'created_at', True
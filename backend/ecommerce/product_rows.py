@@ -0,0 +1,224 @@
+"""
+Product lists rendered straight from ``values_list()`` rows.
+
+``ProductListSerializer`` costs a model instance, a bound serializer and a
+``to_representation`` call per field for every product. The product grids
+(``/products/``, ``featured``, ``flash_deals``, ``new_arrivals``, related
+lists and the home payload) render the same JSON from plain row tuples:
+
+- a ``ListPlan`` is built once per fieldset from ProductListSerializer's own
+  bound fields: the columns to fetch, and for each output field a getter
+  chosen by field type — ``itemgetter`` for columns that are already in
+  their JSON form, DRF's exact decimal quantising and ISO datetime
+  formatting otherwise, and the field's own ``to_representation`` for any
+  type without a fast path;
+- ``render()`` resolves the media URL prefix and time zone once per call,
+  then runs one short loop per row.
+
+Fields read through a relation (``category_name``, ``brand_name``) are left
+out when the relation is empty, exactly as DRF's ``SkipField`` does. The
+parity tests in ``tests.py`` keep the output byte-for-byte equal to
+ProductListSerializer's; ``manage.py benchmark_product_lists`` measures it.
+"""
+
+import decimal
+import operator
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+from rest_framework import fields as drf
+from rest_framework.settings import api_settings
+
+from .models import Product, ProductImage, discount_percent
+from .serializers import ProductListSerializer
+
+ROW_COLUMNS = ('id', 'updated_at')     # ETags, keyset cursors
+SKIP = object()
+PLAN_CACHE_SIZE = 64
+
+_plans = {}
+
+
+def list_plan(fields=None, omit=None):
+    """The (cached) plan for a ``fields`` / ``omit`` fieldset."""
+    key = (frozenset(fields) if fields else None, frozenset(omit) if omit else None)
+    plan = _plans.get(key)
+    if plan is None:
+        if len(_plans) >= PLAN_CACHE_SIZE:
+            _plans.clear()
+        plan = _plans[key] = ListPlan(fields, omit)
+    return plan
+
+
+class MediaURLs:
+    """``storage.url()`` (+ ``build_absolute_uri``) with the prefix resolved once."""
+
+    def __init__(self, storage, request=None):
+        self.storage = storage
+        self.request = request
+        self.prefix = None
+        if isinstance(storage, FileSystemStorage):
+            self.prefix = request.build_absolute_uri(storage.base_url) if request else storage.base_url
+
+    def url(self, name):
+        if self.prefix is not None:
+            return self.prefix + filepath_to_uri(name).lstrip('/')
+        url = self.storage.url(name)
+        return self.request.build_absolute_uri(url) if self.request else url
+
+    def image(self, path):
+        return self.url(path) if path else None
+
+    def srcset(self, record):
+        # images.srcset_map for a row
+        sizes = (record or {}).get('sizes') or {}
+        return {f'{width}w': self.url(sizes[width]['name']) for width in sorted(sizes, key=int)}
+
+
+def _decimal(field):
+    exp = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            return field.to_representation(value)
+        return f'{value.quantize(exp, rounding=rounding, context=context):f}'
+    return convert
+
+
+def _datetime(field, tz):
+    def convert(value):
+        if value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(tz).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+class ListPlan:
+    """Columns and per-field converters for one ProductListSerializer fieldset."""
+
+    # Fields that are not a column: (columns read, factory(media) -> function of those columns)
+    computed = {
+        'discount_percent': (('price', 'original_price'), lambda media: discount_percent),
+        'primary_image': (('primary_image_path',), lambda media: media.image),
+        'primary_image_srcset': (('primary_image_variants',), lambda media: media.srcset),
+    }
+
+    def __init__(self, fields=None, omit=None):
+        serializer = ProductListSerializer(fields=fields, omit=omit)
+        self.specs = []                 # (name, kind, columns, field, skip_none)
+        columns = list(ROW_COLUMNS)
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in self.computed:
+                spec = (name, 'computed', self.computed[name][0], field, False)
+            else:
+                lookup = '__'.join(field.source_attrs)
+                try:
+                    Product._meta.get_field(field.source_attrs[0])
+                except FieldDoesNotExist:
+                    raise ImproperlyConfigured(f'ListPlan has no fast path for ProductListSerializer.{name}')
+                # DRF raises SkipField when a relation on the way is empty
+                skip_none = len(field.source_attrs) > 1 and field.default is drf.empty and not field.allow_null
+                spec = (name, self.kind(field), (lookup,), field, skip_none)
+            self.specs.append(spec)
+            columns.extend(c for c in spec[2] if c not in columns)
+        self.columns = tuple(columns)
+
+    @staticmethod
+    def kind(field):
+        if type(field) in (drf.CharField, drf.SlugField, drf.BooleanField, drf.IntegerField):
+            return 'column'
+        if type(field) is drf.UUIDField and field.uuid_format == 'hex_verbose':
+            return 'str'
+        if (
+            type(field) is drf.DecimalField
+            and getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+            and not (field.localize or field.normalize_output)
+            and field.decimal_places is not None
+        ):
+            return 'decimal'
+        if (
+            type(field) is drf.DateTimeField
+            and settings.USE_TZ
+            and getattr(field, 'format', api_settings.DATETIME_FORMAT).lower() == drf.ISO_8601
+        ):
+            return 'datetime'
+        return 'field'
+
+    def values(self, queryset, keep=()):
+        """``queryset`` as named rows holding this plan's columns, ``keep`` and its annotations."""
+        columns = list(self.columns)
+        columns.extend(c for c in (*keep, *queryset.query.annotations) if c not in columns)
+        return queryset.values_list(*columns, named=True)
+
+    def getters(self, names, request=None):
+        """``[(field name, getter(row))]`` for rows whose columns are ``names``."""
+        index = {name: i for i, name in enumerate(names)}
+        media = MediaURLs(ProductImage._meta.get_field('image').storage, request)
+        tz = timezone.get_current_timezone()
+        getters = []
+        for name, kind, columns, field, skip_none in self.specs:
+            positions = [index[c] for c in columns]
+            if kind == 'computed':
+                getters.append((name, _apply(self.computed[name][1](media), positions)))
+                continue
+            position = positions[0]
+            if kind == 'column' and not skip_none:
+                getters.append((name, operator.itemgetter(position)))
+                continue
+            if kind == 'column':
+                convert = None
+            elif kind == 'str':
+                convert = str
+            elif kind == 'decimal':
+                convert = _decimal(field)
+            elif kind == 'datetime':
+                convert = _datetime(field, getattr(field, 'timezone', tz))
+            else:
+                convert = field.to_representation
+            getters.append((name, _convert(convert, position, SKIP if skip_none else None)))
+        return getters
+
+    def render(self, rows, request=None):
+        """ProductListSerializer(rows, many=True).data, for rows from ``values()``."""
+        if not rows:
+            return []
+        getters = self.getters(type(rows[0])._fields, request)
+        skip = SKIP
+        data = []
+        for row in rows:
+            item = {}
+            for name, get in getters:
+                value = get(row)
+                if value is not skip:
+                    item[name] = value
+            data.append(item)
+        return data
+
+
+def _apply(function, positions):
+    if len(positions) == 1:
+        position, = positions
+        return lambda row: function(row[position])
+    if len(positions) == 2:
+        first, second = positions
+        return lambda row: function(row[first], row[second])
+    return lambda row: function(*[row[p] for p in positions])
+
+
+def _convert(convert, position, none):
+    if convert is None:
+        return lambda row: none if row[position] is None else row[position]
+
+    def get(row):
+        value = row[position]
+        return none if value is None else convert(value)
+    return get
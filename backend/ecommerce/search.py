@@ -0,0 +1,240 @@
+"""
+Product search index.
+
+The catalog search used to be DRF's SearchFilter, i.e. an ``icontains`` OR
+over five columns (two of them joined) for every term. This module keeps the
+``?search=`` contract but answers it from an inverted index instead.
+
+Backends are pluggable through ``settings.SEARCH_BACKEND``:
+
+    SQLiteFTSBackend    FTS5 virtual table, bm25-ranked (default, local dev)
+    DatabaseBackend     plain ORM ``icontains`` fallback for other databases
+
+The index is kept in sync by the Product / Brand / Category signal handlers
+in ``ecommerce.signals``. Use ``manage.py rebuild_search_index`` after bulk
+loads that bypass ``save()``.
+"""
+
+import re
+import uuid
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.utils.module_loading import import_string
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+
+FTS_TABLE = 'ecommerce_product_fts'
+FTS_DOCS_TABLE = 'ecommerce_product_fts_docs'
+
+# Product fields that feed the index — saves touching none of these
+# (e.g. the view counter) skip re-indexing.
+INDEXED_FIELDS = frozenset({'name', 'sku', 'description', 'short_description', 'brand', 'category'})
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def document_for(product):
+    """Flatten a product into the columns stored in the index."""
+    return {
+        'name': product.name,
+        'sku': product.sku,
+        'brand': product.brand.name if product.brand_id else '',
+        'category': product.category.name if product.category_id else '',
+        'description': f"{product.short_description}\n{product.description}",
+    }
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# BACKENDS
+# ══════════════════════════════════════════════════════════════════════════════
+
+class BaseSearchBackend:
+    """Interface every search backend implements."""
+
+    def update(self, products):
+        """Add or refresh the given products in the index."""
+        raise NotImplementedError
+
+    def remove(self, pks):
+        """Drop the given product ids from the index."""
+        raise NotImplementedError
+
+    def search(self, query, limit, queryset=None):
+        """
+        Return up to ``limit`` product ids for ``query``, best match first,
+        among the products in ``queryset`` (the whole catalog if ``None``).
+        """
+        raise NotImplementedError
+
+    def rebuild(self, chunk_size=2000):
+        """Re-index the whole catalog. Returns the number of products indexed."""
+        from .models import Product
+
+        self.clear()
+        count = 0
+        batch = []
+        for product in Product.objects.select_related('category', 'brand').iterator(chunk_size=chunk_size):
+            batch.append(product)
+            if len(batch) >= chunk_size:
+                self.update(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            self.update(batch)
+            count += len(batch)
+        return count
+
+    def clear(self):
+        pass
+
+
+class DatabaseBackend(BaseSearchBackend):
+    """No index at all — the old ``icontains`` behaviour, for non-SQLite databases."""
+
+    search_fields = ('name', 'description', 'sku', 'brand__name', 'category__name')
+
+    def update(self, products):
+        pass
+
+    def remove(self, pks):
+        pass
+
+    def search(self, query, limit, queryset=None):
+        from .models import Product
+
+        qs = Product.objects.all() if queryset is None else queryset.order_by()
+        for term in _TOKEN_RE.findall(query):
+            cond = Q()
+            for field in self.search_fields:
+                cond |= Q(**{f'{field}__icontains': term})
+            qs = qs.filter(cond)
+        return list(qs.values_list('pk', flat=True)[:limit])
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    SQLite FTS5 index.
+
+    FTS5 rows are keyed by an integer rowid while products use UUIDs, so a
+    small companion table maps one to the other. Both tables are created by
+    migration ``0002_product_search_index``.
+    """
+
+    # bm25 column weights: name, sku, brand, category, description
+    weights = (10.0, 8.0, 4.0, 4.0, 1.0)
+
+    def update(self, products):
+        with connection.cursor() as cursor:
+            for product in products:
+                doc = document_for(product)
+                cursor.execute(
+                    f"INSERT INTO {FTS_DOCS_TABLE} (product_id) VALUES (%s) "
+                    f"ON CONFLICT (product_id) DO NOTHING",
+                    [product.pk.hex],
+                )
+                cursor.execute(f"SELECT rowid FROM {FTS_DOCS_TABLE} WHERE product_id = %s", [product.pk.hex])
+                rowid = cursor.fetchone()[0]
+                cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [rowid])
+                cursor.execute(
+                    f"INSERT INTO {FTS_TABLE} (rowid, name, sku, brand, category, description) "
+                    f"VALUES (%s, %s, %s, %s, %s, %s)",
+                    [rowid, doc['name'], doc['sku'], doc['brand'], doc['category'], doc['description']],
+                )
+
+    def remove(self, pks):
+        hexes = [pk.hex for pk in pks]
+        if not hexes:
+            return
+        marks = ', '.join(['%s'] * len(hexes))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid IN "
+                f"(SELECT rowid FROM {FTS_DOCS_TABLE} WHERE product_id IN ({marks}))",
+                hexes,
+            )
+            cursor.execute(f"DELETE FROM {FTS_DOCS_TABLE} WHERE product_id IN ({marks})", hexes)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(f"DELETE FROM {FTS_DOCS_TABLE}")
+
+    def search(self, query, limit, queryset=None):
+        match = self.build_match(query)
+        if not match:
+            return []
+        weights = ', '.join(str(w) for w in self.weights)
+        candidates, params = '', []
+        if queryset is not None:
+            # Rank only rows the queryset keeps (both columns hold the UUID hex)
+            subquery, params = queryset.order_by().values('pk').query.sql_with_params()
+            candidates = f"AND d.product_id IN ({subquery}) "
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT d.product_id FROM {FTS_TABLE} "
+                f"JOIN {FTS_DOCS_TABLE} d ON d.rowid = {FTS_TABLE}.rowid "
+                f"WHERE {FTS_TABLE} MATCH %s {candidates}"
+                f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s",
+                [match, *params, limit],
+            )
+            return [uuid.UUID(row[0]) for row in cursor.fetchall()]
+
+    @staticmethod
+    def build_match(query):
+        """
+        Turn free text into a safe FTS5 expression.
+
+        Every token becomes a quoted prefix query, ANDed together — the same
+        "all terms must match somewhere" semantics SearchFilter had, while
+        still matching partially typed words.
+        """
+        tokens = _TOKEN_RE.findall(query)
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    return import_string(settings.SEARCH_BACKEND)()
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# DRF FILTERS
+# ══════════════════════════════════════════════════════════════════════════════
+
+class IndexedSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for SearchFilter backed by the search index.
+
+    Matching products are annotated with ``search_rank`` (0 = best match) so
+    ``RankedOrderingFilter`` can return them in relevance order. The index
+    is queried with the already filtered queryset (``is_active``, category,
+    brand, price...), so the ``SEARCH_MAX_RESULTS`` best matches are taken
+    among the products the other filters keep, not across the catalog.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = ' '.join(self.get_search_terms(request))
+        if not query:
+            return queryset
+        pks = get_search_backend().search(query, limit=settings.SEARCH_MAX_RESULTS, queryset=queryset)
+        if not pks:
+            return queryset.annotate(search_rank=Value(0, output_field=IntegerField())).none()
+        rank = Case(
+            *[When(pk=pk, then=Value(i)) for i, pk in enumerate(pks)],
+            default=Value(len(pks)),
+            output_field=IntegerField(),
+        )
+        return queryset.filter(pk__in=pks).annotate(search_rank=rank)
+
+
+class RankedOrderingFilter(filters.OrderingFilter):
+    """OrderingFilter that defaults to relevance order while a search is active."""
+
+    def get_default_ordering(self, view):
+        if view.request.query_params.get(api_settings.SEARCH_PARAM, '').strip():
+            return ['search_rank']
+        return super().get_default_ordering(view)
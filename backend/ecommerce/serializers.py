@@ -5,6 +5,11 @@ from .models import (
     Review, County, PickupStation, Cart, CartItem, Order, OrderItem,
     MpesaTransaction, Wishlist, Banner
 )
+from rest_framework.reverse import reverse
+from .category_tree import get_category_tree
+from .pagination import ReviewPagination
+from .images import srcset_map
+from .fieldsets import SparseFieldsetMixin
 
 
 # ─── Auth ─────────────────────────────────────────────────────────────────────
@@ -69,7 +74,8 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug', 'image', 'icon', 'parent', 'children', 'product_count', 'is_active']
 
     def get_product_count(self, obj):
-        return obj.products.filter(is_active=True).count()
+        # Active products in this category and all its descendants
+        return get_category_tree()['counts'].get(obj.pk, 0)
 
 
 class BrandSerializer(serializers.ModelSerializer):
@@ -81,9 +87,14 @@ class BrandSerializer(serializers.ModelSerializer):
 # ─── Product ──────────────────────────────────────────────────────────────────
 
 class ProductImageSerializer(serializers.ModelSerializer):
+    srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductImage
-        fields = ['id', 'image', 'alt_text', 'is_primary', 'order']
+        fields = ['id', 'image', 'srcset', 'alt_text', 'is_primary', 'order']
+
+    def get_srcset(self, obj):
+        return srcset_map(obj.image_variants, obj.image.storage, self.context.get('request'))
 
 
 class ProductVariantSerializer(serializers.ModelSerializer):
@@ -108,8 +119,9 @@ class ReviewSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     primary_image = serializers.SerializerMethodField()
+    primary_image_srcset = serializers.SerializerMethodField()
     category_name = serializers.CharField(source='category.name', read_only=True)
     brand_name = serializers.CharField(source='brand.name', read_only=True)
     discount_percent = serializers.IntegerField(read_only=True)
@@ -119,25 +131,38 @@ class ProductListSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'slug', 'sku', 'category_name', 'brand_name',
             'price', 'original_price', 'discount_percent',
-            'stock', 'rating', 'review_count', 'primary_image',
+            'stock', 'rating', 'review_count', 'primary_image', 'primary_image_srcset',
             'is_featured', 'is_flash_deal', 'flash_deal_end', 'created_at'
         ]
+        field_sources = {
+            'category_name': ('category__name',),
+            'brand_name': ('brand__name',),
+            'discount_percent': ('price', 'original_price'),
+            'primary_image': ('primary_image_path',),
+            'primary_image_srcset': ('primary_image_variants',),
+        }
 
     def get_primary_image(self, obj):
-        img = obj.images.filter(is_primary=True).first() or obj.images.first()
-        if img:
+        url = obj.primary_image_url
+        if url:
             request = self.context.get('request')
-            return request.build_absolute_uri(img.image.url) if request else img.image.url
+            return request.build_absolute_uri(url) if request else url
         return None
 
+    def get_primary_image_srcset(self, obj):
+        storage = ProductImage._meta.get_field('image').storage
+        return srcset_map(obj.primary_image_variants, storage, self.context.get('request'))
+
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
     variants = ProductVariantSerializer(many=True, read_only=True)
-    reviews = ReviewSerializer(many=True, read_only=True)
+    reviews = serializers.SerializerMethodField()
+    reviews_next = serializers.SerializerMethodField()
     category = CategoryChildSerializer(read_only=True)
     brand = BrandSerializer(read_only=True)
     discount_percent = serializers.IntegerField(read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
 
     class Meta:
         model = Product
@@ -145,11 +170,34 @@ class ProductDetailSerializer(serializers.ModelSerializer):
             'id', 'name', 'slug', 'sku', 'category', 'brand',
             'description', 'short_description',
             'price', 'original_price', 'discount_percent',
-            'stock', 'rating', 'review_count',
-            'images', 'variants', 'reviews',
+            'stock', 'rating', 'review_count', 'rating_histogram',
+            'images', 'variants', 'reviews', 'reviews_next',
             'is_featured', 'is_flash_deal', 'flash_deal_end',
             'views', 'created_at', 'updated_at'
         ]
+        field_sources = {
+            'discount_percent': ('price', 'original_price'),
+            'rating_histogram': tuple(f'stars_{stars}' for stars in range(1, 6)),
+            'reviews': ('slug',),           # queried by review_page, not prefetched
+            'reviews_next': ('slug',),
+        }
+
+    def review_page(self, obj):
+        # First page of reviews (one query, users joined); the rest are served
+        # by /products/<slug>/reviews/ starting at ``reviews_next``.
+        pages = self.__dict__.setdefault('_review_pages', {})
+        if obj.pk not in pages:
+            paginator = ReviewPagination()
+            url = reverse('product-reviews', kwargs={'slug': obj.slug}, request=self.context.get('request'))
+            rows = paginator.first_page(obj.reviews.select_related('user'), url)
+            pages[obj.pk] = (ReviewSerializer(rows, many=True).data, paginator.get_next_link())
+        return pages[obj.pk]
+
+    def get_reviews(self, obj):
+        return self.review_page(obj)[0]
+
+    def get_reviews_next(self, obj):
+        return self.review_page(obj)[1]
 
 
 # ─── Delivery ─────────────────────────────────────────────────────────────────
@@ -225,7 +273,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'product_name', 'product_sku', 'variant_name', 'quantity', 'unit_price', 'subtotal']
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     pickup_station = PickupStationSerializer(read_only=True)
     pickup_station_id = serializers.IntegerField(write_only=True)
@@ -240,6 +288,9 @@ class OrderSerializer(serializers.ModelSerializer):
             'items', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'order_number', 'status', 'payment_status', 'subtotal', 'delivery_fee', 'total', 'created_at']
+        field_sources = {
+            'pickup_station': ('pickup_station__county',),     # county_name
+        }
 
     def create(self, validated_data):
         station_id = validated_data.pop('pickup_station_id')
@@ -323,6 +374,11 @@ class WishlistSerializer(serializers.ModelSerializer):
 
 
 class BannerSerializer(serializers.ModelSerializer):
+    srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = Banner
-        fields = ['id', 'title', 'subtitle', 'image', 'link', 'order']
\ No newline at end of file
+        fields = ['id', 'title', 'subtitle', 'image', 'srcset', 'link', 'order']
+
+    def get_srcset(self, obj):
+        return srcset_map(obj.image_variants, obj.image.storage, self.context.get('request'))
\ No newline at end of file
@@ -0,0 +1,226 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Banner, Brand, Category, County, PickupStation, Product, ProductImage, Review
+from .caching import invalidate_tags
+from .category_tree import invalidate_category_tree
+from .flash_deals import flash_deal_scheduler, invalidate_flash_deals
+from .home import invalidate_home
+from .images import generate_variants
+from .search import INDEXED_FIELDS, get_search_backend
+from .suggest import patch_index
+
+
+SUGGEST_FIELDS = frozenset({'name', 'slug', 'is_active'})
+CATEGORY_TREE_FIELDS = frozenset({'category', 'is_active'})
+
+
+# ─── Search index ─────────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not INDEXED_FIELDS.intersection(update_fields):
+        return
+    get_search_backend().update([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_search_backend().remove([instance.pk])
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def reindex_related_products(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    # Brand and category names are denormalised into the index.
+    if raw or created:
+        return
+    if update_fields is not None and 'name' not in update_fields:
+        return
+    get_search_backend().update(
+        instance.products.select_related('category', 'brand').iterator(chunk_size=2000)
+    )
+
+
+# ─── Autocomplete ─────────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def update_suggestions(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not SUGGEST_FIELDS.intersection(update_fields):
+        return
+    kind = sender._meta.model_name
+    if instance.is_active:
+        patch_index('upsert', kind, instance.pk, instance.name, instance.slug, getattr(instance, 'views', 0))
+    else:
+        patch_index('remove', kind, instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Category)
+def remove_suggestion(sender, instance, **kwargs):
+    patch_index('remove', sender._meta.model_name, instance.pk)
+
+
+# ─── Image variants ───────────────────────────────────────────────────────────
+# Connected before the primary image refresh below, which copies the variants.
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Banner)
+def build_image_variants(sender, instance, raw=False, **kwargs):
+    # Inline on purpose: a single upload (admin) renders a few small WebPs,
+    # and its srcset is then complete on the next read. Bulk paths bypass
+    # signals and render in the process pool (see ecommerce.image_jobs).
+    if raw:
+        return
+    generate_variants(instance)
+
+
+# ─── Denormalised primary image ───────────────────────────────────────────────
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def refresh_primary_image(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if Product.objects.filter(pk=instance.product_id).refresh_primary_images():
+        invalidate_home()
+        invalidate_flash_deals()
+
+
+# ─── Category tree ────────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=Product)
+def invalidate_tree_on_product_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if update_fields is not None and not CATEGORY_TREE_FIELDS.intersection(update_fields):
+        return
+    invalidate_category_tree()
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_tree(sender, **kwargs):
+    invalidate_category_tree()
+
+
+# ─── Category paths ───────────────────────────────────────────────────────────
+
+@receiver(post_delete, sender=Category)
+def reroot_orphaned_categories(sender, instance, **kwargs):
+    # SET_NULL detached the children at the database level; give them new roots
+    orphans = Category.objects.subtree(instance.path).filter(parent__isnull=True) if instance.path else []
+    for child in orphans:
+        child.refresh_path()
+
+
+# ─── Review aggregates ────────────────────────────────────────────────────────
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, raw=False, **kwargs):
+    instance._previous = None
+    if instance.pk and not raw:
+        instance._previous = (
+            Review.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def add_review_to_rating(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    if created or previous is None:
+        Product.objects.filter(pk=instance.product_id).apply_review_change(added=instance.rating)
+        return
+    old_product_id, old_rating = previous
+    if old_product_id != instance.product_id:
+        Product.objects.filter(pk=old_product_id).apply_review_change(removed=old_rating)
+        Product.objects.filter(pk=instance.product_id).apply_review_change(added=instance.rating)
+    elif old_rating != instance.rating:
+        Product.objects.filter(pk=instance.product_id).apply_review_change(added=instance.rating, removed=old_rating)
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_from_rating(sender, instance, **kwargs):
+    Product.objects.filter(pk=instance.product_id).apply_review_change(removed=instance.rating)
+
+
+# ─── Homepage payload ─────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=Product)
+def invalidate_home_on_product_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'views'}:
+        return
+    invalidate_home()
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_home_payload(sender, **kwargs):
+    # Brand names and review ratings are shown on the product cards; review
+    # aggregates are written with .update(), so no Product signal fires
+    invalidate_home()
+
+
+# ─── Flash deals ──────────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=Product)
+def invalidate_flash_deals_on_product_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'views'}:
+        return
+    invalidate_flash_deals()
+    if instance.is_flash_deal:
+        flash_deal_scheduler.reschedule()
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_flash_deal_list(sender, **kwargs):
+    # Names, ratings and counts are shown on the deal cards
+    invalidate_flash_deals()
+
+
+# ─── Response cache tags ──────────────────────────────────────────────────────
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=County)
+@receiver(post_delete, sender=County)
+@receiver(post_save, sender=PickupStation)
+@receiver(post_delete, sender=PickupStation)
+def invalidate_model_tag(sender, **kwargs):
+    invalidate_tags(sender._meta.model_name)
+
+
+@receiver(post_save, sender=Product)
+def invalidate_product_tag_on_save(sender, instance, update_fields=None, **kwargs):
+    # Only category membership and visibility feed the cached responses
+    if update_fields is not None and not CATEGORY_TREE_FIELDS.intersection(update_fields):
+        return
+    invalidate_tags('product')
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_product_tag(sender, **kwargs):
+    invalidate_tags('product')
@@ -0,0 +1,379 @@
+"""
+"Similar products" from catalog content, for items with no order history.
+
+Each product becomes a TF-IDF vector over hashed word uni- and bigrams of
+its name (weighted up), short description and description, plus tokens
+for its category and brand. Terms are hashed into 2**20 buckets for the
+document frequencies, and the weighted bucket vector is folded into
+``SIMILAR_DIMENSIONS`` dense dimensions by a fixed sparse random
+projection (each bucket adds ±weight to one dimension), which preserves
+cosine similarity closely while keeping the whole catalog in one
+``float32`` matrix.
+
+Neighbours are only sought within a product's top-level category. Cosine
+scores are computed as dense matrix products in blocks of at most
+``BLOCK_SCORES`` entries, with top-K taken by ``argpartition``, so
+memory stays bounded however large a category grows. Lists keep the best
+``SIMILAR_TOP_K`` scoring at least ``SIMILAR_MIN_SCORE``; they go to
+``RelatedProduct``, which the ``/products/<slug>/similar/`` endpoint reads.
+
+The vectors, lists and IDF weights are persisted in
+``RECOMMENDATIONS_DIR/similar.npz``. Later runs are incremental:
+- products edited since the last run are re-vectorised (if their text,
+  category or brand actually changed) and get fresh lists;
+- every other product in their category merges the new scores into its
+  list, and is recomputed only if a product it listed moved away, was
+  removed or became less similar.
+The IDF weights stay as they were at the last ``--rebuild``.
+"""
+
+import os
+import re
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+HASH_BITS = 20
+HASH_MASK = (1 << HASH_BITS) - 1
+PROJECTION_SEED = 20240601
+BLOCK_SCORES = 1 << 25          # cosine scores held at once (128 MB of float32)
+DESCRIPTION_CHARS = 2000
+FIELD_WEIGHTS = (('name', 3.0), ('short_description', 1.5), ('description', 1.0))
+CATEGORY_WEIGHT = 2.0
+BRAND_WEIGHT = 2.0
+INACTIVE = -1                   # partition of removed / deactivated products
+FIELDS = ('pk', 'name', 'short_description', 'description', 'category_id', 'brand_id')
+
+_word = re.compile(r'[a-z0-9]+')
+_buckets = {}
+
+
+def state_path():
+    return os.path.join(settings.RECOMMENDATIONS_DIR, 'similar.npz')
+
+
+# ─── Features ────────────────────────────────────────────────────────────────
+
+def bucket(token):
+    b = _buckets.get(token)
+    if b is None:
+        if len(_buckets) > 2_000_000:
+            _buckets.clear()
+        b = _buckets[token] = zlib.crc32(token.encode()) & HASH_MASK
+    return b
+
+
+def terms(row):
+    """Weighted term counts of a product row: ``{bucket: weight}``."""
+    counts = {}
+    for field, weight in FIELD_WEIGHTS:
+        text = (row[field] or '')[:DESCRIPTION_CHARS].lower()
+        words = _word.findall(text)
+        for token in words + [f'{a} {b}' for a, b in zip(words, words[1:])]:
+            b = bucket(token)
+            counts[b] = counts.get(b, 0.0) + weight
+    for key, weight in (('category_id', CATEGORY_WEIGHT), ('brand_id', BRAND_WEIGHT)):
+        if row[key] is not None:
+            b = bucket(f'\x00{key}:{row[key]}')
+            counts[b] = counts.get(b, 0.0) + weight
+    return counts
+
+
+def fingerprint(row):
+    text = '\x1f'.join(str(row[f] or '')[:DESCRIPTION_CHARS] for f in FIELDS[1:])
+    return zlib.crc32(text.encode())
+
+
+def projection(dimensions):
+    rng = np.random.default_rng(PROJECTION_SEED)
+    dims = rng.integers(0, dimensions, size=1 << HASH_BITS)
+    signs = rng.choice(np.array([-1.0, 1.0], dtype=np.float32), size=1 << HASH_BITS)
+    return dims, signs
+
+
+def product_rows(queryset):
+    for values in queryset.values_list(*FIELDS).iterator(chunk_size=2000):
+        row = dict(zip(FIELDS, values))
+        row['pk'] = row['pk'].hex
+        yield row
+
+
+# ─── Index ───────────────────────────────────────────────────────────────────
+
+class SimilarityIndex:
+
+    def __init__(self, dimensions=None, k=None):
+        self.dimensions = dimensions or settings.SIMILAR_DIMENSIONS
+        self.k = k or settings.SIMILAR_TOP_K
+        self.ids = []
+        self.index = {}
+        self.vectors = np.zeros((0, self.dimensions), dtype=np.float32)
+        self.partition = np.zeros(0, dtype=np.int64)
+        self.fingerprint = np.zeros(0, dtype=np.int64)
+        self.top_idx = np.zeros((0, self.k), dtype=np.int64)
+        self.top_score = np.zeros((0, self.k), dtype=np.float32)
+        self.idf = None
+        self.watermark = None
+        self._projection = None
+
+    # ── Persistence ──────────────────────────────────────────────────────────
+    @classmethod
+    def load(cls, path=None):
+        path = path or state_path()
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path) as data:
+            state = cls(dimensions=data['vectors'].shape[1], k=data['top_idx'].shape[1])
+            state.ids = data['ids'].tolist()
+            state.vectors = data['vectors'].astype(np.float32)
+            state.partition = data['partition']
+            state.fingerprint = data['fingerprint']
+            state.top_idx = data['top_idx']
+            state.top_score = data['top_score']
+            state.idf = data['idf']
+            watermark = str(data['watermark'])
+        state.index = {pk: i for i, pk in enumerate(state.ids)}
+        state.watermark = parse_datetime(watermark) if watermark else None
+        return state
+
+    def save(self, path=None):
+        path = path or state_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp.npz'
+        np.savez(
+            tmp,
+            ids=np.array(self.ids, dtype='U32'),
+            vectors=self.vectors.astype(np.float16),
+            partition=self.partition,
+            fingerprint=self.fingerprint,
+            top_idx=self.top_idx,
+            top_score=self.top_score,
+            idf=self.idf,
+            watermark=np.array(self.watermark.isoformat() if self.watermark else ''),
+        )
+        os.replace(tmp, path)
+
+    @property
+    def compatible(self):
+        return (
+            self.idf is not None
+            and self.dimensions == settings.SIMILAR_DIMENSIONS
+            and self.k == settings.SIMILAR_TOP_K
+        )
+
+    # ── Vectors ──────────────────────────────────────────────────────────────
+    def fit_idf(self, rows):
+        df = np.zeros(1 << HASH_BITS, dtype=np.int64)
+        documents, pending = 0, []
+        for row in rows:
+            documents += 1
+            pending.append(np.fromiter(terms(row), dtype=np.int64))
+            if len(pending) >= 10_000:
+                df += np.bincount(np.concatenate(pending), minlength=len(df))
+                pending = []
+        if pending:
+            df += np.bincount(np.concatenate(pending), minlength=len(df))
+        self.idf = (np.log((1.0 + documents) / (1.0 + df)) + 1.0).astype(np.float32)
+
+    def vectorize(self, row):
+        if self._projection is None:
+            self._projection = projection(self.dimensions)
+        dims, signs = self._projection
+        counts = terms(row)
+        buckets = np.fromiter(counts, dtype=np.int64, count=len(counts))
+        weights = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        np.add.at(vector, dims[buckets], signs[buckets] * weights * self.idf[buckets])
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        # Rounded as stored, so scores patched after a reload match a rebuild's
+        return vector.astype(np.float16).astype(np.float32)
+
+    def add(self, pks):
+        """Append rows for new products; returns their indices."""
+        start = len(self.ids)
+        for pk in pks:
+            self.index[pk] = len(self.ids)
+            self.ids.append(pk)
+        n = len(self.ids) - start
+        self.vectors = np.vstack([self.vectors, np.zeros((n, self.dimensions), dtype=np.float32)])
+        self.partition = np.concatenate([self.partition, np.full(n, INACTIVE, dtype=np.int64)])
+        self.fingerprint = np.concatenate([self.fingerprint, np.zeros(n, dtype=np.int64)])
+        self.top_idx = np.vstack([self.top_idx, np.full((n, self.k), -1, dtype=np.int64)])
+        self.top_score = np.vstack([self.top_score, np.zeros((n, self.k), dtype=np.float32)])
+        return np.arange(start, len(self.ids))
+
+    # ── Neighbours ───────────────────────────────────────────────────────────
+    def members(self, partition):
+        return np.flatnonzero(self.partition == partition)
+
+    def score_blocks(self, rows, cols):
+        """Yield ``(row slice, scores)`` with ``scores[i, j] = cos(rows[i], cols[j])``."""
+        step = max(1, BLOCK_SCORES // max(len(cols), 1))
+        target = self.vectors[cols].T
+        for start in range(0, len(rows), step):
+            block = rows[start:start + step]
+            yield slice(start, start + len(block)), self.vectors[block] @ target
+
+    def compute(self, rows, members, min_score):
+        """Fresh top-K lists for ``rows`` against their partition's ``members`` (sorted)."""
+        k = self.k
+        for where, scores in self.score_blocks(rows, members):
+            block = rows[where]
+            scores[np.arange(len(block)), np.searchsorted(members, block)] = -np.inf   # not itself
+            take = min(k, len(members))
+            top = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            keep = top_scores >= min_score
+            idx = np.full((len(block), k), -1, dtype=np.int64)
+            score = np.zeros((len(block), k), dtype=np.float32)
+            idx[:, :take] = np.where(keep, members[top], -1)
+            score[:, :take] = np.where(keep, top_scores, 0)
+            self.top_idx[block] = idx
+            self.top_score[block] = score
+
+    def merge(self, rows, changed, min_score):
+        """
+        Fold the new scores of ``changed`` into the lists of ``rows`` (same
+        partition). Returns the rows that listed a changed product which has
+        since become less similar: something unlisted may now beat it, so
+        those lists must be recomputed.
+        """
+        k = self.k
+        position = np.full(len(self.ids), -1, dtype=np.int64)
+        position[changed] = np.arange(len(changed))
+        stale = []
+        for where, scores in self.score_blocks(rows, changed):
+            block = rows[where]
+            old_idx, old_score = self.top_idx[block], self.top_score[block]
+            pos = np.where(old_idx >= 0, position[np.maximum(old_idx, 0)], -1)
+            new = np.take_along_axis(scores, np.maximum(pos, 0), axis=1)
+            stale.append(block[((pos >= 0) & (new < old_score - 1e-6)).any(axis=1)])
+            # Drop the changed products' old entries, add their new scores, keep the best k
+            kept = (old_idx >= 0) & (pos < 0)
+            candidates = np.hstack([np.where(kept, old_idx, -1), np.broadcast_to(changed, scores.shape)])
+            candidate_scores = np.hstack([
+                np.where(kept, old_score, -np.inf), np.where(scores >= min_score, scores, -np.inf),
+            ])
+            order = np.argsort(-candidate_scores, axis=1, kind='stable')[:, :k]
+            best = np.take_along_axis(candidate_scores, order, axis=1)
+            found = np.isfinite(best)
+            self.top_idx[block] = np.where(found, np.take_along_axis(candidates, order, axis=1), -1)
+            self.top_score[block] = np.where(found, best, 0)
+        return np.concatenate(stale) if stale else np.zeros(0, dtype=np.int64)
+
+    def invalid(self):
+        """Rows listing a product that has left their partition (moved or removed)."""
+        listed = self.top_idx >= 0
+        partition = self.partition[np.maximum(self.top_idx, 0)]
+        return np.flatnonzero((listed & (partition != self.partition[:, None])).any(axis=1))
+
+    def lists(self, products):
+        return {
+            self.ids[p]: [
+                (self.ids[q], float(score), 0)
+                for q, score in zip(self.top_idx[p].tolist(), self.top_score[p].tolist()) if q >= 0
+            ]
+            for p in products.tolist()
+        }
+
+
+# ─── Job ─────────────────────────────────────────────────────────────────────
+
+def category_roots():
+    from .models import Category
+
+    return {
+        pk: int(path.strip('/').split('/')[0]) if path.strip('/') else pk
+        for pk, path in Category.objects.values_list('pk', 'path')
+    }
+
+
+def update_similar(rebuild=False, now=None):
+    """
+    Re-vectorise products edited since the last run and patch every list
+    that can have changed. Returns ``(products re-vectorised, lists written, rows written)``.
+    """
+    from .models import Product, RelatedProduct
+
+    now = now or timezone.now()
+    min_score = settings.SIMILAR_MIN_SCORE
+    state = None if rebuild else SimilarityIndex.load()
+    if state is None or not state.compatible:
+        rebuild, state = True, SimilarityIndex()
+        state.fit_idf(product_rows(Product.objects.filter(is_active=True)))
+
+    roots = category_roots()
+    active = {
+        pk.hex: roots.get(category_id, 0)
+        for pk, category_id in Product.objects.filter(is_active=True).values_list('pk', 'category_id').iterator()
+    }
+    state.add([pk for pk in active if pk not in state.index])
+    old_partition = state.partition.copy()
+    before = state.top_idx.copy(), state.top_score.copy()
+
+    # Re-vectorise what was edited, is new or came back
+    products = Product.objects.filter(is_active=True)
+    if rebuild or state.watermark is None:
+        batches = [products]
+    else:
+        returning = [pk for pk in active if old_partition[state.index[pk]] == INACTIVE]
+        batches = [products.filter(updated_at__gte=state.watermark)] + [
+            products.filter(pk__in=returning[start:start + 500]) for start in range(0, len(returning), 500)
+        ]
+    changed = set()
+    for batch in batches:
+        for row in product_rows(batch):
+            i = state.index[row['pk']]
+            digest = fingerprint(row)
+            if rebuild or digest != state.fingerprint[i] or old_partition[i] == INACTIVE:
+                state.vectors[i] = state.vectorize(row)
+                state.fingerprint[i] = digest
+                changed.add(i)
+
+    # Removed products drop out; a category move counts as a change
+    state.partition[:] = INACTIVE
+    for pk, root in active.items():
+        state.partition[state.index[pk]] = root
+    removed = np.flatnonzero((old_partition != INACTIVE) & (state.partition == INACTIVE))
+    state.top_idx[removed] = -1
+    state.top_score[removed] = 0
+    changed = np.union1d(
+        np.fromiter(changed, dtype=np.int64, count=len(changed)),
+        np.flatnonzero((old_partition != state.partition) & (state.partition != INACTIVE)),
+    )
+    invalid = state.invalid()
+
+    if rebuild:
+        partitions = set(state.partition.tolist())
+    else:
+        partitions = set(state.partition[changed].tolist()) | set(state.partition[invalid].tolist())
+    partitions.discard(INACTIVE)
+    for partition in sorted(partitions):
+        members = state.members(partition)
+        if rebuild:
+            state.compute(members, members, min_score)
+            continue
+        fresh = np.intersect1d(changed, members)
+        stale = np.intersect1d(invalid, members)
+        if len(fresh):
+            stale = np.union1d(stale, state.merge(np.setdiff1d(members, fresh), fresh, min_score))
+        state.compute(np.union1d(fresh, stale), members, min_score)
+
+    if rebuild:
+        dirty = np.flatnonzero(state.partition != INACTIVE)
+    else:
+        edited = (state.top_idx != before[0]) | (state.top_score != before[1])
+        dirty = np.union1d(np.flatnonzero(edited.any(axis=1)), removed)
+    written = RelatedProduct.objects.replace_lists(RelatedProduct.SIMILAR, state.lists(dirty), replace_all=rebuild)
+    # Saved only once the lists are written: a failed run is simply repeated
+    state.watermark = now
+    state.save()
+    return len(changed), len(dirty), written
@@ -0,0 +1,83 @@
+"""
+Content-addressed media storage.
+
+Catalog images (product images, banners, category images, brand logos)
+are stored under the SHA-256 of their bytes, sharded two levels deep:
+
+    products/3f/a2/3fa2…e9.jpg
+
+Saving bytes that are already stored writes nothing and returns the
+existing name, so re-uploads and repeated seed / import runs no longer
+pile up ``_c4NlbXh``-suffixed copies. Files derived from an addressed
+original (the WebP variants, ``<dir>/variants/<digest>_w320.webp``) keep
+their name: it already identifies the content they come from.
+
+A name never changes meaning, so the files are served with a one-year
+``immutable`` Cache-Control (``serve_media`` in development; see the Nginx
+snippet in the README for production). Because rows can share a file,
+nothing deletes one when a row lets go of it; ``manage.py dedupe_media``
+rewrites legacy names and reclaims unreferenced files.
+"""
+
+import hashlib
+import os
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.views.static import serve
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_addressed = re.compile(r'(?:^|/)[0-9a-f]{64}(?:[._][^/]*)?$')
+
+
+def is_addressed(name):
+    """True for names that are (or derive from) a content digest."""
+    return bool(_addressed.search(name))
+
+
+def content_digest(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():      # chunks() rewinds first, and so does the later write
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def addressed_name(name, digest):
+    """``products/a.JPG`` + digest → ``products/3f/a2/<digest>.jpg``."""
+    directory, filename = posixpath.split(name)
+    ext = os.path.splitext(filename)[1].lower()
+    return posixpath.join(directory, digest[:2], digest[2:4], digest + ext)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    shares_files = True     # several rows may point at one file; never delete on release
+
+    def save(self, name, content, max_length=None, digest=None):
+        """``digest``: the content's SHA-256, when the caller has already computed it."""
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        if not is_addressed(name):
+            name = addressed_name(name, digest or content_digest(content))
+            if self.exists(name):
+                return name
+        return super().save(name, content, max_length=max_length)
+
+
+content_storage = ContentAddressedStorage()
+
+
+def get_content_storage():
+    return content_storage
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """``django.views.static.serve`` that marks content-addressed files immutable."""
+    response = serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    if is_addressed(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
@@ -0,0 +1,309 @@
+"""
+In-memory autocomplete index for the header search box.
+
+Product, brand and category names are split into words. Three structures
+are kept per process:
+
+    vocab        word  -> set of entry keys containing it
+    words        sorted list of vocab words (prefix lookups via bisect)
+    trigrams     trigram -> set of vocab words (typo-tolerant lookups)
+
+A query matches an entry when every query word matches one of the entry's
+words, either exactly, as a prefix (last word only, it is still being typed)
+or fuzzily by trigram similarity. The index is built on first use,
+patched in place by the signal handlers in ``ecommerce.signals`` and
+rebuilt wholesale after ``SUGGEST_MAX_AGE`` seconds so that other worker
+processes pick up changes too. Rebuilds run in a background thread while
+requests keep reading the old index; the new one replaces it in a single
+assignment, after replaying the changes signalled while it was built.
+
+``SUGGEST_MEMORY_BUDGET_MB`` caps the approximate footprint; once reached,
+the least viewed products are left out (brands and categories always fit
+first).
+"""
+
+import heapq
+import logging
+import sys
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+KIND_PRIORITY = {'category': 0, 'brand': 1, 'product': 2}
+
+# Rough per-item costs (bytes) used for the memory budget.
+ENTRY_OVERHEAD = 400
+POSTING_OVERHEAD = 120
+
+MAX_PREFIX_WORDS = 200
+FUZZY_THRESHOLD = 0.4
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ''.join(ch if ch.isalnum() else ' ' for ch in text.lower())
+
+
+def tokenize(text):
+    return normalize(text).split()
+
+
+def trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SuggestIndex:
+
+    def __init__(self, memory_budget):
+        self.memory_budget = memory_budget
+        self._lock = threading.RLock()
+        self._entries = {}      # key -> (text, slug, weight, words)
+        self._evictable = []    # heap of (weight, key) per product entry; stale pairs are skipped
+        self._vocab = {}
+        self._words = []
+        self._trigrams = {}
+        self._size = 0
+        self.built_at = None
+
+    # ── Build / maintenance ───────────────────────────────────────────────────
+    def build(self):
+        from .models import Brand, Category, Product
+
+        with self._lock:
+            self._entries.clear()
+            self._vocab.clear()
+            self._words.clear()
+            self._trigrams.clear()
+            self._evictable.clear()
+            self._size = 0
+
+            for pk, name, slug in Category.objects.filter(is_active=True).values_list('pk', 'name', 'slug'):
+                self._add(('category', pk), name, slug, 0)
+            for pk, name, slug in Brand.objects.filter(is_active=True).values_list('pk', 'name', 'slug'):
+                self._add(('brand', pk), name, slug, 0)
+
+            products = (
+                Product.objects.filter(is_active=True)
+                .order_by('-views')
+                .values_list('pk', 'name', 'slug', 'views')
+            )
+            for pk, name, slug, views in products.iterator(chunk_size=2000):
+                if self._size >= self.memory_budget:
+                    break
+                self._add(('product', pk), name, slug, views)
+
+            self.built_at = time.monotonic()
+
+    def upsert(self, kind, pk, name, slug, weight=0):
+        with self._lock:
+            key = (kind, pk)
+            if key in self._entries:
+                self._discard(key)
+            self._add(key, name, slug, weight)
+            while self._size > self.memory_budget and self._evict_one():
+                pass
+            if len(self._evictable) > 2 * len(self._entries) + 64:
+                # Drop the pairs left behind by updates and removals
+                self._evictable = [(e[2], k) for k, e in self._entries.items() if k[0] == 'product']
+                heapq.heapify(self._evictable)
+
+    def remove(self, kind, pk):
+        with self._lock:
+            if (kind, pk) in self._entries:
+                self._discard((kind, pk))
+
+    def _cost(self, text, words):
+        return sys.getsizeof(text) + ENTRY_OVERHEAD + len(words) * POSTING_OVERHEAD
+
+    def _add(self, key, text, slug, weight):
+        words = tuple(dict.fromkeys(tokenize(text)))
+        self._entries[key] = (text, slug, weight, words)
+        self._size += self._cost(text, words)
+        if key[0] == 'product':
+            heapq.heappush(self._evictable, (weight, key))
+        for word in words:
+            keys = self._vocab.get(word)
+            if keys is None:
+                keys = self._vocab[word] = set()
+                insort(self._words, word)
+                for gram in trigrams(word):
+                    self._trigrams.setdefault(gram, set()).add(word)
+            keys.add(key)
+
+    def _discard(self, key):
+        text, _slug, _weight, words = self._entries.pop(key)
+        self._size -= self._cost(text, words)
+        for word in words:
+            keys = self._vocab[word]
+            keys.discard(key)
+            if keys:
+                continue
+            del self._vocab[word]
+            del self._words[bisect_left(self._words, word)]
+            for gram in trigrams(word):
+                bucket = self._trigrams[gram]
+                bucket.discard(word)
+                if not bucket:
+                    del self._trigrams[gram]
+
+    def _evict_one(self):
+        """Drop the least viewed product; False when none is left."""
+        while self._evictable:
+            weight, key = heapq.heappop(self._evictable)
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] == weight:
+                self._discard(key)
+                return True
+        return False
+
+    # ── Lookup ────────────────────────────────────────────────────────────────
+    def _match_word(self, word, prefix):
+        """Return {vocab word: score} for one query word."""
+        matches = {}
+        if word in self._vocab:
+            matches[word] = 1.0
+        if prefix:
+            start = bisect_left(self._words, word)
+            for candidate in self._words[start:start + MAX_PREFIX_WORDS]:
+                if not candidate.startswith(word):
+                    break
+                matches.setdefault(candidate, 0.9)
+        if len(word) >= 3:
+            grams = trigrams(word)
+            hits = {}
+            for gram in grams:
+                for candidate in self._trigrams.get(gram, ()):
+                    hits[candidate] = hits.get(candidate, 0) + 1
+            for candidate, shared in hits.items():
+                if candidate in matches:
+                    continue
+                other = len(candidate) + 1
+                if prefix and len(candidate) > len(word):
+                    # Compare against the candidate's leading part only.
+                    other = len(word) + 1
+                similarity = shared / (len(grams) + other - shared)
+                if similarity >= FUZZY_THRESHOLD:
+                    matches[candidate] = 0.8 * similarity
+        return matches
+
+    def suggest(self, query, limit):
+        words = tokenize(query)
+        if not words:
+            return []
+        with self._lock:
+            scores = None
+            for i, word in enumerate(words):
+                per_entry = {}
+                for candidate, score in self._match_word(word, prefix=(i == len(words) - 1)).items():
+                    for key in self._vocab[candidate]:
+                        if score > per_entry.get(key, 0):
+                            per_entry[key] = score
+                if scores is None:
+                    scores = per_entry
+                else:
+                    scores = {key: scores[key] + s for key, s in per_entry.items() if key in scores}
+                if not scores:
+                    return []
+
+            normalized = ' '.join(words)
+            ranked = []
+            for key, score in scores.items():
+                text, slug, weight, entry_words = self._entries[key]
+                if ' '.join(entry_words).startswith(normalized):
+                    score += 0.5
+                ranked.append((-score, KIND_PRIORITY[key[0]], -weight, len(text), key))
+            ranked.sort()
+
+            return [
+                {'type': key[0], 'text': self._entries[key][0], 'slug': self._entries[key][1]}
+                for *_rest, key in ranked[:limit]
+            ]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_index = None
+_index_lock = threading.Lock()
+_first_build_lock = threading.Lock()
+_journal = None         # changes signalled while a rebuild runs, replayed onto it
+
+
+def new_index():
+    return SuggestIndex(settings.SUGGEST_MEMORY_BUDGET_MB * 1024 * 1024)
+
+
+def get_suggest_index():
+    """
+    Return the process-wide index. Only the very first call builds it
+    inline; a stale index is still served while a background thread
+    rebuilds it.
+    """
+    if _index is None:
+        with _first_build_lock:
+            if _index is None:
+                rebuild_index()
+    index = _index
+    if time.monotonic() - index.built_at > settings.SUGGEST_MAX_AGE:
+        start_rebuild()
+    return index
+
+
+def start_rebuild():
+    """Rebuild in a background thread, unless a rebuild is already running."""
+    global _journal
+    with _index_lock:
+        if _journal is not None:
+            return
+        _journal = []
+    threading.Thread(target=_rebuild_in_background, name='suggest-rebuild', daemon=True).start()
+
+
+def _rebuild_in_background():
+    try:
+        rebuild_index()
+    except Exception:
+        logger.exception("Rebuilding the suggest index failed; serving the old one")
+    finally:
+        connection.close()
+
+
+def rebuild_index():
+    """Build a fresh index and swap it in. Runs in the rebuild thread (or inline, e.g. in tests)."""
+    global _index, _journal
+    with _index_lock:
+        if _journal is None:
+            _journal = []
+    try:
+        index = new_index()
+        index.build()
+        with _index_lock:
+            for method, args in _journal:
+                getattr(index, method)(*args)
+            _index = index
+    finally:
+        with _index_lock:
+            _journal = None
+    return index
+
+
+def patch_index(method, *args):
+    """
+    Apply a signalled change (``'upsert'`` / ``'remove'`` with their
+    arguments) to the live index, and to the one being rebuilt, if any.
+    """
+    with _index_lock:
+        index = _index
+        if _journal is not None:
+            _journal.append((method, args))
+    if index is not None:
+        getattr(index, method)(*args)
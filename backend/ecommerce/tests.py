@@ -1,3 +1,1327 @@
-from django.test import TestCase
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+from io import StringIO
+from pathlib import Path
+from base64 import urlsafe_b64encode
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Avg, Count
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .bought_together import update_bought_together
+from .category_tree import get_category_tree
+from .caching import bump_version, get_version, invalidate_tags
+from .export import iter_feed_rows
+from .flash_deals import (
+    active_flash_deals, expire_flash_deals, flash_deal_scheduler, invalidate_flash_deals,
+)
+from .identifiers import allocate_slugs
+from .image_jobs import upload_images
+from .home import build_home_payload, get_home_payload
+from .product_rows import list_plan
+from .serializers import ProductImageSerializer, ProductListSerializer
+from .similar import update_similar
+from .storage import IMMUTABLE_CACHE_CONTROL, get_content_storage, serve_media
+from .suggest import SuggestIndex, get_suggest_index, rebuild_index
+from .view_counter import ViewCounter
+from .models import (
+    Brand, Cart, CartItem, Category, Order, OrderItem, Product, ProductImage, RelatedProduct, Review, User, Wishlist,
+)
+
+
+def make_product(name, **kwargs):
+    kwargs.setdefault('description', f'{name} description')
+    kwargs.setdefault('price', Decimal('1000'))
+    return Product.objects.create(name=name, **kwargs)
+
+
+def add_image(product, name, **kwargs):
+    # Point at a fake file name — nothing is read from or written to storage.
+    img = ProductImage(product=product, **kwargs)
+    img.image.name = f'products/{name}'
+    img.save()
+    return img
+
+
+@override_settings(MEDIA_URL='/media/')
+class ProductListQueryCountTests(TestCase):
+    """Every endpoint embedding ProductListSerializer runs a fixed number of queries."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='buyer@example.com', username='buyer', password='x' * 10)
+        self.category = Category.objects.create(name='Electronics')
+        self.brand = Brand.objects.create(name='Samsung')
+
+    def make_catalog(self, count):
+        products = []
+        start = Product.objects.count()
+        for i in range(start, start + count):
+            product = make_product(
+                f'Product {i}', category=self.category, brand=self.brand,
+                is_featured=True, is_flash_deal=True,
+                flash_deal_end=timezone.now() + timezone.timedelta(hours=1),
+            )
+            add_image(product, f'{i}-a.jpg', order=0)
+            add_image(product, f'{i}-b.jpg', order=1, is_primary=True)
+            products.append(product)
+        return products
+
+    def count_queries(self, method, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx), response
+
+    def assertConstantQueries(self, url, expected, setup=None):
+        """Query count must stay at ``expected`` as the catalog grows."""
+        for size in (2, 8):
+            products = self.make_catalog(size)
+            if setup:
+                setup(products)
+            queries, _ = self.count_queries('get', url)
+            self.assertEqual(queries, expected, f'{url} with {size} more products')
+
+    def test_list(self):
+        self.assertConstantQueries('/api/v1/products/', 2)    # COUNT + page
+
+    def test_featured(self):
+        self.assertConstantQueries('/api/v1/products/featured/', 1)
+
+    def test_flash_deals(self):
+        self.assertConstantQueries('/api/v1/products/flash_deals/', 1)
+
+    def test_new_arrivals(self):
+        self.assertConstantQueries('/api/v1/products/new_arrivals/', 1)
+
+    def test_wishlist(self):
+        self.client.force_authenticate(self.user)
+
+        def add_to_wishlist(products):
+            for product in products:
+                Wishlist.objects.create(user=self.user, product=product)
+
+        self.assertConstantQueries('/api/v1/wishlist/', 2, setup=add_to_wishlist)
+
+    def test_cart(self):
+        self.client.force_authenticate(self.user)
+        cart = Cart.objects.create(user=self.user)
+
+        def add_to_cart(products):
+            for product in products:
+                CartItem.objects.create(cart=cart, product=product)
+
+        self.assertConstantQueries('/api/v1/cart/', 2, setup=add_to_cart)
+
+    def test_sparse_fieldset(self):
+        self.make_catalog(2)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/v1/products/?fields=id,name,price,discount_percent')
+        self.assertEqual(list(response.data['results'][0]), ['id', 'name', 'price', 'discount_percent'])
+        self.assertNotIn('JOIN', ctx[-1]['sql'])       # no category / brand for the names
+        self.assertNotIn('description', ctx[-1]['sql'])
+        response = self.client.get('/api/v1/products/featured/?omit=category_name,brand_name')
+        self.assertNotIn('category_name', response.data[0])
+        self.assertIn('primary_image', response.data[0])
+
+    def test_primary_image_falls_back_to_first_by_order(self):
+        product = make_product('No primary')
+        add_image(product, 'second.jpg', order=2)
+        add_image(product, 'first.jpg', order=1)
+        _, response = self.count_queries('get', '/api/v1/products/')
+        self.assertEqual(response.data['results'][0]['primary_image'], 'http://testserver/media/products/first.jpg')
+
+    def test_primary_image_prefers_flagged_image(self):
+        self.make_catalog(1)
+        _, response = self.count_queries('get', '/api/v1/products/')
+        self.assertEqual(response.data['results'][0]['primary_image'], 'http://testserver/media/products/0-b.jpg')
+
+
+@override_settings(MEDIA_URL='/media/')
+class ProductRowsParityTests(TestCase):
+    """The row renderer (product_rows) returns exactly what ProductListSerializer does."""
+
+    def setUp(self):
+        self.client = APIClient()
+        category, brand = Category.objects.create(name='Phones'), Brand.objects.create(name='Tecno')
+        end = timezone.now() + timedelta(hours=3)
+        variants = {'source': 'products/ab/cd/x.jpg', 'sizes': {
+            '640': {'name': 'products/variants/x_w640.webp', 'width': 640, 'height': 480},
+            '160': {'name': 'products/variants/x_w160.webp', 'width': 160, 'height': 120},
+        }}
+        cases = [
+            dict(category=category, brand=brand, original_price=Decimal('1500'), is_flash_deal=True, flash_deal_end=end),
+            dict(category=None, brand=brand, original_price=Decimal('999.99'), is_featured=True),
+            dict(category=category, brand=None, original_price=None, stock=7, is_featured=True),
+            dict(category=None, brand=None, original_price=Decimal('1000'), is_flash_deal=True, flash_deal_end=end),
+        ]
+        for i, kwargs in enumerate(cases):
+            product = make_product(f'Phone {i}', price=Decimal('1000.5'), **kwargs)
+            Product.objects.filter(pk=product.pk).update(
+                rating=Decimal('4.35'), review_count=i,
+                primary_image_path='products/ü n/photo 1.jpg' if i % 2 else '',
+                primary_image_variants=variants if i % 2 else {},
+            )
+        invalidate_flash_deals()    # update() sends no signals
+        self.request = APIRequestFactory().get('/api/v1/products/')
+
+    def assertSameJSON(self, fast, slow):
+        render = JSONRenderer().render
+        self.assertEqual(render(fast), render(slow))
+
+    def serialized(self, products=None, request=None, **fieldset):
+        products = products if products is not None else Product.objects.select_related('category', 'brand')
+        context = {'request': request} if request else {}
+        return ProductListSerializer(products, many=True, context=context, **fieldset).data
+
+    def rendered(self, request=None, **fieldset):
+        plan = list_plan(**fieldset)
+        return plan.render(list(plan.values(Product.objects.all())), request)
+
+    def test_parity(self):
+        for tz in ('UTC', 'Africa/Nairobi'):
+            with timezone.override(tz):
+                for request in (None, self.request):
+                    self.assertSameJSON(self.rendered(request), self.serialized(request=request))
+
+    def test_fieldsets(self):
+        for fieldset in ({'fields': {'id', 'category_name', 'primary_image_srcset', 'nope'}},
+                         {'omit': {'brand_name', 'flash_deal_end'}},
+                         {'fields': {'name', 'price'}, 'omit': {'price'}}):
+            self.assertSameJSON(self.rendered(self.request, **fieldset), self.serialized(request=self.request, **fieldset))
+
+    def test_endpoints(self):
+        active = Product.objects.filter(is_active=True).select_related('category', 'brand')
+        for url, products in (
+            ('/api/v1/products/', active),
+            ('/api/v1/products/featured/', active.filter(is_featured=True)),
+            ('/api/v1/products/new_arrivals/', active),
+            ('/api/v1/products/flash_deals/', active.filter(is_flash_deal=True).order_by('-created_at')),
+            ('/api/v1/products/?cursor=&ordering=price&omit=sku', active.order_by('price', 'id')),
+        ):
+            response = self.client.get(url)
+            rows = response.data['results'] if isinstance(response.data, dict) else response.data
+            fieldset = {'omit': {'sku'}} if 'omit' in url else {}
+            self.assertSameJSON(rows, self.serialized(products, response.wsgi_request, **fieldset))
+
+    def test_home_payload(self):
+        payload = build_home_payload()
+        featured = Product.objects.filter(is_featured=True).select_related('category', 'brand')
+        self.assertSameJSON(payload['featured'], self.serialized(featured))
+
+
+@override_settings(PRODUCT_PRICE_BUCKETS=[0, 1000, 10000])
+class FacetTests(TestCase):
+    """Facet counts come from three grouped queries and are cached per normalised filter set."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.phones, self.tvs = Category.objects.create(name='Phones'), Category.objects.create(name='TVs')
+        self.samsung, self.tecno = Brand.objects.create(name='Samsung'), Brand.objects.create(name='Tecno')
+        for name, category, brand, price in (
+            ('S24', self.phones, self.samsung, 120000),
+            ('A15', self.phones, self.samsung, 9000),
+            ('Spark', self.phones, self.tecno, 800),
+            ('QLED', self.tvs, self.samsung, 60000),
+            ('Cable', None, None, 500),
+        ):
+            make_product(name, category=category, brand=brand, price=Decimal(price), is_featured=price > 50000)
+
+    def facets(self, query=''):
+        response = self.client.get(f'/api/v1/products/facets/{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_fixed_query_count(self):
+        with self.assertNumQueries(3):
+            self.facets()
+        for i in range(5):
+            make_product(f'More {i}', brand=Brand.objects.create(name=f'Brand {i}'),
+                         category=Category.objects.create(name=f'Category {i}'))
+        cache.clear()
+        with self.assertNumQueries(3):
+            data = self.facets()
+        self.assertEqual(len(data['brands']), 7)
+
+    def test_counts_under_filter(self):
+        data = self.facets(f'?brand={self.samsung.slug}&min_price=5000')
+        self.assertEqual(data['total'], 3)
+        self.assertEqual([(b['slug'], b['count']) for b in data['brands']], [(self.samsung.slug, 3)])
+        self.assertEqual([(c['name'], c['count']) for c in data['categories']], [('Phones', 2), ('TVs', 1)])
+        self.assertEqual([r['count'] for r in data['price_ranges']], [0, 1, 2])
+        self.assertEqual(data['featured'], 2)
+
+        data = self.facets()
+        self.assertEqual(data['total'], 5)
+        self.assertEqual([(b['name'], b['count']) for b in data['brands']], [('Samsung', 3), ('Tecno', 1)])
+        self.assertEqual([r['count'] for r in data['price_ranges']], [2, 1, 2])
+
+    def test_cache_ignores_param_order_and_paging(self):
+        first = self.facets(f'?brand={self.samsung.slug}&max_price=100000')
+        with self.assertNumQueries(0):
+            again = self.facets(f'?page=2&max_price=100000&ordering=price&brand={self.samsung.slug}')
+        self.assertEqual(again, first)
+        with self.assertNumQueries(3):
+            self.facets(f'?brand={self.tecno.slug}&max_price=100000')
+
+
+class CategoryPathTests(TestCase):
+    """?category= covers the whole subtree, and paths follow moves and deletes."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.phones = Category.objects.create(name='Phones')
+        self.android = Category.objects.create(name='Android', parent=self.phones)
+        self.samsung = Category.objects.create(name='Samsung Phones', parent=self.android)
+        self.tvs = Category.objects.create(name='TVs')
+        for category in (self.phones, self.android, self.samsung, self.tvs):
+            make_product(f'In {category.name}', category=category)
+
+    def listed(self, category):
+        response = self.client.get('/api/v1/products/', {'category': category.slug})
+        return sorted(p['name'] for p in response.data['results'])
+
+    def path(self, category):
+        return Category.objects.get(pk=category.pk).path
+
+    def test_filter_includes_descendants(self):
+        self.assertEqual(self.listed(self.phones), ['In Android', 'In Phones', 'In Samsung Phones'])
+        self.assertEqual(self.listed(self.android), ['In Android', 'In Samsung Phones'])
+        self.assertEqual(self.listed(self.tvs), ['In TVs'])
+        self.assertEqual(self.client.get('/api/v1/products/', {'category': 'nope'}).data['count'], 0)
+
+    def test_move_reprefixes_subtree(self):
+        self.assertEqual(self.path(self.samsung), f'/{self.phones.pk}/{self.android.pk}/{self.samsung.pk}/')
+        self.android.parent = self.tvs
+        self.android.save()
+        self.assertEqual(self.path(self.android), f'/{self.tvs.pk}/{self.android.pk}/')
+        self.assertEqual(self.path(self.samsung), f'/{self.tvs.pk}/{self.android.pk}/{self.samsung.pk}/')
+        self.assertEqual(self.listed(self.phones), ['In Phones'])
+        self.assertEqual(self.listed(self.tvs), ['In Android', 'In Samsung Phones', 'In TVs'])
+
+    def test_deleting_parent_reroots_children(self):
+        self.phones.delete()
+        self.assertEqual(self.path(self.android), f'/{self.android.pk}/')
+        self.assertEqual(self.path(self.samsung), f'/{self.android.pk}/{self.samsung.pk}/')
+        self.assertEqual(self.path(self.tvs), f'/{self.tvs.pk}/')
+        self.assertEqual(self.listed(self.android), ['In Android', 'In Samsung Phones'])
+
+
+class CategoryTreeTests(TestCase):
+    """The category menu comes from a cached tree with counts rolled up over each subtree."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.phones = Category.objects.create(name='Phones')
+        self.android = Category.objects.create(name='Android', parent=self.phones)
+        self.samsung = Category.objects.create(name='Samsung Phones', parent=self.android)
+        self.tvs = Category.objects.create(name='TVs')
+        self.phone = make_product('Phone', category=self.phones)
+        self.galaxy = make_product('Galaxy', category=self.samsung)
+        make_product('Pixel', category=self.android)
+        make_product('Hidden', category=self.samsung, is_active=False)
+
+    def menu(self):
+        response = self.client.get('/api/v1/categories/')
+        self.assertEqual(response.status_code, 200)
+        roots = response.data['results'] if isinstance(response.data, dict) else response.data
+        return {root['name']: root['product_count'] for root in roots}
+
+    def counts(self):
+        counts = get_category_tree()['counts']
+        return [counts.get(c.pk, 0) for c in (self.phones, self.android, self.samsung, self.tvs)]
+
+    def test_counts_roll_up(self):
+        self.assertEqual(self.counts(), [3, 2, 1, 0])
+        self.assertEqual(self.menu(), {'Phones': 3, 'TVs': 0})
+        response = self.client.get(f'/api/v1/categories/{self.phones.slug}/')
+        self.assertEqual(response.data['product_count'], 3)
+
+    def test_warm_tree_runs_no_queries(self):
+        self.menu()
+        invalidate_tags('category')     # retire the response cache; the tree stays warm
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.menu(), {'Phones': 3, 'TVs': 0})
+        self.assertEqual(len(ctx), 0)
+
+    def test_product_writes_invalidate(self):
+        self.menu()
+        self.galaxy.category = self.tvs
+        self.galaxy.save()
+        self.assertEqual(self.menu(), {'Phones': 2, 'TVs': 1})
+        self.phone.is_active = False
+        self.phone.save()
+        self.assertEqual(self.menu(), {'Phones': 1, 'TVs': 1})
+        self.galaxy.delete()
+        self.assertEqual(self.menu(), {'Phones': 1, 'TVs': 0})
+
+    def test_category_writes_invalidate(self):
+        self.menu()
+        self.tvs.name = 'Televisions'
+        self.tvs.save()
+        self.assertEqual(self.menu(), {'Phones': 3, 'Televisions': 0})
+        self.android.parent = self.tvs
+        self.android.save()
+        self.assertEqual(self.menu(), {'Phones': 1, 'Televisions': 2})
+        self.tvs.delete()
+        self.assertEqual(self.menu(), {'Phones': 1, 'Android': 2})
+
+
+class ProductSearchTests(TestCase):
+    """?search= is answered from the full-text index, ranked, and combined with the filters."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.phones = Category.objects.create(name='Phones')
+        self.samsung = Brand.objects.create(name='Samsung')
+
+    def search(self, query, **params):
+        response = self.client.get('/api/v1/products/', {'search': query, 'page_size': 100, **params})
+        self.assertEqual(response.status_code, 200)
+        return [p['name'] for p in response.data['results']]
+
+    def test_ranking(self):
+        make_product('Charger', description='Works with any galaxy phone')
+        make_product('Galaxy S24', category=self.phones)
+        make_product('Galaxy Buds', brand=self.samsung)
+        # Name matches outrank description matches; all terms must match
+        self.assertEqual(self.search('galaxy')[-1], 'Charger')
+        self.assertEqual(self.search('galaxy samsung'), ['Galaxy Buds'])
+        self.assertEqual(self.search('galaxy phones'), ['Galaxy S24'])
+
+    def test_prefix(self):
+        make_product('Refrigerator', brand=self.samsung)
+        self.assertEqual(self.search('refri'), ['Refrigerator'])
+        self.assertEqual(self.search('sams'), ['Refrigerator'])
+        self.assertEqual(self.search('fridge'), [])
+
+    def test_signals_reindex(self):
+        product = make_product('Kettle', brand=self.samsung, description='Kitchen appliance')
+        product.name = 'Toaster'
+        product.save()
+        self.assertEqual(self.search('kettle'), [])
+        self.assertEqual(self.search('toaster'), ['Toaster'])
+        self.samsung.name = 'Hisense'
+        self.samsung.save()
+        self.assertEqual(self.search('samsung'), [])
+        self.assertEqual(self.search('hisense'), ['Toaster'])
+        product.delete()
+        self.assertEqual(self.search('toaster'), [])
+
+    @override_settings(SEARCH_MAX_RESULTS=3)
+    def test_filters_apply_before_the_result_cap(self):
+        tvs = Category.objects.create(name='TVs')
+        for i in range(5):
+            make_product(f'Phone {i}', category=self.phones, price=Decimal('100'))
+        make_product('Phone cover TV', category=tvs, price=Decimal('100'))
+        make_product('Phone stand TV', category=tvs, price=Decimal('900'))
+        make_product('Phone hidden TV', category=tvs, is_active=False)
+        self.assertEqual(sorted(self.search('phone', category=tvs.slug)), ['Phone cover TV', 'Phone stand TV'])
+        self.assertEqual(self.search('phone', category=tvs.slug, min_price=500), ['Phone stand TV'])
+        response = self.client.get('/api/v1/products/', {'search': 'phone', 'category': tvs.slug})
+        self.assertEqual(response.data['count'], 2)
+
+
+class SuggestTests(TestCase):
+    """Autocomplete: typo tolerant, prefix ranked, patched by the signals, rebuilt off the request path."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.phones = Category.objects.create(name='Phones')
+        Brand.objects.create(name='Samsung')
+        make_product('Samsung Galaxy S24', views=50)
+        make_product('Galaxy Tab', views=10)
+        make_product('Tablet Stand with Galaxy print', views=500)
+        rebuild_index()     # the index is per process; start from this test's catalog
+
+    def suggest(self, q):
+        response = self.client.get('/api/v1/products/suggest/', {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return [s['text'] for s in response.data]
+
+    def test_typos(self):
+        self.assertEqual(self.suggest('samsng')[:2], ['Samsung', 'Samsung Galaxy S24'])
+        self.assertIn('Samsung Galaxy S24', self.suggest('galaxi s24'))
+
+    def test_prefix_ranking(self):
+        # Leading-word matches first, then by views; the last word is a prefix
+        self.assertEqual(self.suggest('gal'), ['Galaxy Tab', 'Tablet Stand with Galaxy print', 'Samsung Galaxy S24'])
+        self.assertEqual(self.suggest('pho'), ['Phones'])
+
+    def test_signals_patch_the_index(self):
+        product = make_product('Galaxy Watch')
+        self.assertIn('Galaxy Watch', self.suggest('galaxy wat'))
+        product.name = 'Pixel Watch'
+        product.save()
+        self.assertEqual(self.suggest('galaxy wat'), [])
+        self.assertEqual(self.suggest('pixel'), ['Pixel Watch'])
+        product.is_active = False
+        product.save()
+        self.assertEqual(self.suggest('pixel'), [])
+        self.phones.delete()
+        self.assertEqual(self.suggest('pho'), [])
+
+    def test_stale_index_is_served_while_rebuilding(self):
+        index = get_suggest_index()
+        with override_settings(SUGGEST_MAX_AGE=-1), mock.patch('ecommerce.suggest.start_rebuild') as start:
+            self.assertIs(get_suggest_index(), index)
+        start.assert_called_once()
+
+    def test_eviction_drops_least_viewed(self):
+        index = SuggestIndex(memory_budget=0)
+        index.build()
+        self.assertEqual(len(index), 2)     # category and brand always fit
+        index.memory_budget = 10 ** 6
+        for views, name in ((5, 'Five'), (1, 'One'), (9, 'Nine'), (3, 'Three')):
+            index.upsert('product', name, name, name.lower(), views)
+        index.upsert('product', 'One', 'One', 'one', 7)     # now more viewed than Three and Five
+        index.memory_budget = index._size - 1
+        index.upsert('product', 'Two', 'Two', 'two', 2)
+        self.assertEqual(index.suggest('two', 5), [])
+        self.assertEqual(index.suggest('three', 5), [])
+        self.assertEqual(len(index.suggest('five', 5)), 1)
+        self.assertEqual(len(index.suggest('one', 5)), 1)     # its old weight was skipped as stale
+
+
+@override_settings(MEDIA_URL='/media/', IMAGE_VARIANT_WIDTHS=[160, 320, 640])
+class ImageVariantTests(TestCase):
+    """Uploads get one WebP per width bucket; serializers expose them as srcset maps."""
+
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.enterContext(override_settings(MEDIA_ROOT=self.root))
+        self.product = make_product('Pictured')
+
+    def upload(self, size=(500, 250), color='red'):
+        out = io.BytesIO()
+        Image.new('RGB', size, color).save(out, 'PNG')
+        image = ProductImage(product=self.product, is_primary=True)
+        image.image.save('photo.png', ContentFile(out.getvalue()), save=True)
+        return ProductImage.objects.get(pk=image.pk)
+
+    def test_width_buckets(self):
+        image = self.upload()
+        sizes = image.image_variants['sizes']
+        self.assertEqual(image.image_variants['source'], image.image.name)
+        # Buckets narrower than the original, plus the original width (under the largest bucket)
+        self.assertEqual(sorted(sizes, key=int), ['160', '320', '500'])
+        for width, size in sizes.items():
+            with Image.open(self.root / size['name']) as variant:
+                self.assertEqual(variant.format, 'WEBP')
+                self.assertEqual(variant.size, (int(width), round(250 * int(width) / 500)))
+                self.assertEqual(variant.size, (size['width'], size['height']))
+
+    def test_srcset(self):
+        image = self.upload()
+        request = APIRequestFactory().get('/')
+        srcset = ProductImageSerializer(image, context={'request': request}).data['srcset']
+        self.assertEqual(list(srcset), ['160w', '320w', '500w'])
+        self.assertEqual(srcset['160w'], f"http://testserver/media/{image.image_variants['sizes']['160']['name']}")
+        product = Product.objects.get(pk=self.product.pk)
+        data = ProductListSerializer(product, context={'request': request}).data
+        self.assertEqual(data['primary_image_srcset'], srcset)
+
+    def test_command_rebuilds_missing_and_stale_records(self):
+        missing, stale = self.upload(), self.upload((200, 100), 'blue')
+        current = self.upload((100, 100), 'green')
+        ProductImage.objects.filter(pk=missing.pk).update(image_variants={})
+        ProductImage.objects.filter(pk=stale.pk).update(image_variants={'source': 'products/replaced.png', 'sizes': {}})
+        out = StringIO()
+        call_command('generate_image_variants', '--model', 'productimage', '--workers', '1', stdout=out)
+        self.assertIn('generated variants for 2 images', out.getvalue())
+        for image, widths in ((missing, ['160', '320', '500']), (stale, ['160', '200']), (current, ['100'])):
+            image.refresh_from_db()
+            self.assertEqual(image.image_variants['source'], image.image.name)
+            self.assertEqual(sorted(image.image_variants['sizes'], key=int), widths)
+            for size in image.image_variants['sizes'].values():
+                self.assertTrue((self.root / size['name']).exists())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), IMAGE_VARIANT_WIDTHS=(16,))
+class UploadImagesTests(TestCase):
+    """Bulk uploads are named by the worker's digest; the parent never hashes a file again."""
+
+    def test_worker_digest_names_the_file(self):
+        path = f'{tempfile.mkdtemp()}/photo.JPG'
+        Image.new('RGB', (40, 30), 'red').save(path, 'JPEG')
+        with open(path, 'rb') as fh:
+            digest = hashlib.sha256(fh.read()).hexdigest()
+        field = ProductImage._meta.get_field('image')
+        with mock.patch('ecommerce.storage.content_digest') as rehash:
+            uploads = list(upload_images([('a', path), ('b', path)], field, workers=1))
+        rehash.assert_not_called()
+        names = {name for _key, name, _record, _error in uploads}
+        self.assertEqual(names, {f'products/{digest[:2]}/{digest[2:4]}/{digest}.jpg'})
+        self.assertTrue(field.storage.exists(names.pop()))
+
+
+class ContentAddressedStorageTests(TestCase):
+    """Catalog files live under their digest; dedupe_media moves legacy files there and reclaims the rest."""
+
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.enterContext(override_settings(MEDIA_ROOT=self.root))
+        self.storage = get_content_storage()
+        self.product = make_product('Pictured')
+
+    def legacy(self, name, data, age=3600):
+        """A file written before addressing, ``age`` seconds old."""
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        os.utime(path, (path.stat().st_atime - age, path.stat().st_mtime - age))
+        return name
+
+    def files(self):
+        return sorted(str(p.relative_to(self.root)) for p in self.root.rglob('*') if p.is_file())
+
+    def dedupe(self, *args):
+        call_command('dedupe_media', *args, stdout=StringIO())
+
+    def test_identical_uploads_stored_once(self):
+        digest = hashlib.sha256(b'same bytes').hexdigest()
+        first = self.storage.save('products/a.JPG', ContentFile(b'same bytes'))
+        second = self.storage.save('products/b.jpg', ContentFile(b'same bytes'))
+        self.assertEqual(first, f'products/{digest[:2]}/{digest[2:4]}/{digest}.jpg')
+        self.assertEqual(second, first)
+        self.assertEqual(self.files(), [first])
+
+    def test_serve_media_marks_addressed_files_immutable(self):
+        addressed = self.storage.save('products/a.jpg', ContentFile(b'bytes'))
+        plain = self.legacy('products/plain.jpg', b'bytes')
+        request = APIRequestFactory().get('/media/')
+        response = serve_media(request, addressed, document_root=self.root)
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        self.assertNotIn('Cache-Control', serve_media(request, plain, document_root=self.root))
+
+    def test_dedupe_rewrites_rows(self):
+        one = add_image(self.product, 'one.jpg')
+        copy = add_image(self.product, 'one_c4NlbXh.jpg')
+        self.legacy('products/one.jpg', b'shared')
+        self.legacy('products/one_c4NlbXh.jpg', b'shared')
+        self.dedupe()
+        digest = hashlib.sha256(b'shared').hexdigest()
+        addressed = f'products/{digest[:2]}/{digest[2:4]}/{digest}.jpg'
+        for image in (one, copy):
+            image.refresh_from_db()
+            self.assertEqual(image.image.name, addressed)
+        self.assertEqual(self.files(), [addressed])     # both legacy copies reclaimed
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.primary_image_path, addressed)
+
+    def test_dry_run_touches_nothing(self):
+        image = add_image(self.product, 'one.jpg')
+        self.legacy('products/one.jpg', b'shared')
+        self.legacy('products/orphan.jpg', b'orphan')
+        self.dedupe('--dry-run')
+        image.refresh_from_db()
+        self.assertEqual(image.image.name, 'products/one.jpg')
+        self.assertEqual(self.files(), ['products/one.jpg', 'products/orphan.jpg'])
+
+    def test_reclaim_keeps_referenced_and_recent_files(self):
+        kept = self.storage.save('products/kept.jpg', ContentFile(b'kept'))
+        add_image(self.product, kept.removeprefix('products/'))
+        os.utime(self.root / kept, (0, 0))
+        self.legacy('products/orphan.jpg', b'orphan')
+        self.legacy('banners/orphan.jpg', b'old banner')
+        self.legacy('products/just-uploaded.jpg', b'new', age=-3600)    # lands during the run
+        self.dedupe()
+        self.assertEqual(self.files(), sorted([kept, 'products/just-uploaded.jpg']))
+
+
+class SlugAllocationTests(TestCase):
+    """Slugs take the next free numeric suffix, in one index-range query per batch."""
+
+    def test_next_suffix(self):
+        self.assertEqual(make_product('Smart Phone').slug, 'smart-phone')
+        self.assertEqual(make_product('Smart Phone').slug, 'smart-phone-1')
+        make_product('Other', slug='smart-phone-7')
+        make_product('Other', slug='smart-phone-4k')
+        make_product('Other', slug='smart-phone-case')
+        self.assertEqual(make_product('Smart  phone!').slug, 'smart-phone-8')
+
+    def test_duplicates_in_one_batch(self):
+        make_product('TV')
+        make_product('Other', slug='radio-2')
+        with CaptureQueriesContext(connection) as ctx:
+            slugs = allocate_slugs(Product.objects.all(), ['tv', 'radio', 'tv', 'lamp', 'radio', 'tv'])
+        self.assertEqual(len(ctx), 1)
+        self.assertEqual(slugs, ['tv-1', 'radio', 'tv-2', 'lamp', 'radio-3', 'tv-3'])
+
+    def test_save_retries_when_slug_is_taken(self):
+        make_product('Lamp')
+        # A concurrent insert took "lamp" between allocation and INSERT
+        with mock.patch('ecommerce.models.allocate_slugs', side_effect=[['lamp'], ['lamp-1']]) as allocate:
+            product = make_product('Lamp')
+        self.assertEqual(allocate.call_count, 2)
+        self.assertEqual(product.slug, 'lamp-1')
+        self.assertEqual(Product.objects.filter(name='Lamp').count(), 2)
+
+
+class ReviewAggregateTests(TestCase):
+    """The rating columns kept by the Review signals always equal a fresh aggregate."""
+
+    def setUp(self):
+        self.product, self.other = make_product('Rated'), make_product('Other')
+        self.users = [
+            User.objects.create_user(email=f'u{i}@example.com', username=f'u{i}', password='x' * 10)
+            for i in range(4)
+        ]
+
+    def review(self, user, rating, product=None):
+        return Review.objects.create(product=product or self.product, user=user, rating=rating, comment='ok')
+
+    def assertAggregates(self):
+        for product in Product.objects.filter(pk__in=[self.product.pk, self.other.pk]):
+            reviews = Review.objects.filter(product=product)
+            fresh = reviews.aggregate(avg=Avg('rating'), count=Count('id'))
+            self.assertEqual(product.review_count, fresh['count'])
+            self.assertEqual(product.rating, round(Decimal(fresh['avg'] or 0), 2))
+            for stars in range(1, 6):
+                self.assertEqual(getattr(product, f'stars_{stars}'), reviews.filter(rating=stars).count())
+
+    def test_create(self):
+        for user, rating in zip(self.users, (5, 4, 4, 1)):
+            self.review(user, rating)
+            self.assertAggregates()
+        self.assertEqual(Product.objects.get(pk=self.product.pk).rating, Decimal('3.50'))
+
+    def test_edit(self):
+        reviews = [self.review(user, rating) for user, rating in zip(self.users, (5, 2, 3))]
+        reviews[0].rating = 1
+        reviews[0].save()
+        self.assertAggregates()
+        reviews[1].comment = 'changed my mind'
+        reviews[1].save()
+        self.assertAggregates()
+        reviews[2].product = self.other
+        reviews[2].rating = 4
+        reviews[2].save()
+        self.assertAggregates()
+
+    def test_delete(self):
+        reviews = [self.review(user, rating) for user, rating in zip(self.users, (5, 3, 3, 2))]
+        reviews[1].delete()
+        self.assertAggregates()
+        for review in reviews[::2] + reviews[3:]:
+            review.delete()
+            self.assertAggregates()
+        self.assertEqual(Product.objects.get(pk=self.product.pk).rating, 0)
+
+    def test_api(self):
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        response = client.post(f'/api/v1/products/{self.product.slug}/reviews/', {'rating': 4, 'comment': 'Nice'})
+        self.assertEqual(response.status_code, 201)
+        self.assertAggregates()
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages cover the catalog exactly once in both directions, ties included."""
+
+    def setUp(self):
+        self.client = APIClient()
+        for i in range(7):
+            make_product(f'Tied {i}', price=Decimal('500') if i % 3 else Decimal('250'))
+
+    def walk(self, url):
+        """Ids from ``url`` to the last page, then back to the first via ``previous``."""
+        forward, pages = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([p['id'] for p in response.data['results']])
+            forward += pages[-1]
+            url = response.data['next']
+        backward = pages[-1]
+        url = response.data['previous']
+        while url:
+            response = self.client.get(url)
+            backward = [p['id'] for p in response.data['results']] + backward
+            url = response.data['previous']
+        return forward, backward
+
+    def test_walk_with_ties(self):
+        for ordering in ('price', '-price'):
+            forward, backward = self.walk(f'/api/v1/products/?cursor=&page_size=2&ordering={ordering}')
+            expected = [str(pk) for pk in Product.objects.order_by(ordering, ordering.replace('price', 'id'))
+                        .values_list('id', flat=True)]
+            self.assertEqual(forward, expected)
+            self.assertEqual(backward, expected)
+
+    def test_search_rank_is_not_keyed(self):
+        # Relevance order is an annotation: no cursor can seek from it
+        response = self.client.get('/api/v1/products/', {'search': 'tied', 'cursor': '', 'page_size': 2})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.data)
+        self.assertEqual(self.client.get('/api/v1/products/', {'search': 'tied'}).data['count'], 7)
+        forward, backward = self.walk('/api/v1/products/?search=tied&cursor=&page_size=2&ordering=price')
+        self.assertEqual(len(set(forward)), 7)
+        self.assertEqual(backward, forward)
+
+    def test_tampered_cursor(self):
+        pk = str(Product.objects.first().pk)
+        cursors = [
+            'not base64!',
+            urlsafe_b64encode(b'[1, 2]').decode(),
+            *(urlsafe_b64encode(json.dumps(raw).encode()).decode() for raw in (
+                {'v': 'abc', 'i': 'xyz'},
+                {'v': None, 'i': pk},
+                {'v': '2024-01-01T00:00:00+00:00', 'i': 'xyz'},
+                {'v': '2024-01-01T00:00:00+00:00', 'i': None},
+                {'v': '2024-01-01T00:00:00+00:00'},
+            )),
+        ]
+        for cursor in cursors:
+            response = self.client.get('/api/v1/products/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+        views = urlsafe_b64encode(json.dumps({'v': 10 ** 30, 'i': pk}).encode()).decode()
+        response = self.client.get('/api/v1/products/', {'cursor': views, 'ordering': 'views'})
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalGetTests(TestCase):
+    """Product detail and lists answer a matching If-None-Match with 304, and change their ETag on writes."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.brand = Brand.objects.create(name='Samsung')
+        self.product = make_product('Galaxy', brand=self.brand)
+        make_product('Pixel')
+
+    def get(self, url, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, **headers)
+        return response, len(ctx)
+
+    def assertRevalidates(self, url, change):
+        response, _ = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response, queries = self.get(url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.get(url, f'W/{etag}')[0].status_code, 304)
+        change()
+        response, _ = self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return queries
+
+    def test_detail(self):
+        url = f'/api/v1/products/{self.product.slug}/'
+
+        def edit():
+            self.product.price = Decimal('900')
+            self.product.save()
+        queries = self.assertRevalidates(url, edit)
+        self.assertEqual(queries, 2)        # validator, views
+
+    def test_detail_changes_with_related_rows(self):
+        url = f'/api/v1/products/{self.product.slug}/'
+        user = User.objects.create_user(email='r@example.com', username='r', password='x' * 10)
+        self.assertRevalidates(url, lambda: Review.objects.create(product=self.product, user=user, rating=5))
+        self.assertRevalidates(url, lambda: Review.objects.filter(product=self.product).delete())
+        self.assertRevalidates(url, lambda: Brand.objects.filter(pk=self.brand.pk).first().save())
+
+    def test_detail_varies_with_fieldset(self):
+        url = f'/api/v1/products/{self.product.slug}/'
+        full = self.get(url)[0]['ETag']
+        sparse = self.get(f'{url}?fields=id,name')[0]['ETag']
+        self.assertNotEqual(sparse, full)
+        self.assertNotEqual(self.get(f'{url}?omit=id,name')[0]['ETag'], sparse)
+        # The same selection in another order or spelling revalidates
+        self.assertEqual(self.get(f'{url}?fields=name, id,', sparse)[0].status_code, 304)
+        self.assertEqual(self.get(url, sparse)[0].status_code, 200)
+
+    def test_list(self):
+        def edit():
+            self.product.name = 'Galaxy S24'
+            self.product.save()
+        queries = self.assertRevalidates('/api/v1/products/', edit)
+        self.assertEqual(queries, 2)        # count, page
+        self.assertRevalidates('/api/v1/products/?cursor=', lambda: make_product('Tecno'))
+        self.assertRevalidates('/api/v1/products/featured/', lambda: make_product('Nokia', is_featured=True))
+
+
+class FlashDealExpiryTests(TestCase):
+    """Running deals come from memory; ended ones drop out on time and are switched off in bulk."""
+
+    def setUp(self):
+        invalidate_flash_deals()
+        self.now = timezone.now()
+        self.soon = make_product('Soon', is_flash_deal=True, flash_deal_end=self.now + timedelta(hours=1))
+        self.later = make_product('Later', is_flash_deal=True, flash_deal_end=self.now + timedelta(hours=2))
+
+    def deals(self, at=None):
+        with mock.patch('ecommerce.flash_deals.timezone.now', return_value=at or self.now):
+            rows, expires_at = active_flash_deals()
+        return sorted(row.name for row in rows), expires_at
+
+    def test_expired_deal_drops_out(self):
+        self.assertEqual(self.deals(), (['Later', 'Soon'], self.soon.flash_deal_end))
+        with CaptureQueriesContext(connection) as ctx:
+            self.deals(self.now + timedelta(minutes=59))
+        self.assertEqual(len(ctx), 0)               # still the snapshot
+        names, expires_at = self.deals(self.now + timedelta(minutes=61))
+        self.assertEqual(names, ['Later'])
+        self.assertEqual(expires_at, self.later.flash_deal_end)
+        self.assertEqual(self.deals(self.now + timedelta(hours=3)), ([], None))
+        self.assertIsNone(flash_deal_scheduler._thread)   # never started outside wsgi/asgi
+
+    def test_write_reloads_snapshot(self):
+        self.deals()
+        self.later.is_flash_deal = False
+        self.later.save()
+        self.assertEqual(self.deals()[0], ['Soon'])
+
+    def test_expire_flash_deals(self):
+        self.assertEqual(expire_flash_deals(self.now), 0)
+        self.deals()
+        self.assertEqual(expire_flash_deals(self.now + timedelta(minutes=90)), 1)
+        self.assertEqual(
+            list(Product.objects.filter(is_flash_deal=True).values_list('name', flat=True)), ['Later'],
+        )
+        # The bulk UPDATE sends no signals; the snapshot is retired regardless
+        self.assertEqual(self.deals()[0], ['Later'])
+        with mock.patch('ecommerce.flash_deals.timezone.now', return_value=self.now + timedelta(minutes=90)):
+            self.assertAlmostEqual(flash_deal_scheduler.tick(), 30 * 60, delta=1)
+
+
+class HomePayloadTests(TestCase):
+    """The cached homepage follows brand and review writes and drops a flash deal the moment it ends."""
+
+    def setUp(self):
+        cache.clear()
+        invalidate_flash_deals()
+        self.now = timezone.now()
+        self.brand = Brand.objects.create(name='Samsung')
+        self.product = make_product('Galaxy S24', brand=self.brand, is_featured=True)
+        self.user = User.objects.create_user(email='buyer@example.com', username='buyer', password='x' * 10)
+
+    def payload(self, at=None):
+        at = at or self.now
+        with mock.patch('ecommerce.home.timezone.now', return_value=at), \
+                mock.patch('ecommerce.flash_deals.timezone.now', return_value=at):
+            return get_home_payload()
+
+    def test_writes_invalidate(self):
+        self.assertEqual(self.payload()['featured'][0]['brand_name'], 'Samsung')
+        self.brand.name = 'Samsung Electronics'
+        self.brand.save()
+        self.assertEqual(self.payload()['featured'][0]['brand_name'], 'Samsung Electronics')
+
+        review = Review.objects.create(product=self.product, user=self.user, rating=4, comment='Good')
+        self.assertEqual(self.payload()['featured'][0]['review_count'], 1)
+        review.rating = 2
+        review.save()
+        self.assertEqual(Decimal(self.payload()['featured'][0]['rating']), 2)
+        review.delete()
+        self.assertEqual(self.payload()['featured'][0]['review_count'], 0)
+
+    def test_ended_flash_deal_drops_out(self):
+        end = self.now + timedelta(hours=1)
+        make_product('Deal', is_flash_deal=True, flash_deal_end=end)
+        payload = self.payload()
+        self.assertEqual([row['name'] for row in payload['flash_deals']], ['Deal'])
+        self.assertEqual(payload['expires_at'], end)
+        self.assertEqual(len(self.payload(end - timedelta(seconds=1))['flash_deals']), 1)
+        payload = self.payload(end + timedelta(seconds=1))
+        self.assertEqual(payload['flash_deals'], [])
+        self.assertIsNone(payload['expires_at'])
+
+
+class ImportProductsTests(TestCase):
+    """import_products: --dry-run writes nothing; --resume picks up after the last committed chunk."""
+
+    ROWS = [
+        'name,sku,price,category,brand,stock',
+        'Galaxy S24,SKU-1,120000,Phones,Samsung,5',
+        'Galaxy A15,SKU-2,25000,Phones,Samsung,9',
+        'Smart TV,SKU-3,60000,TVs,Hisense,2',
+        'Soundbar,,15000,TVs,Hisense,4',
+        'No price,SKU-5,,TVs,Hisense,1',
+        'Fridge,SKU-6,80000,Appliances,Hisense,3',
+    ]
+
+    def setUp(self):
+        self.path = Path(tempfile.mkdtemp()) / 'catalog.csv'
+        self.path.write_text('\n'.join(self.ROWS) + '\n')
+
+    def run_import(self, *args):
+        out = StringIO()
+        call_command('import_products', str(self.path), '--create-missing', '--chunk-size', '2', *args,
+                     stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_dry_run_writes_nothing(self):
+        out = self.run_import('--dry-run')
+        self.assertIn('Would import 6 rows: 5 created, 0 updated, 1 rejected', out)
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Category.objects.exists() or Brand.objects.exists())
+        self.assertFalse(self.path.with_name('catalog.csv.checkpoint.json').exists())
+
+    def test_resume_skips_imported_rows(self):
+        backend = mock.Mock()
+        # The second chunk fails part-way: rolled back, the first stays committed
+        with mock.patch('ecommerce.management.commands.import_products.get_search_backend',
+                        side_effect=[backend, RuntimeError('killed')]), self.assertRaises(RuntimeError):
+            self.run_import()
+        self.assertEqual(sorted(Product.objects.values_list('sku', flat=True)), ['SKU-1', 'SKU-2'])
+        Product.objects.filter(sku='SKU-1').update(stock=0)     # a resumed import must not touch it again
+
+        out = self.run_import('--resume')
+        self.assertIn('Resuming after row 2', out)
+        self.assertIn('Imported 6 rows: 5 created, 0 updated, 1 rejected', out)
+        self.assertEqual(Product.objects.count(), 5)
+        self.assertEqual(Product.objects.get(sku='SKU-1').stock, 0)
+        self.assertEqual(Product.objects.filter(name='Soundbar').count(), 1)
+        self.assertFalse(self.path.with_name('catalog.csv.checkpoint.json').exists())
+        self.assertEqual(Category.objects.filter(name='TVs').count(), 1)
+
+
+@override_settings(MEDIA_URL='/media/', FRONTEND_URL='https://shop.example.com', PRODUCT_FEED_TOKEN='')
+class ProductFeedTests(TestCase):
+    """The partner feed streams every active product once, as CSV or NDJSON, optionally gzipped."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Phones')
+        self.brand = Brand.objects.create(name='Samsung')
+        self.products = [
+            make_product(f'Phone {i}', sku=f'SKU-{i}', stock=i, category=self.category, brand=self.brand)
+            for i in range(5)
+        ]
+        self.products.sort(key=lambda p: p.pk)      # the feed's keyset order
+        make_product('Retired', sku='SKU-OLD', is_active=False)
+        add_image(self.products[0], 'phone.jpg', is_primary=True)
+        self.staff = User.objects.create_user(email='staff@example.com', username='staff',
+                                              password='x' * 10, is_staff=True)
+
+    def fetch(self, fmt, **params):
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(f'/api/v1/feeds/products.{fmt}', params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_keyset_batches_cover_every_row_once(self):
+        expected = [str(p.pk) for p in self.products]
+        # 5 rows in batches of 2: two full batches and a short one ends the scan
+        with self.assertNumQueries(3):
+            self.assertEqual([row['id'] for row in iter_feed_rows(chunk_size=2)], expected)
+        # An exact multiple needs one empty batch to find the end
+        with self.assertNumQueries(2):
+            self.assertEqual(len(list(iter_feed_rows(chunk_size=5))), 5)
+        rows = list(iter_feed_rows(chunk_size=4, include_inactive=True))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(len({row['id'] for row in rows}), 6)
+
+    def test_csv(self):
+        response, body = self.fetch('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="products.csv"')
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+        self.assertEqual([row['sku'] for row in rows], [p.sku for p in self.products])
+        first = rows[0]
+        self.assertEqual(first['link'], f'https://shop.example.com/product/{self.products[0].slug}')
+        self.assertEqual(first['category'], 'Phones')
+        self.assertEqual(first['brand'], 'Samsung')
+        self.assertEqual(first['image'], 'http://testserver/media/products/phone.jpg')
+        self.assertEqual(rows[1]['image'], '')
+        availability = {row['sku']: row['availability'] for row in rows}
+        self.assertEqual(availability['SKU-0'], 'out of stock')
+        self.assertEqual(availability['SKU-1'], 'in stock')
+
+    def test_ndjson_gzip(self):
+        response, body = self.fetch('ndjson', gzip='1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="products.ndjson.gz"')
+        rows = [json.loads(line) for line in gzip.decompress(body).decode().splitlines()]
+        self.assertEqual([row['sku'] for row in rows], [p.sku for p in self.products])
+        self.assertEqual(rows[2]['price'], '1000.00')
+        self.assertEqual(rows[2]['stock'], self.products[2].stock)
+
+    def test_anonymous_rejected(self):
+        response = self.client.get('/api/v1/feeds/products.csv')
+        self.assertEqual(response.status_code, 401)
+        with override_settings(PRODUCT_FEED_TOKEN='partner-secret'):
+            self.assertEqual(self.client.get('/api/v1/feeds/products.csv', {'token': 'guess'}).status_code, 401)
+            response = self.client.get('/api/v1/feeds/products.csv', {'token': 'partner-secret'})
+            self.assertEqual(response.status_code, 200)
+        self.client.force_authenticate(User.objects.create_user(
+            email='buyer@example.com', username='buyer', password='x' * 10))
+        self.assertEqual(self.client.get('/api/v1/feeds/products.csv').status_code, 403)
+
+    def test_export_command(self):
+        path = Path(tempfile.mkdtemp()) / 'products.ndjson.gz'
+        call_command('export_products', '--format', 'ndjson', '--gzip', '--chunk-size', '2',
+                     '--include-inactive', '--output', str(path), stderr=StringIO())
+        rows = [json.loads(line) for line in gzip.decompress(path.read_bytes()).decode().splitlines()]
+        by_sku = {row['sku']: row for row in rows}
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(len(by_sku), 6)
+        self.assertFalse(by_sku['SKU-OLD']['is_active'])
+        self.assertEqual(by_sku[self.products[0].sku]['image'], '/media/products/phone.jpg')
+
+
+class ResponseCacheTests(TestCase):
+    """Tagged viewset responses are served from cache until a write bumps their tag."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.brand = Brand.objects.create(name='Samsung')
+        self.category = Category.objects.create(name='Phones')
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx), response.content.decode()
+
+    def test_write_clears_cached_response(self):
+        self.get('/api/v1/brands/')
+        queries, body = self.get('/api/v1/brands/')
+        self.assertEqual(queries, 0)
+        self.assertIn('Samsung', body)
+        self.brand.name = 'Hisense'
+        self.brand.save()
+        queries, body = self.get('/api/v1/brands/')
+        self.assertGreater(queries, 0)
+        self.assertIn('Hisense', body)
+        Brand.objects.create(name='Tecno')
+        self.assertIn('Tecno', self.get('/api/v1/brands/')[1])
+        self.brand.delete()
+        self.assertNotIn('Hisense', self.get('/api/v1/brands/')[1])
+
+    def test_related_tag(self):
+        url = f'/api/v1/categories/{self.category.slug}/'
+        self.assertIn('"product_count":0', self.get(url)[1])
+        self.assertEqual(self.get(url)[0], 0)
+        make_product('Phone', category=self.category)   # categories are tagged with product too
+        self.assertIn('"product_count":1', self.get(url)[1])
+
+    def test_bump_version(self):
+        version = get_version('things')
+        bump_version('things')
+        self.assertGreater(get_version('things'), version)
+        cache.delete('version:things')                  # evicted: restarts from the clock
+        with mock.patch('ecommerce.caching.time.time', return_value=version / 1000 + 60):
+            bump_version('things')
+        self.assertGreater(get_version('things'), version + 1)
+
+
+class ReviewPaginationTests(TestCase):
+    """Reviews are paged with users joined in; query counts ignore review volume."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.product = make_product('Reviewed')
+
+    def add_reviews(self, count):
+        start = Review.objects.count()
+        for i in range(start, start + count):
+            user = User.objects.create_user(email=f'r{i}@example.com', username=f'r{i}', password='x' * 10)
+            Review.objects.create(product=self.product, user=user, rating=i % 5 + 1, comment='ok')
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx), response
+
+    def test_detail_embeds_first_page(self):
+        for size in (3, 30):
+            self.add_reviews(size)
+            queries, response = self.get(f'/api/v1/products/{self.product.slug}/')
+            self.assertEqual(queries, 6)    # validator, views, product, images, variants, reviews
+        self.assertEqual(len(response.data['reviews']), 10)
+        self.assertEqual(response.data['review_count'], 33)
+        self.assertIsNotNone(response.data['reviews_next'])
+
+    def test_detail_sparse_fieldset(self):
+        self.add_reviews(3)
+        url = f'/api/v1/products/{self.product.slug}/?omit=images,variants,reviews,reviews_next'
+        queries, response = self.get(url)
+        self.assertEqual(queries, 3)        # validator, views, product
+        self.assertNotIn('reviews', response.data)
+        self.assertEqual(sum(response.data['rating_histogram'].values()), 3)
+
+    def test_cursor_walk(self):
+        self.add_reviews(25)
+        _, response = self.get(f'/api/v1/products/{self.product.slug}/')
+        seen = [r['id'] for r in response.data['reviews']]
+        url = response.data['reviews_next']
+        while url:
+            queries, response = self.get(url)
+            self.assertEqual(queries, 2)    # product, review page
+            seen += [r['id'] for r in response.data['results']]
+            url = response.data['next']
+        expected = list(Review.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+
+@override_settings(VIEW_COUNTER_FLUSH_INTERVAL=3600)
+class ViewCounterTests(TestCase):
+    """Buffered view counts are written in batches, once, even after a failed flush."""
+
+    def setUp(self):
+        self.a, self.b, self.c = (make_product(name) for name in 'ABC')
+        self.counter = ViewCounter()
+        self.counter.enabled = True
+        patcher = mock.patch.object(self.counter, '_ensure_thread')     # no background thread
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def hit(self, *products):
+        for product in products:
+            self.counter.hit(product.pk)
+
+    def views(self):
+        return [Product.objects.get(pk=p.pk).views for p in (self.a, self.b, self.c)]
+
+    def test_batches_by_increment(self):
+        self.hit(self.a, self.a, self.b, self.b, self.c)
+        self.assertEqual(self.views(), [0, 0, 0])
+        self.assertEqual(self.counter.pending(self.a.pk), 2)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.counter.flush(), 3)
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)   # +2 for a and b, +1 for c
+        self.assertEqual(self.views(), [2, 2, 1])
+        self.assertEqual(self.counter.flush(), 0)
+
+    def test_failed_flush_is_rolled_back_and_requeued(self):
+        self.hit(self.a, self.a, self.b, self.b, self.c)
+        update = type(Product.objects.all()).update
+        calls = []
+
+        def fail_second(queryset, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 2:
+                raise RuntimeError('database went away')
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(type(Product.objects.all()), 'update', fail_second), \
+                self.assertLogs('ecommerce.view_counter', 'ERROR'):
+            self.assertEqual(self.counter.flush(), 0)
+        self.assertEqual(self.views(), [0, 0, 0])   # the first group was rolled back too
+        self.assertEqual(self.counter.pending(self.a.pk), 2)
+        self.counter.flush()
+        self.assertEqual(self.views(), [2, 2, 1])
+
+    def test_shutdown_flushes(self):
+        self.hit(self.a, self.c)
+        self.counter.shutdown()
+        self.assertEqual(self.views(), [1, 0, 1])
+        self.assertEqual(self.counter.pending(self.a.pk), 0)
+
+    def test_writes_through_unless_started(self):
+        counter = ViewCounter()
+        self.assertEqual(counter.hit(self.a.pk), 1)
+        self.assertIsNone(counter._thread)
+        self.assertEqual(self.views(), [1, 0, 0])
+        response = APIClient().get(f'/api/v1/products/{self.b.slug}/')
+        self.assertEqual(response.data['views'], 1)
+        self.assertEqual(self.views(), [1, 1, 0])
+
+
+@override_settings(RECOMMENDATIONS_DIR=tempfile.mkdtemp(), BOUGHT_TOGETHER_MIN_SUPPORT=2)
+class BoughtTogetherTests(TestCase):
+    """Lift-ranked neighbours from order history, updated incrementally."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.a, self.b, self.c, self.d = (make_product(name) for name in 'ABCD')
+        self.day = timezone.now() - timedelta(days=1)
+
+    def order(self, *products, status='delivered'):
+        order = Order.objects.create(
+            subtotal=1, delivery_fee=0, total=1, status=status,
+            customer_name='x', customer_phone='0700000000', customer_email='x@example.com',
+        )
+        Order.objects.filter(pk=order.pk).update(created_at=self.day)
+        for p in products:
+            OrderItem.objects.create(
+                order=order, product=p, product_name=p.name, product_sku=p.sku,
+                quantity=1, unit_price=p.price, subtotal=p.price,
+            )
+
+    def neighbours(self, product):
+        response = self.client.get(f'/api/v1/products/{product.slug}/bought_together/')
+        self.assertEqual(response.status_code, 200)
+        return [row['slug'] for row in response.data]
+
+    def test_lift_ranking_and_incremental_update(self):
+        # A+B twice out of A's 4 orders, A+C twice, but C is everywhere: B has the higher lift
+        for products in [(self.a, self.b), (self.a, self.b), (self.a, self.c), (self.a, self.c),
+                         (self.c,), (self.c,), (self.c, self.d)]:
+            self.order(*products)
+        self.order(self.a, self.d, status='cancelled')
+        self.order(self.a, self.d, status='cancelled')
+        update_bought_together(now=self.day + timedelta(hours=2))   # watermark: day + 1h lag
+        self.assertEqual(self.neighbours(self.a), [self.b.slug, self.c.slug])
+        self.assertEqual(self.neighbours(self.d), [])     # one order is below the support
+
+        self.day += timedelta(hours=1, minutes=30)
+        self.order(self.c, self.d)
+        self.assertEqual(update_bought_together()[0], 1)
+        self.assertEqual(self.neighbours(self.d), [self.c.slug])
+        self.assertEqual(RelatedProduct.objects.get(product=self.a, related=self.b).support, 2)
+
+    def test_unknown_product(self):
+        response = self.client.get('/api/v1/products/missing/bought_together/')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(RECOMMENDATIONS_DIR=tempfile.mkdtemp(), SIMILAR_MIN_SCORE=0.1)
+class SimilarProductsTests(TestCase):
+    """Content-based neighbours within a top-level category, updated incrementally."""
+
+    def setUp(self):
+        self.client = APIClient()
+        phones, fashion = Category.objects.create(name='Phones'), Category.objects.create(name='Fashion')
+        android = Category.objects.create(name='Android', parent=phones)
+        text = 'samsung galaxy android smartphone with {} storage'
+        self.a = make_product('Samsung Galaxy Smartphone', category=android, description=text.format('128GB'))
+        self.b = make_product('Samsung Galaxy Smartphone Pro', category=android, description=text.format('256GB'))
+        self.c = make_product('USB Charging Cable', category=phones, description='usb charging cable, 1m')
+        self.d = make_product('Samsung Galaxy Smartphone Case', category=fashion, description=text.format('no'))
+
+    def neighbours(self, product):
+        response = self.client.get(f'/api/v1/products/{product.slug}/similar/')
+        self.assertEqual(response.status_code, 200)
+        return [row['slug'] for row in response.data]
+
+    def test_ranking_and_incremental_update(self):
+        update_similar()
+        self.assertEqual(self.neighbours(self.a)[0], self.b.slug)
+        self.assertNotIn(self.d.slug, self.neighbours(self.a))     # other top-level category
+
+        self.d.category = self.c.category
+        self.d.save()
+        self.b.is_active = False
+        self.b.save()
+        self.assertEqual(update_similar()[0], 1)
+        self.assertIn(self.d.slug, self.neighbours(self.a))
+        self.assertNotIn(self.b.slug, self.neighbours(self.a))
@@ -19,6 +19,12 @@ urlpatterns = [
     path('auth/profile/', views.ProfileView.as_view(), name='profile'),
     path('auth/change-password/', views.ChangePasswordView.as_view(), name='change-password'),
 
+    # Home
+    path('home/', views.HomeView.as_view(), name='home'),
+
+    # Partner feed
+    path('feeds/products.<str:fmt>', views.ProductFeedView.as_view(), name='product-feed'),
+
     # Cart
     path('cart/', views.CartView.as_view(), name='cart'),
     path('cart/items/<int:item_id>/', views.CartItemView.as_view(), name='cart-item'),
@@ -0,0 +1,120 @@
+"""
+Buffered product view counter.
+
+``ProductViewSet.retrieve`` used to write ``Product.views`` on every page
+hit. In web processes (started from ``wsgi.py`` / ``asgi.py``) hits are
+now accumulated in memory per process and written by a background thread
+every ``VIEW_COUNTER_FLUSH_INTERVAL`` seconds, as one
+``UPDATE ... SET views = views + n`` per distinct increment, all in one
+transaction. Pending counts are flushed at interpreter exit as well, so a
+clean shutdown loses nothing; a crash loses at most one interval's worth of
+views.
+
+Management commands and tests never start the thread and write through on
+every hit, as does ``VIEW_COUNTER_FLUSH_INTERVAL = 0``.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from collections import defaultdict
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(int)
+        self._thread = None
+        self._stop = threading.Event()
+        self._pid = None
+        self.enabled = False
+
+    def start(self):
+        """Opt this process in to buffering; management commands and tests never call it."""
+        self.enabled = True
+        interval = settings.VIEW_COUNTER_FLUSH_INTERVAL
+        if interval > 0:
+            self._ensure_thread(interval)
+
+    def hit(self, pk):
+        """
+        Record one view. Returns how many views of ``pk`` a row loaded before
+        this call is missing: the unflushed count, or the count just written
+        when writing through.
+        """
+        interval = settings.VIEW_COUNTER_FLUSH_INTERVAL
+        with self._lock:
+            self._pending[pk] += 1
+            pending = self._pending[pk]
+        if not self.enabled or interval <= 0:
+            self.flush()
+            return pending
+        self._ensure_thread(interval)
+        return pending
+
+    def pending(self, pk):
+        with self._lock:
+            return self._pending.get(pk, 0)
+
+    def flush(self):
+        """Write all pending counts. Returns the number of products updated."""
+        from .models import Product
+
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+        if not pending:
+            return 0
+
+        by_increment = defaultdict(list)
+        for pk, count in pending.items():
+            by_increment[count].append(pk)
+        try:
+            # All or nothing, so a failure rolls back every group before the
+            # counts are re-queued (a single UPDATE is atomic on its own)
+            with transaction.atomic() if len(by_increment) > 1 else nullcontext():
+                for count, pks in by_increment.items():
+                    Product.objects.filter(pk__in=pks).update(views=F('views') + count)
+        except Exception:
+            logger.exception("Flushing %d product view counts failed; will retry", len(pending))
+            with self._lock:
+                for pk, count in pending.items():
+                    self._pending[pk] += count
+            return 0
+        return len(pending)
+
+    def _ensure_thread(self, interval):
+        # Re-arm after a fork: threads do not survive into worker processes.
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(interval,), name='view-counter-flush', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            close_old_connections()
+            self.flush()
+        close_old_connections()
+
+    def shutdown(self):
+        self._stop.set()
+        self.flush()
+
+
+view_counter = ViewCounter()
+atexit.register(view_counter.shutdown)
@@ -6,17 +6,31 @@ import requests
 from datetime import datetime
 from django_filters import rest_framework as df_filters
 from django.conf import settings
-from django.utils import timezone
-from rest_framework import viewsets, status, filters
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import Http404, StreamingHttpResponse
+from rest_framework import viewsets, status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated, AllowAny, IsAuthenticatedOrReadOnly
+from rest_framework.permissions import BasePermission, IsAuthenticated, AllowAny, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django_filters.rest_framework import DjangoFilterBackend
+from .search import IndexedSearchFilter, RankedOrderingFilter
+from .suggest import get_suggest_index
+from .facets import get_facets
+from .pagination import ProductPagination, ReviewPagination
+from .category_tree import get_category_tree, with_absolute_urls
+from .view_counter import view_counter
+from .home import home_response_data
+from .flash_deals import active_flash_deals
+from .caching import CachedResponseMixin
+from .conditional import etag_matches, not_modified, product_detail_validator, product_list_etag
+from .export import FEED_FORMATS, feed_stream
+from .fieldsets import requested_fieldset
+from .product_rows import list_plan
 
 from .models import (
-    User, Category, Brand, Product, Review,
+    User, Category, Brand, Product, RelatedProduct, Review,
     County, PickupStation, Cart, CartItem,
     Order, MpesaTransaction, Wishlist, Banner
 )
@@ -43,6 +57,15 @@ def get_or_create_cart(request):
     return cart
 
 
+def serialize_cart(cart, request):
+    """Serialize a cart with its items and products in a fixed number of queries."""
+    prefetch_related_objects(
+        [cart],
+        Prefetch('items', queryset=CartItem.objects.select_related('variant', 'product__category', 'product__brand')),
+    )
+    return CartSerializer(cart, context={'request': request}).data
+
+
 # ─── Auth ─────────────────────────────────────────────────────────────────────
 
 class RegisterView(APIView):
@@ -90,100 +113,242 @@ class ProfileView(APIView):
 
 # ─── Category ─────────────────────────────────────────────────────────────────
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.filter(is_active=True, parent=None).prefetch_related('children')
     serializer_class = CategorySerializer
     lookup_field = 'slug'
     permission_classes = [AllowAny]
+    cache_tags = ('category', 'product')     # product_count
+
+    def list(self, request, *args, **kwargs):
+        # Served from the cached tree — no queries once warm
+        roots = with_absolute_urls(get_category_tree()['roots'], request)
+        page = self.paginate_queryset(roots)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(roots)
 
 
 # ─── Brand ────────────────────────────────────────────────────────────────────
 
-class BrandViewSet(viewsets.ReadOnlyModelViewSet):
+class BrandViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Brand.objects.filter(is_active=True)
     serializer_class = BrandSerializer
     lookup_field = 'slug'
     permission_classes = [AllowAny]
+    cache_tags = ('brand',)
 
 
 # ─── Product ──────────────────────────────────────────────────────────────────
 class ProductFilter(df_filters.FilterSet):
     min_price = df_filters.NumberFilter(field_name='price', lookup_expr='gte')
     max_price = df_filters.NumberFilter(field_name='price', lookup_expr='lte')
-    category  = df_filters.CharFilter(field_name='category__slug')
+    category  = df_filters.CharFilter(method='filter_category')
     brand     = df_filters.CharFilter(field_name='brand__slug')
 
     class Meta:
         model = Product
         fields = ['category', 'brand', 'is_featured', 'is_flash_deal', 'min_price', 'max_price']
 
+    def filter_category(self, queryset, name, value):
+        # The category and everything below it, via the materialised path
+        path = Category.objects.filter(slug=value).values_list('path', flat=True).first()
+        if not path:
+            return queryset.none()
+        return queryset.filter(category__in=Category.objects.subtree(path).values('pk'))
+
 class ProductViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Product.objects.filter(is_active=True).select_related('category', 'brand').prefetch_related('images')
+    queryset = Product.objects.filter(is_active=True).select_related('category', 'brand')
     permission_classes = [AllowAny]
     lookup_field = 'slug'
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, IndexedSearchFilter, RankedOrderingFilter]
     filterset_class = ProductFilter                    # ← swap this in (replaces filterset_fields)
+    pagination_class = ProductPagination
     search_fields = ['name', 'description', 'sku', 'brand__name', 'category__name']
     ordering_fields = ['price', 'rating', 'created_at', 'views']
     ordering = ['-created_at']
 
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action != 'retrieve':
+            return qs       # lists fetch just their plan's columns, see product_rows()
+        return ProductDetailSerializer.prune_queryset(qs, keep=('views',), **requested_fieldset(self.request))
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.update(requested_fieldset(self.request))
+        return super().get_serializer(*args, **kwargs)
+
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return ProductDetailSerializer
         return ProductListSerializer
 
+    def list_plan(self):
+        return list_plan(**requested_fieldset(self.request))
+
+    def product_rows(self, queryset):
+        """``queryset`` as rows for the list renderer (ordering fields kept for the cursors)."""
+        return self.list_plan().values(queryset, keep=self.ordering_fields)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.product_rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return self.conditional_list(request, list(queryset))
+        # The envelope (count, next/previous) is part of the validator too
+        envelope = dict(self.paginator.get_paginated_response([]).data)
+        envelope.pop('results')
+        etag = product_list_etag(request, page, sorted(envelope.items()))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response = self.get_paginated_response(self.list_plan().render(page, request))
+        response['ETag'] = etag
+        return response
+
+    def conditional_list(self, request, rows):
+        """Unpaginated product list with ETag / If-None-Match support."""
+        etag = product_list_etag(request, rows)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        return Response(self.list_plan().render(rows, request), headers={'ETag': etag})
+
     def retrieve(self, request, *args, **kwargs):
+        lookup = {self.lookup_field: kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        validator = product_detail_validator(request, self.filter_queryset(super().get_queryset()).filter(**lookup))
+        if validator is not None:
+            pk, etag = validator
+            if etag_matches(request, etag):
+                view_counter.hit(pk)    # a revalidated visit is still a visit
+                return not_modified(etag)
         instance = self.get_object()
-        instance.views += 1
-        instance.save(update_fields=['views'])
-        return super().retrieve(request, *args, **kwargs)
+        # Buffered; the batched write happens in the background (see view_counter)
+        instance.views += view_counter.hit(instance.pk)
+        response = Response(self.get_serializer(instance).data)
+        if validator is not None:
+            response['ETag'] = validator[1]
+        return response
+
+    @action(detail=False, methods=['get'], pagination_class=None, filter_backends=[])
+    def suggest(self, request):
+        q = request.query_params.get('q', '').strip()
+        try:
+            limit = min(int(request.query_params.get('limit', settings.SUGGEST_LIMIT)), settings.SUGGEST_MAX_LIMIT)
+        except ValueError:
+            limit = settings.SUGGEST_LIMIT
+        if not q or limit <= 0:
+            return Response([])
+        return Response(get_suggest_index().suggest(q, limit))
+
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def facets(self, request):
+        return Response(get_facets(
+            request.query_params,
+            lambda: self.filter_queryset(self.get_queryset()),
+        ))
 
     @action(detail=False, methods=['get'])
     def featured(self, request):
-        qs = self.get_queryset().filter(is_featured=True)[:12]
-        return Response(ProductListSerializer(qs, many=True, context={'request': request}).data)
+        rows = self.product_rows(self.get_queryset().filter(is_featured=True))
+        return self.conditional_list(request, list(rows[:12]))
 
     @action(detail=False, methods=['get'])
     def flash_deals(self, request):
-        qs = self.get_queryset().filter(is_flash_deal=True, flash_deal_end__gt=timezone.now())[:12]
-        return Response(ProductListSerializer(qs, many=True, context={'request': request}).data)
+        deals, _expires_at = active_flash_deals()     # in-memory; see flash_deals
+        return self.conditional_list(request, deals)
 
     @action(detail=False, methods=['get'])
     def new_arrivals(self, request):
-        qs = self.get_queryset().order_by('-created_at')[:12]
-        return Response(ProductListSerializer(qs, many=True, context={'request': request}).data)
+        rows = self.product_rows(self.get_queryset().order_by('-created_at'))
+        return self.conditional_list(request, list(rows[:12]))
+
+    def related_list(self, request, slug, kind):
+        """A product's precomputed neighbours (see RelatedProduct), in rank order."""
+        rows = list(self.product_rows(
+            self.get_queryset()
+            .filter(related_to__product__slug=slug, related_to__product__is_active=True, related_to__kind=kind)
+            .order_by('related_to__rank')
+        ))
+        if not rows and not self.get_queryset().filter(slug=slug).exists():
+            raise Http404
+        return self.conditional_list(request, rows)
+
+    @action(detail=True, methods=['get'])
+    def bought_together(self, request, slug=None):
+        return self.related_list(request, slug, RelatedProduct.BOUGHT_TOGETHER)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, slug=None):
+        return self.related_list(request, slug, RelatedProduct.SIMILAR)
 
     @action(detail=True, methods=['get', 'post'], permission_classes=[IsAuthenticatedOrReadOnly])
     def reviews(self, request, slug=None):
         product = self.get_object()
         if request.method == 'GET':
-            reviews = product.reviews.all()
-            return Response(ReviewSerializer(reviews, many=True).data)
+            paginator = ReviewPagination()
+            reviews = paginator.paginate_queryset(product.reviews.select_related('user'), request, self)
+            return paginator.get_paginated_response(ReviewSerializer(reviews, many=True).data)
         serializer = ReviewSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
-        serializer.save(product=product)
-        # Update rating
-        reviews = product.reviews.all()
-        product.rating = sum(r.rating for r in reviews) / reviews.count()
-        product.review_count = reviews.count()
-        product.save(update_fields=['rating', 'review_count'])
+        serializer.save(product=product)     # rating aggregates are updated by the Review signals
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+# ─── Home ─────────────────────────────────────────────────────────────────────
+
+class HomeView(APIView):
+    """All homepage sections in one response, from a precomputed payload."""
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        return Response(home_response_data(request))
+
+
+# ─── Product feed ─────────────────────────────────────────────────────────────
+
+class FeedPermission(BasePermission):
+    """Staff, or anyone presenting PRODUCT_FEED_TOKEN as ?token=."""
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        token = settings.PRODUCT_FEED_TOKEN
+        return bool(token) and hmac.compare_digest(request.query_params.get('token', ''), token)
+
+
+class ProductFeedView(APIView):
+    """Whole-catalog feed, streamed; ``?gzip=1`` for a compressed download."""
+    permission_classes = [FeedPermission]
+
+    def get(self, request, fmt):
+        if fmt not in FEED_FORMATS:
+            raise Http404
+        gzip = request.query_params.get('gzip', '').lower() in ('1', 'true', 'yes')
+        media_base = request.build_absolute_uri('/').rstrip('/')
+        response = StreamingHttpResponse(
+            feed_stream(fmt, gzip=gzip, media_base=media_base),
+            content_type='application/gzip' if gzip else FEED_FORMATS[fmt],
+        )
+        filename = f'products.{fmt}' + ('.gz' if gzip else '')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
 # ─── Delivery ─────────────────────────────────────────────────────────────────
 
-class CountyViewSet(viewsets.ReadOnlyModelViewSet):
+class CountyViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = County.objects.prefetch_related('stations')
     serializer_class = CountySerializer
     lookup_field = 'slug'
     permission_classes = [AllowAny]
+    cache_tags = ('county', 'pickupstation')
 
 
-class PickupStationViewSet(viewsets.ReadOnlyModelViewSet):
+class PickupStationViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = PickupStation.objects.filter(is_active=True).select_related('county')
     serializer_class = PickupStationSerializer
     lookup_field = 'slug'
     permission_classes = [AllowAny]
+    cache_tags = ('pickupstation', 'county')
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['county__slug']
 
@@ -195,7 +360,7 @@ class CartView(APIView):
 
     def get(self, request):
         cart = get_or_create_cart(request)
-        return Response(CartSerializer(cart, context={'request': request}).data)
+        return Response(serialize_cart(cart, request))
 
     def post(self, request):
         cart = get_or_create_cart(request)
@@ -203,7 +368,7 @@ class CartView(APIView):
         serializer.is_valid(raise_exception=True)
         serializer.save()
         cart.refresh_from_db()
-        return Response(CartSerializer(cart, context={'request': request}).data, status=status.HTTP_201_CREATED)
+        return Response(serialize_cart(cart, request), status=status.HTTP_201_CREATED)
 
 
 class CartItemView(APIView):
@@ -221,12 +386,12 @@ class CartItemView(APIView):
         else:
             item.quantity = qty
             item.save()
-        return Response(CartSerializer(cart, context={'request': request}).data)
+        return Response(serialize_cart(cart, request))
 
     def delete(self, request, item_id):
         cart = get_or_create_cart(request)
         cart.items.filter(id=item_id).delete()
-        return Response(CartSerializer(cart, context={'request': request}).data)
+        return Response(serialize_cart(cart, request))
 
 
 # ─── Orders ───────────────────────────────────────────────────────────────────
@@ -238,16 +403,23 @@ class OrderViewSet(viewsets.ModelViewSet):
     http_method_names = ['get', 'post']
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).prefetch_related('items').select_related('pickup_station')
+        orders = Order.objects.filter(user=self.request.user)
+        return OrderSerializer.prune_queryset(orders, **requested_fieldset(self.request))
+
+    def get_serializer(self, *args, **kwargs):
+        if 'data' not in kwargs:    # fieldsets shape output only
+            kwargs.update(requested_fieldset(self.request))
+        return super().get_serializer(*args, **kwargs)
 
     @action(detail=False, methods=['get'])
     def by_number(self, request):
         number = request.query_params.get('order_number')
+        fieldset = requested_fieldset(request)
         try:
-            order = Order.objects.get(order_number=number)
+            order = OrderSerializer.prune_queryset(Order.objects.all(), **fieldset).get(order_number=number)
         except Order.DoesNotExist:
             return Response({'error': 'Order not found.'}, status=404)
-        return Response(OrderSerializer(order).data)
+        return Response(OrderSerializer(order, **fieldset).data)
 
     def create(self, request):
         print("\n" + "="*60)
@@ -295,7 +467,7 @@ class OrderViewSet(viewsets.ModelViewSet):
             order = serializer.save()
             print(f"🎉 Order created : #{order.order_number} | total: KES {order.total}")
             print("="*60 + "\n")
-            return Response(OrderSerializer(order).data, status=201)
+            return Response(OrderSerializer(order, **requested_fieldset(request)).data, status=201)
         except Exception as e:
             import traceback
             traceback.print_exc()
@@ -467,7 +639,7 @@ class WishlistViewSet(viewsets.ModelViewSet):
     http_method_names = ['get', 'post', 'delete']
 
     def get_queryset(self):
-        return Wishlist.objects.filter(user=self.request.user).select_related('product')
+        return Wishlist.objects.filter(user=self.request.user).select_related('product__category', 'product__brand')
 
     def create(self, request):
         serializer = WishlistSerializer(data=request.data, context={'request': request})
@@ -481,10 +653,11 @@ class WishlistViewSet(viewsets.ModelViewSet):
 
 # ─── Banner ───────────────────────────────────────────────────────────────────
 
-class BannerViewSet(viewsets.ReadOnlyModelViewSet):
+class BannerViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Banner.objects.filter(is_active=True)
     serializer_class = BannerSerializer
     permission_classes = [AllowAny]
+    cache_tags = ('banner',)
     
     
     
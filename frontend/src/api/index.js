@@ -54,13 +54,20 @@ export const categoryAPI = {
   detail: (slug) => api.get(`/categories/${slug}/`),  // ← add this
 };
 
+export const homeAPI = {
+  get: () => api.get('/home/'),
+};
+
 export const productAPI = {
   list:       (params) => api.get('/products/', { params }),
   detail:     (slug)   => api.get(`/products/${slug}/`),
   featured:   ()       => api.get('/products/featured/'),
   flashDeals: ()       => api.get('/products/flash_deals/'),
   newArrivals:()       => api.get('/products/new_arrivals/'),
+  suggest:    (q)      => api.get('/products/suggest/', { params: { q } }),
+  facets:     (params) => api.get('/products/facets/', { params }),
   reviews: (slug) => api.get(`/products/${slug}/reviews/`),
+  moreReviews: (nextUrl) => api.get(nextUrl),
   addReview: (slug, data) => api.post(`/products/${slug}/reviews/`, data),
 };
 
@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
-import { productAPI, categoryAPI, bannerAPI } from '../api';
+import { homeAPI } from '../api';
 import ProductCard from '../components/product/ProductCard';
 import { Spinner, Countdown, useToast, Toast } from '../components/common';
 
@@ -157,19 +157,13 @@ export default function HomePage() {
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
-    Promise.all([
-      productAPI.featured(),
-      productAPI.flashDeals(),
-      productAPI.newArrivals(),
-      categoryAPI.list(),
-      bannerAPI.list(),
-    ]).then(([feat, flash, newArr, cats, bans]) => {
+    homeAPI.get().then(({ data: home }) => {
       setData({
-        featured: feat.data?.results || feat.data || [],
-        flashDeals: flash.data?.results || flash.data || [],
-        newArrivals: newArr.data?.results || newArr.data || [],
-        categories: cats.data?.results || cats.data || [],
-        banners: bans.data?.results || bans.data || [],
+        featured: home.featured || [],
+        flashDeals: home.flash_deals || [],
+        newArrivals: home.new_arrivals || [],
+        categories: home.categories || [],
+        banners: home.banners || [],
       });
     }).catch(console.error).finally(() => setLoading(false));
   }, []);
@@ -84,6 +84,11 @@ export default function ProductDetailPage() {
     }
   };
 
+  const handleMoreReviews = async () => {
+    const { data } = await productAPI.moreReviews(product.reviews_next);
+    setProduct(p => ({ ...p, reviews: [...p.reviews, ...data.results], reviews_next: data.next }));
+  };
+
   const variantGroups = product.variants?.reduce((acc, v) => {
     if (!acc[v.name]) acc[v.name] = [];
     acc[v.name].push(v);
@@ -272,6 +277,12 @@ export default function ProductDetailPage() {
                       <p style={{ fontSize: 14, color: '#555' }}>{r.comment}</p>
                     </div>
                   ))}
+                  {product.reviews_next && (
+                    <button type="button" className="btn-primary" style={{ width: 'auto', padding: '8px 20px' }}
+                      onClick={handleMoreReviews}>
+                      Show more reviews
+                    </button>
+                  )}
                 </div>
               )}
               {user && (